@@ -1,15 +1,22 @@
 import os
-from flask import Flask, jsonify
+import hmac
+import threading
+from flask import Flask, jsonify, request, Response
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
+from flask_jwt_extended import JWTManager, verify_jwt_in_request, get_jwt
 from config import get_config
 from utils.logger import logger
+from utils.metrics import metrics
+from utils.circuit_breaker import get_breaker_states
+from utils.db_manager import ensure_indexes
+from services.document_service import DocumentService
 
 # 導入路由
 from routes.auth import auth_bp
 from routes.tenants import tenants_bp
 from routes.documents import documents_bp
 from routes.chat import chat_bp
+from routes.admin import admin_bp
 
 # 創建應用
 app = Flask(__name__)
@@ -20,7 +27,8 @@ app.config['SECRET_KEY'] = config.SECRET_KEY
 app.config['JWT_SECRET_KEY'] = config.JWT_SECRET_KEY
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = config.JWT_ACCESS_TOKEN_EXPIRES
 app.config['JWT_REFRESH_TOKEN_EXPIRES'] = config.JWT_REFRESH_TOKEN_EXPIRES
-app.config['MAX_CONTENT_LENGTH'] = config.MAX_FILE_SIZE
+# 單檔上傳路由另行檢查 MAX_FILE_SIZE，此處上限需容納批次上傳
+app.config['MAX_CONTENT_LENGTH'] = max(config.MAX_FILE_SIZE, config.BULK_MAX_UPLOAD_SIZE)
 
 # CORS 配置
 CORS(app, origins=config.CORS_ORIGINS, supports_credentials=True)
@@ -32,11 +40,33 @@ jwt = JWTManager(app)
 os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(os.path.dirname(config.LOG_FILE), exist_ok=True)
 
+# 建立資料庫索引
+ensure_indexes()
+
+# 恢復上次進程中斷時卡在處理中的文件
+if config.INGEST_RESUME_ON_STARTUP:
+    threading.Thread(
+        target=DocumentService.resume_stuck_documents,
+        name='ingest-resume',
+        daemon=True
+    ).start()
+
+# 載入租戶 RAG Corpus 登記並在背景預熱，並繼續追蹤進行中的 RAG 匯入
+if config.USE_RAG_ENGINE:
+    try:
+        from services.rag_engine_service import rag_engine_service
+        if config.RAG_CORPUS_WARMUP_ENABLED:
+            rag_engine_service.start_background_jobs()
+        rag_engine_service.start_import_worker()
+    except ImportError:
+        logger.warning("RAG Engine 服務不可用，略過 Corpus 預熱與匯入追蹤")
+
 # 註冊藍圖
 app.register_blueprint(auth_bp)
 app.register_blueprint(tenants_bp)
 app.register_blueprint(documents_bp)
 app.register_blueprint(chat_bp)
+app.register_blueprint(admin_bp)
 
 
 @app.route('/')
@@ -51,13 +81,33 @@ def index():
 
 @app.route('/health')
 def health():
-    """健康檢查"""
+    """健康檢查（任一斷路器開啟時狀態為 degraded）"""
+    breakers = get_breaker_states()
+    degraded = any(state['state'] == 'open' for state in breakers.values())
     return jsonify({
-        'status': 'healthy',
-        'service': 'AI Platform Backend'
+        'status': 'degraded' if degraded else 'healthy',
+        'service': 'AI Platform Backend',
+        'circuit_breakers': breakers
     })
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 指標（含各租戶標籤，需 METRICS_TOKEN 或平台管理員 Token）"""
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header[len('Bearer '):] if auth_header.startswith('Bearer ') else ''
+    
+    if not (config.METRICS_TOKEN and hmac.compare_digest(token, config.METRICS_TOKEN)):
+        verify_jwt_in_request()
+        if get_jwt().get('role') != 'platform_admin':
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+    
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 # JWT 錯誤處理
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
@@ -0,0 +1,74 @@
+import re
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, jsonify
+from quart_cors import cors
+from config import get_config
+from utils.async_db import async_db_manager
+from utils.logger import logger
+from routes.async_chat import async_chat_bp
+from app import app as flask_app
+
+config = get_config()
+
+# 聊天路由的 asyncio 版本：等待 Gemini 與 MongoDB 時不佔用執行緒，
+# 單一進程可同時維持大量串流對話。其餘路由仍由 Flask 應用處理。
+chat_app = Quart(__name__)
+chat_app = cors(chat_app, allow_origin=config.CORS_ORIGINS, allow_credentials=True)
+chat_app.register_blueprint(async_chat_bp)
+
+
+@chat_app.before_serving
+async def setup_executor():
+    """檢索等同步程式碼以 asyncio.to_thread 執行，依配置放大預設執行緒池"""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=config.ASGI_THREAD_POOL_SIZE, thread_name_prefix='asgi-sync')
+    )
+    logger.info(f"ASGI 聊天服務啟動，同步執行緒池大小: {config.ASGI_THREAD_POOL_SIZE}")
+
+
+@chat_app.after_serving
+async def close_database():
+    """關閉 MongoDB 非同步連接"""
+    async_db_manager.close()
+
+
+@chat_app.errorhandler(404)
+async def not_found(error):
+    return jsonify({
+        'success': False,
+        'message': '資源不存在'
+    }), 404
+
+
+@chat_app.errorhandler(500)
+async def internal_error(error):
+    logger.error(f"伺服器錯誤: {error}")
+    return jsonify({
+        'success': False,
+        'message': '伺服器內部錯誤'
+    }), 500
+
+
+class ChatDispatcher:
+    """依路徑分派：聊天路由交給 Quart，其餘請求交給 Flask（WSGI）
+
+    批次問答（/chat/batch）只有 Flask 版本，仍交給 Flask 處理。
+    """
+    
+    CHAT_PATH = re.compile(r'^/v1/tenants/[^/]+/chat(?!/batch(/|$))(/|$)')
+    
+    def __init__(self, async_app, wsgi_app):
+        self._async_app = async_app
+        self._wsgi_app = WsgiToAsgi(wsgi_app)
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan' or self.CHAT_PATH.match(scope.get('path', '')):
+            await self._async_app(scope, receive, send)
+        else:
+            await self._wsgi_app(scope, receive, send)
+
+
+# ASGI 入口：hypercorn asgi:app 或 uvicorn asgi:app
+app = ChatDispatcher(chat_app, flask_app)
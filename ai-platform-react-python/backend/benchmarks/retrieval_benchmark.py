@@ -0,0 +1,394 @@
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# 基準測試固定使用本機模擬嵌入與內存向量存儲，須在載入 config 之前設定
+_FORCED_ENV = {'LLM_BACKEND': 'fake', 'FAKE_LLM_URL': '', 'USE_RAG_ENGINE': 'false'}
+_DEFAULT_ENV = {'FAKE_EMBEDDING_LATENCY_MS': '0', 'SINGLEFLIGHT_ENABLED': 'false', 'LOG_LEVEL': 'WARNING'}
+
+# 合成語料：共用詞彙大小與每個主題的詞彙大小
+_COMMON_WORDS = 5000
+_TOPIC_WORDS = 30
+
+
+def synthetic_corpus(size: int, seed: int, chunk_words: int = 40, chunks_per_doc: int = 10) -> List[Dict]:
+    """產生 size 個合成片段：每份文件屬於一個主題（多份文件共用主題，形成難以區分的負例），
+    片段一半是主題詞、一半是依 Zipf 分佈抽取的共用詞
+    """
+    rng = random.Random(seed)
+    common = [f"w{i}" for i in range(_COMMON_WORDS)]
+    cum_weights = []
+    total = 0.0
+    for i in range(_COMMON_WORDS):
+        total += 1.0 / (i + 1)
+        cum_weights.append(total)
+    
+    topics = max(size // (chunks_per_doc * 5), 10)
+    chunks = []
+    for index in range(size):
+        doc = index // chunks_per_doc
+        topic = doc % topics
+        words = rng.choices([f"t{topic}_{j}" for j in range(_TOPIC_WORDS)], k=chunk_words // 2)
+        words += rng.choices(common, cum_weights=cum_weights, k=chunk_words - chunk_words // 2)
+        rng.shuffle(words)
+        chunks.append({
+            'id': f"doc_{doc}_{index % chunks_per_doc}",
+            'text': ' '.join(words),
+            'document_id': f"doc_{doc}",
+            'chunk_index': index % chunks_per_doc
+        })
+    return chunks
+
+
+def fixture_corpus(path: str) -> List[Dict]:
+    """讀取文件夾具（JSONL，每行 {"id", "text"}），以與匯入管線相同的 TextProcessor 切塊"""
+    from utils.text_processor import TextProcessor
+    
+    chunks = []
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f):
+            if not line.strip():
+                continue
+            document = json.loads(line)
+            document_id = str(document.get('id') or f"doc_{line_number}")
+            for chunk_index, chunk in enumerate(TextProcessor.split_into_chunks(document['text'])):
+                chunks.append({
+                    'id': f"{document_id}_{chunk_index}",
+                    'text': chunk['text'],
+                    'document_id': document_id,
+                    'chunk_index': chunk_index
+                })
+    return chunks
+
+
+def synthetic_queries(chunks: List[Dict], count: int, seed: int, query_fraction: float = 0.25) -> List[Dict]:
+    """從隨機片段擷取連續的一段（詞或字元）作為查詢，該片段即為唯一相關答案"""
+    rng = random.Random(seed + 1)
+    queries = []
+    for chunk in rng.sample(chunks, min(count, len(chunks))):
+        spaced = ' ' in chunk['text']
+        tokens = chunk['text'].split() if spaced else list(chunk['text'])
+        length = max(int(len(tokens) * query_fraction), 1)
+        start = rng.randrange(max(len(tokens) - length, 0) + 1)
+        queries.append({
+            'question': (' ' if spaced else '').join(tokens[start:start + length]),
+            'relevant': [chunk['id']]
+        })
+    return queries
+
+
+def fixture_queries(path: str) -> List[Dict]:
+    """讀取查詢夾具（JSONL，每行 {"question", "relevant": [片段 ID 或文件 ID]}）"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _rss_mb() -> Optional[float]:
+    """目前常駐記憶體（MB），非 Linux 時返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+def _peak_rss_mb() -> float:
+    """進程啟動以來的最高常駐記憶體（MB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 1024
+
+
+def _latency_summary(values: List[float]) -> Dict:
+    """延遲分位數（毫秒）"""
+    from utils.metrics import percentile
+    
+    return {
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'mean': round(sum(values) / len(values), 3) if values else 0.0,
+        'max': round(max(values), 3) if values else 0.0
+    }
+
+
+def _exact_top_k(matrix, query_vectors, k: int, block: int = 256) -> List[List[int]]:
+    """精確搜尋（暴力餘弦相似度）作為召回率的基準答案；查詢分塊計算以限制記憶體"""
+    import numpy as np
+    
+    k = min(k, matrix.shape[0])
+    results = []
+    for start in range(0, len(query_vectors), block):
+        scores = query_vectors[start:start + block] @ matrix.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        for row, indices in enumerate(top):
+            results.append([int(i) for i in indices[np.argsort(-scores[row, indices])]])
+    return results
+
+
+def _normalized(vectors):
+    import numpy as np
+    
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _rank_metrics(results: List[List[Dict]], exact: List[List[int]], queries: List[Dict], chunk_ids: List[str], k: int) -> Dict:
+    """recall@k（相對精確搜尋前 k 名）、MRR 與命中率（相對查詢標註的相關片段或文件）"""
+    recalls, reciprocal_ranks, hits = [], [], 0
+    for docs, truth, query in zip(results, exact, queries):
+        expected = {chunk_ids[i] for i in truth[:k]}
+        recalls.append(len(expected & {doc['id'] for doc in docs[:k]}) / len(expected) if expected else 0.0)
+        
+        relevant = set(query.get('relevant') or [])
+        if not relevant:
+            continue
+        rank = next((i + 1 for i, doc in enumerate(docs[:k]) if doc['id'] in relevant or doc['document_id'] in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        hits += 1 if rank else 0
+    
+    return {
+        'k': k,
+        'recall': round(sum(recalls) / len(recalls), 4) if recalls else 0.0,
+        'mrr': round(sum(reciprocal_ranks) / len(reciprocal_ranks), 4) if reciprocal_ranks else None,
+        'hit_rate': round(hits / len(reciprocal_ranks), 4) if reciprocal_ranks else None
+    }
+
+
+def _index(tenant_id: str, chunks: List[Dict], batch_size: int = 10000) -> Tuple[List[List[float]], Dict]:
+    """以模擬嵌入建立租戶的向量集合，返回 (片段向量, 建置統計)"""
+    from services.embedding_service import embedding_service
+    from utils.vector_store import vector_store_manager
+    
+    rss_before = _rss_mb()
+    embeddings = []
+    embed_seconds = 0.0
+    started = time.perf_counter()
+    for i in range(0, len(chunks), batch_size):
+        batch = chunks[i:i + batch_size]
+        embed_started = time.perf_counter()
+        vectors = embedding_service.embed_batch([chunk['text'] for chunk in batch])
+        embed_seconds += time.perf_counter() - embed_started
+        if len(vectors) != len(batch):
+            raise RuntimeError('片段嵌入失敗')
+        
+        vector_store_manager.insert_vectors(
+            tenant_id=tenant_id,
+            ids=[chunk['id'] for chunk in batch],
+            embeddings=vectors,
+            texts=[chunk['text'] for chunk in batch],
+            document_ids=[chunk['document_id'] for chunk in batch],
+            chunk_indices=[chunk['chunk_index'] for chunk in batch],
+            metadata_list=['{}'] * len(batch)
+        )
+        embeddings.extend(vectors)
+    
+    build_seconds = time.perf_counter() - started
+    rss_after = _rss_mb()
+    return embeddings, {
+        'build_seconds': round(build_seconds, 3),
+        'embed_per_second': round(len(chunks) / embed_seconds, 1) if embed_seconds else None,
+        'index_mb': round(rss_after - rss_before, 1) if rss_before is not None and rss_after is not None else None
+    }
+
+
+def run_benchmark(chunks: List[Dict], queries: List[Dict], corpus: str, warmup: int = 5) -> Dict:
+    """建立向量集合，逐題執行 RetrievalService 的檢索與重排序，與精確搜尋比較並統計延遲與記憶體"""
+    from services.embedding_service import embedding_service
+    from services.retrieval_service import RetrievalService
+    from utils.vector_store import vector_store_manager
+    from config import get_config
+    
+    config = get_config()
+    tenant_id = f"benchmark_{corpus}_{len(chunks)}"
+    vector_store_manager.delete_collection(tenant_id)
+    
+    try:
+        embeddings, build = _index(tenant_id, chunks)
+        matrix = _normalized(embeddings)
+        del embeddings
+        
+        query_vectors = embedding_service.embed_queries([query['question'] for query in queries])
+        if len(query_vectors) != len(queries):
+            raise RuntimeError('查詢嵌入失敗')
+        exact = _exact_top_k(matrix, _normalized(query_vectors), config.TOP_K_RETRIEVAL)
+        chunk_ids = [chunk['id'] for chunk in chunks]
+        
+        for query in queries[:warmup]:
+            RetrievalService.search(tenant_id, query['question'], top_k=config.TOP_K_RETRIEVAL)
+        
+        candidates, finals = [], []
+        search_ms, rerank_ms, total_ms = [], [], []
+        for query in queries:
+            started = time.perf_counter()
+            docs = RetrievalService.search(tenant_id, query['question'], top_k=config.TOP_K_RETRIEVAL)
+            searched = time.perf_counter()
+            final = RetrievalService.rerank(query['question'], docs, config.RERANK_TOP_N)
+            finished = time.perf_counter()
+            
+            candidates.append(docs)
+            finals.append(final)
+            search_ms.append((searched - started) * 1000)
+            rerank_ms.append((finished - searched) * 1000)
+            total_ms.append((finished - started) * 1000)
+        
+        return {
+            'corpus': corpus,
+            'chunks': len(chunks),
+            'queries': len(queries),
+            'candidates': _rank_metrics(candidates, exact, queries, chunk_ids, config.TOP_K_RETRIEVAL),
+            'final': _rank_metrics(finals, exact, queries, chunk_ids, config.RERANK_TOP_N),
+            'latency_ms': {
+                'search': _latency_summary(search_ms),
+                'rerank': _latency_summary(rerank_ms),
+                'total': _latency_summary(total_ms)
+            },
+            'qps': round(len(queries) / (sum(total_ms) / 1000), 2) if total_ms else None,
+            'memory_mb': {
+                'index': build['index_mb'],
+                'peak_rss': round(_peak_rss_mb(), 1)
+            },
+            'build_seconds': build['build_seconds'],
+            'embed_per_second': build['embed_per_second']
+        }
+    finally:
+        vector_store_manager.delete_collection(tenant_id)
+
+
+def _settings(args) -> Dict:
+    """影響結果的設定，與結果一起保存以便比較"""
+    from config import get_config
+    
+    config = get_config()
+    return {
+        'seed': args.seed,
+        'embedding_dimension': config.EMBEDDING_DIMENSION,
+        'chunk_size': config.CHUNK_SIZE,
+        'chunk_overlap': config.CHUNK_OVERLAP,
+        'top_k_retrieval': config.TOP_K_RETRIEVAL,
+        'rerank_top_n': config.RERANK_TOP_N,
+        'rerank_mmr_lambda': config.RERANK_MMR_LAMBDA
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(runs: List[Dict], baseline: Dict, max_quality_drop: float, max_latency_increase: float) -> List[str]:
+    """與基準結果比較相同語料與大小的執行，印出差異並返回超出門檻的退步項目"""
+    previous = {(run['corpus'], run['chunks']): run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in runs:
+        before = previous.get((run['corpus'], run['chunks']))
+        if before is None:
+            print(f"{run['corpus']}/{run['chunks']}: 基準結果中沒有對應的執行")
+            continue
+        
+        for stage in ('candidates', 'final'):
+            for field in ('recall', 'mrr'):
+                old, new = before[stage][field], run[stage][field]
+                if old is None or new is None:
+                    continue
+                print(f"{run['corpus']}/{run['chunks']} {stage}.{field}: {old} -> {new} ({new - old:+.4f})")
+                if old - new > max_quality_drop:
+                    regressions.append(f"{run['corpus']}/{run['chunks']} {stage}.{field} 下降 {old - new:.4f}")
+        
+        for quantile in ('p50', 'p95', 'p99'):
+            old, new = before['latency_ms']['total'][quantile], run['latency_ms']['total'][quantile]
+            change = (new - old) / old if old else 0.0
+            print(f"{run['corpus']}/{run['chunks']} latency.{quantile}: {old} -> {new} ms ({change:+.1%})")
+            if quantile != 'p50' and change > max_latency_increase:
+                regressions.append(f"{run['corpus']}/{run['chunks']} latency.{quantile} 增加 {change:.1%}")
+    return regressions
+
+
+def _print_run(run: Dict) -> None:
+    latency = run['latency_ms']['total']
+    print(
+        f"{run['corpus']}/{run['chunks']}: "
+        f"recall@{run['candidates']['k']}={run['candidates']['recall']} "
+        f"recall@{run['final']['k']}={run['final']['recall']} "
+        f"mrr={run['final']['mrr']} "
+        f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms "
+        f"index={run['memory_mb']['index']}MB peak={run['memory_mb']['peak_rss']}MB"
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='檢索品質與延遲基準測試（本機模擬嵌入、內存向量存儲），結果輸出為 JSON')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000], help='合成語料的片段數（可多個）')
+    parser.add_argument('--corpus', help='文件夾具 JSONL（每行 {"id", "text"}），指定時忽略 --sizes')
+    parser.add_argument('--queries', help='查詢夾具 JSONL（每行 {"question", "relevant": [...]}），預設從語料產生')
+    parser.add_argument('--num-queries', type=int, default=200, help='產生的查詢數')
+    parser.add_argument('--dim', type=int, help='嵌入維度（預設 EMBEDDING_DIMENSION；大型語料建議 64 以控制記憶體）')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=int, default=5, help='不計入統計的暖機查詢數')
+    parser.add_argument('--output', help='結果 JSON 路徑（預設 benchmarks/results/retrieval_<時間>.json）')
+    parser.add_argument('--baseline', help='與先前的結果 JSON 比較')
+    parser.add_argument('--max-quality-drop', type=float, default=0.01, help='recall／MRR 允許的最大下降（絕對值）')
+    parser.add_argument('--max-latency-increase', type=float, default=0.2, help='p95／p99 延遲允許的最大增幅（比例）')
+    args = parser.parse_args(argv)
+    
+    os.environ.update(_FORCED_ENV)
+    for key, value in _DEFAULT_ENV.items():
+        os.environ.setdefault(key, value)
+    if args.dim:
+        os.environ['EMBEDDING_DIMENSION'] = str(args.dim)
+    
+    # 逐一產生語料，避免同時保留多個大型語料
+    if args.corpus:
+        corpora = iter([(os.path.splitext(os.path.basename(args.corpus))[0], fixture_corpus(args.corpus))])
+    else:
+        corpora = (('synthetic', synthetic_corpus(size, args.seed)) for size in args.sizes)
+    
+    runs = []
+    for name, chunks in corpora:
+        queries = fixture_queries(args.queries) if args.queries else synthetic_queries(chunks, args.num_queries, args.seed)
+        run = run_benchmark(chunks, queries, name, args.warmup)
+        _print_run(run)
+        runs.append(run)
+    
+    result = {
+        'benchmark': 'retrieval',
+        'created_at': datetime.utcnow().isoformat(),
+        'git_commit': _git_commit(),
+        'settings': _settings(args),
+        'runs': runs
+    }
+    
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'results',
+        f"retrieval_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {output}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(runs, json.load(f), args.max_quality_drop, args.max_latency_increase)
+        if regressions:
+            print('效能退步：\n' + '\n'.join(f"  {item}" for item in regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -40,6 +40,17 @@ class Config:
     # Vertex AI RAG Engine
     USE_RAG_ENGINE = os.getenv('USE_RAG_ENGINE', 'false').lower() == 'true'
     RAG_CORPUS_PREFIX = os.getenv('RAG_CORPUS_PREFIX', 'tenant')
+    RAG_CORPUS_WARMUP_ENABLED = os.getenv('RAG_CORPUS_WARMUP_ENABLED', 'true').lower() == 'true'
+    RAG_CORPUS_WARMUP_TENANTS = int(os.getenv('RAG_CORPUS_WARMUP_TENANTS', 200))
+    RAG_CORPUS_RECONCILE_INTERVAL_SECONDS = int(os.getenv('RAG_CORPUS_RECONCILE_INTERVAL_SECONDS', 21600))
+    RAG_IMPORT_POLL_SECONDS = float(os.getenv('RAG_IMPORT_POLL_SECONDS', 10))
+    RAG_IMPORT_MAX_FILES = int(os.getenv('RAG_IMPORT_MAX_FILES', 25))
+    RAG_DELETE_CONCURRENCY = int(os.getenv('RAG_DELETE_CONCURRENCY', 8))
+    
+    # 扇出檢索：同時查詢 RAG Engine 與向量存儲，在期限內合併已返回的結果
+    RETRIEVAL_FANOUT_ENABLED = os.getenv('RETRIEVAL_FANOUT_ENABLED', 'false').lower() == 'true'
+    RETRIEVAL_DEADLINE_MS = int(os.getenv('RETRIEVAL_DEADLINE_MS', 1500))
+    RETRIEVAL_FANOUT_WORKERS = int(os.getenv('RETRIEVAL_FANOUT_WORKERS', 16))
     
     # Cloud Storage (GCS)
     GCS_BUCKET_NAME = os.getenv('GCS_BUCKET_NAME', '')
@@ -53,6 +64,35 @@ class Config:
     GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-1.5-flash')
     GEMINI_TEMPERATURE = float(os.getenv('GEMINI_TEMPERATURE', '0.7'))
     GEMINI_MAX_TOKENS = int(os.getenv('GEMINI_MAX_TOKENS', '2048'))
+    GEMINI_FALLBACK_MODEL = os.getenv('GEMINI_FALLBACK_MODEL', '')
+    GEMINI_TIMEOUT_SECONDS = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '45'))
+    GEMINI_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv('GEMINI_ATTEMPT_TIMEOUT_SECONDS', '20'))
+    GEMINI_MAX_RETRIES = int(os.getenv('GEMINI_MAX_RETRIES', '2'))
+    GEMINI_RETRY_BACKOFF_SECONDS = float(os.getenv('GEMINI_RETRY_BACKOFF_SECONDS', '0.5'))
+    GEMINI_HEDGE_ENABLED = os.getenv('GEMINI_HEDGE_ENABLED', 'true').lower() == 'true'
+    GEMINI_HEDGE_MIN_DELAY_SECONDS = float(os.getenv('GEMINI_HEDGE_MIN_DELAY_SECONDS', '2'))
+    GEMINI_CALL_WORKERS = int(os.getenv('GEMINI_CALL_WORKERS', '32'))
+    
+    # 斷路器（RAG Engine、嵌入、各 Gemini 模型）：滾動窗口錯誤率或慢呼叫率過高時暫停呼叫
+    CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+    CIRCUIT_BREAKER_WINDOW_SECONDS = float(os.getenv('CIRCUIT_BREAKER_WINDOW_SECONDS', '60'))
+    CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv('CIRCUIT_BREAKER_MIN_CALLS', '10'))
+    CIRCUIT_BREAKER_FAILURE_RATE = float(os.getenv('CIRCUIT_BREAKER_FAILURE_RATE', '0.5'))
+    CIRCUIT_BREAKER_SLOW_CALL_SECONDS = float(os.getenv('CIRCUIT_BREAKER_SLOW_CALL_SECONDS', '10'))
+    CIRCUIT_BREAKER_SLOW_CALL_RATE = float(os.getenv('CIRCUIT_BREAKER_SLOW_CALL_RATE', '0.8'))
+    CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv('CIRCUIT_BREAKER_OPEN_SECONDS', '30'))
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_BREAKER_HALF_OPEN_CALLS', '3'))
+    
+    # LLM / 嵌入後端：gemini 或 fake（本機模擬，壓測用）
+    LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini').lower()
+    FAKE_LLM_URL = os.getenv('FAKE_LLM_URL', '')  # 空值為同進程模擬，否則連到 python -m services.fake_llm
+    FAKE_LLM_TTFT_MS = float(os.getenv('FAKE_LLM_TTFT_MS', '400'))
+    FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv('FAKE_LLM_TOKENS_PER_SECOND', '60'))
+    FAKE_LLM_CHUNK_TOKENS = int(os.getenv('FAKE_LLM_CHUNK_TOKENS', '4'))
+    FAKE_LLM_OUTPUT_TOKENS = int(os.getenv('FAKE_LLM_OUTPUT_TOKENS', '200'))
+    FAKE_LLM_JITTER = float(os.getenv('FAKE_LLM_JITTER', '0.2'))
+    FAKE_LLM_ERROR_RATE = float(os.getenv('FAKE_LLM_ERROR_RATE', '0'))
+    FAKE_EMBEDDING_LATENCY_MS = float(os.getenv('FAKE_EMBEDDING_LATENCY_MS', '30'))
     
     # Gemini Embedding
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'models/embedding-001')
@@ -63,11 +103,68 @@ class Config:
     ALLOWED_EXTENSIONS = set(os.getenv('ALLOWED_EXTENSIONS', 'pdf,docx,txt,md,csv,xlsx').split(','))
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', './uploads')
     
+    # Bulk Upload
+    BULK_MAX_UPLOAD_SIZE = int(os.getenv('BULK_MAX_UPLOAD_SIZE', 500)) * 1024 * 1024  # Convert to bytes
+    BULK_MAX_FILES = int(os.getenv('BULK_MAX_FILES', 1000))
+    
+    # Ingestion Pipeline
+    INGEST_PARSE_WORKERS = int(os.getenv('INGEST_PARSE_WORKERS', 2))
+    INGEST_EMBED_WORKERS = int(os.getenv('INGEST_EMBED_WORKERS', 2))
+    INGEST_EMBED_BATCH_SIZE = int(os.getenv('INGEST_EMBED_BATCH_SIZE', 100))
+    INGEST_RESUME_ON_STARTUP = os.getenv('INGEST_RESUME_ON_STARTUP', 'true').lower() == 'true'
+    INGEST_STALE_AFTER_SECONDS = int(os.getenv('INGEST_STALE_AFTER_SECONDS', 600))
+    INGEST_HEARTBEAT_SECONDS = int(os.getenv('INGEST_HEARTBEAT_SECONDS', 60))
+    INGEST_MAX_RESUMES = int(os.getenv('INGEST_MAX_RESUMES', 3))
+    
+    # Ingestion Scheduling
+    INGEST_MAX_IN_FLIGHT = int(os.getenv('INGEST_MAX_IN_FLIGHT', INGEST_PARSE_WORKERS + INGEST_EMBED_WORKERS))
+    INGEST_TENANT_MAX_CONCURRENT = int(os.getenv('INGEST_TENANT_MAX_CONCURRENT', 2))
+    INGEST_PLAN_WEIGHTS = {
+        plan.split(':')[0].strip(): int(plan.split(':')[1])
+        for plan in os.getenv('INGEST_PLAN_WEIGHTS', '標準版:1,專業版:2,企業版:4').split(',')
+        if ':' in plan
+    }
+    
+    # Parsed Text Cache
+    PARSE_CACHE_ENABLED = os.getenv('PARSE_CACHE_ENABLED', 'true').lower() == 'true'
+    PARSE_CACHE_DIR = os.getenv('PARSE_CACHE_DIR', './cache/parsed')
+    PARSE_CACHE_MAX_MB = int(os.getenv('PARSE_CACHE_MAX_MB', 1024))
+    
     # RAG
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 500))
     CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 50))
-    TOP_K_RETRIEVAL = int(os.getenv('TOP_K_RETRIEVAL', 5))
+    TOP_K_RETRIEVAL = int(os.getenv('TOP_K_RETRIEVAL', 15))
     RERANK_TOP_N = int(os.getenv('RERANK_TOP_N', 3))
+    RERANK_MMR_LAMBDA = float(os.getenv('RERANK_MMR_LAMBDA', 0.5))  # 1 為只看相關度，越小越重視多樣性
+    CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 2000))
+    
+    # Batch QA
+    BATCH_QA_MAX_QUESTIONS = int(os.getenv('BATCH_QA_MAX_QUESTIONS', 1000))
+    BATCH_QA_CONCURRENCY = int(os.getenv('BATCH_QA_CONCURRENCY', 8))
+    BATCH_QA_RATE_PER_SECOND = float(os.getenv('BATCH_QA_RATE_PER_SECOND', 5))
+    
+    # Conversation History
+    HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 1500))
+    HISTORY_MAX_MESSAGES = int(os.getenv('HISTORY_MAX_MESSAGES', 20))
+    HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv('HISTORY_SUMMARY_MAX_TOKENS', 300))
+    
+    # Semantic Answer Cache
+    ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'false').lower() == 'true'
+    ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', 1000))
+    ANSWER_CACHE_TTL_SECONDS = int(os.getenv('ANSWER_CACHE_TTL_SECONDS', 86400))
+    
+    # Chat Concurrency
+    SINGLEFLIGHT_ENABLED = os.getenv('SINGLEFLIGHT_ENABLED', 'true').lower() == 'true'
+    CHAT_IO_WORKERS = int(os.getenv('CHAT_IO_WORKERS', 16))
+    CHAT_WRITE_WORKERS = int(os.getenv('CHAT_WRITE_WORKERS', 4))
+    
+    # Usage Accounting
+    USAGE_FLUSH_INTERVAL_SECONDS = int(os.getenv('USAGE_FLUSH_INTERVAL_SECONDS', 10))
+    
+    # ASGI Serving
+    ASYNC_MONGODB_POOL_SIZE = int(os.getenv('ASYNC_MONGODB_POOL_SIZE', 100))
+    ASGI_THREAD_POOL_SIZE = int(os.getenv('ASGI_THREAD_POOL_SIZE', 64))
     
     # Rate Limiting
     RATE_LIMIT_DEFAULT = os.getenv('RATE_LIMIT_DEFAULT', '100 per hour')
@@ -76,6 +173,9 @@ class Config:
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(',')
     
+    # Metrics
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FILE = os.getenv('LOG_FILE', './logs/app.log')
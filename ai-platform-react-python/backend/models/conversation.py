@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, List
 from pydantic import BaseModel, Field
+from bson import ObjectId
 
 
 class MessageRole:
@@ -12,12 +13,35 @@ class MessageRole:
 
 class Message(BaseModel):
     """消息模型"""
+    id: Optional[str] = None
     role: str
     content: str
     sources: List[dict] = Field(default_factory=list)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
+class ConversationSummary(BaseModel):
+    """對話列表項目（不含消息）"""
+    id: str
+    title: str = "新對話"
+    user_id: Optional[str] = None
+    message_count: int = 0
+    last_message_preview: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+# 對話列表只讀取的欄位
+CONVERSATION_SUMMARY_PROJECTION = {
+    'title': 1,
+    'user_id': 1,
+    'message_count': 1,
+    'last_message_preview': 1,
+    'created_at': 1,
+    'updated_at': 1
+}
+
+
 class ConversationCreate(BaseModel):
     """對話創建模型"""
     tenant_id: str
@@ -31,8 +55,11 @@ class Conversation(BaseModel):
     tenant_id: str
     user_id: Optional[str] = None
     title: str = "新對話"
-    messages: List[Message] = Field(default_factory=list)
+    messages: List[Message] = Field(default_factory=list)  # 舊版內嵌消息，新消息存於 messages 集合
     message_count: int = 0
+    last_message_preview: Optional[str] = None
+    history_summary: Optional[str] = None  # 較早輪次的滾動摘要
+    summarized_until: Optional[datetime] = None  # 已納入摘要的最後一條消息時間
     token_usage: dict = Field(default_factory=dict)
     metadata: dict = Field(default_factory=dict)
     created_at: datetime = Field(default_factory=datetime.utcnow)
@@ -56,6 +83,9 @@ class ChatResponse(BaseModel):
     message: str
     sources: List[dict] = Field(default_factory=list)
     token_usage: dict = Field(default_factory=dict)
+    cached: bool = False
+    context_stats: dict = Field(default_factory=dict)
+    timings: dict = Field(default_factory=dict)
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 
@@ -72,3 +102,28 @@ def dict_to_conversation(data: dict) -> Conversation:
         data['id'] = str(data['_id'])
         del data['_id']
     return Conversation(**data)
+
+
+def dict_to_conversation_summary(data: dict) -> ConversationSummary:
+    """將投影後的對話文檔轉換為列表項目"""
+    if '_id' in data:
+        data['id'] = str(data['_id'])
+        del data['_id']
+    return ConversationSummary(**data)
+
+
+def message_to_dict(message: Message, conversation_id: str, tenant_id: str) -> dict:
+    """將消息對象轉換為 messages 集合的文檔"""
+    data = message.dict()
+    data['_id'] = data.pop('id') or str(ObjectId())
+    data['conversation_id'] = conversation_id
+    data['tenant_id'] = tenant_id
+    return data
+
+
+def dict_to_message(data: dict) -> Message:
+    """將 messages 集合的文檔轉換為消息對象"""
+    if '_id' in data:
+        data['id'] = str(data['_id'])
+        del data['_id']
+    return Message(**data)
@@ -11,6 +11,22 @@ class DocumentStatus:
     FAILED = "failed"
 
 
+class RagImportStatus:
+    """RAG Engine 匯入狀態常量"""
+    PENDING = "pending"
+    SUBMITTING = "submitting"
+    IMPORTING = "importing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class BatchStatus:
+    """批次上傳狀態常量"""
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    COMPLETED_WITH_ERRORS = "completed_with_errors"
+
+
 class DocumentCreate(BaseModel):
     """文件創建模型"""
     filename: str
@@ -27,6 +43,7 @@ class Document(BaseModel):
     file_path: str
     file_size: int
     file_type: str
+    content_hash: Optional[str] = None
     status: str = DocumentStatus.UPLOADING
     chunks_count: int = 0
     text_preview: Optional[str] = None
@@ -34,6 +51,13 @@ class Document(BaseModel):
     keywords: List[str] = Field(default_factory=list)
     metadata: dict = Field(default_factory=dict)
     error_message: Optional[str] = None
+    processing_stats: dict = Field(default_factory=dict)
+    batch_id: Optional[str] = None
+    rag_status: Optional[str] = None
+    rag_operation: Optional[str] = None
+    rag_gcs_uri: Optional[str] = None
+    rag_file_names: List[str] = Field(default_factory=list)
+    rag_error: Optional[str] = None
     processed_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -55,3 +79,36 @@ def dict_to_document(data: dict) -> Document:
         data['id'] = str(data['_id'])
         del data['_id']
     return Document(**data)
+
+
+class IngestionBatch(BaseModel):
+    """批次上傳模型"""
+    id: str
+    tenant_id: str
+    status: str = BatchStatus.PROCESSING
+    total_files: int = 0
+    processed_files: int = 0
+    succeeded_files: int = 0
+    failed_files: int = 0
+    document_ids: List[str] = Field(default_factory=list)
+    skipped_files: List[dict] = Field(default_factory=list)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    
+    class Config:
+        from_attributes = True
+
+
+def batch_to_dict(batch: IngestionBatch) -> dict:
+    """將批次對象轉換為字典"""
+    data = batch.dict()
+    data['_id'] = data.pop('id')
+    return data
+
+
+def dict_to_batch(data: dict) -> IngestionBatch:
+    """將字典轉換為批次對象"""
+    if '_id' in data:
+        data['id'] = str(data['_id'])
+        del data['_id']
+    return IngestionBatch(**data)
@@ -0,0 +1,118 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt
+from services.document_service import DocumentService
+from services.ingestion_scheduler import ingestion_scheduler
+from utils.parse_cache import parse_cache
+from utils.answer_cache import answer_cache
+from utils.logger import logger
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/v1/admin')
+
+
+@admin_bp.route('/parse-cache', methods=['GET'])
+@jwt_required()
+def get_parse_cache_stats():
+    """獲取解析文本快取統計（平台管理員）"""
+    try:
+        claims = get_jwt()
+        role = claims.get('role', '')
+        
+        if role != 'platform_admin':
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        return jsonify({
+            'success': True,
+            'stats': parse_cache.get_stats()
+        }), 200
+    except Exception as e:
+        logger.error(f"獲取解析快取統計錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
+@admin_bp.route('/tenants/<tenant_id>/ingestion-stats', methods=['GET'])
+@jwt_required()
+def get_ingestion_stats(tenant_id):
+    """獲取租戶最近文件匯入各階段 p50/p95"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        role = claims.get('role', '')
+        
+        # 檢查權限：平台管理員或同租戶的租戶管理員
+        if role not in ['platform_admin', 'tenant_admin'] or (role == 'tenant_admin' and user_tenant_id != tenant_id):
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        limit = min(request.args.get('limit', 200, type=int), 1000)
+        stats = DocumentService.get_ingestion_stats(tenant_id, limit)
+        
+        return jsonify({
+            'success': True,
+            'stats': stats
+        }), 200
+    except Exception as e:
+        logger.error(f"獲取匯入統計錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
+@admin_bp.route('/ingestion-queue', methods=['GET'])
+@jwt_required()
+def get_ingestion_queue():
+    """獲取各租戶匯入佇列長度與等待時間（平台管理員）"""
+    try:
+        claims = get_jwt()
+        role = claims.get('role', '')
+        
+        if role != 'platform_admin':
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        return jsonify({
+            'success': True,
+            'queue': ingestion_scheduler.get_stats()
+        }), 200
+    except Exception as e:
+        logger.error(f"獲取匯入佇列統計錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
+@admin_bp.route('/answer-cache', methods=['GET'])
+@jwt_required()
+def get_answer_cache_stats():
+    """獲取各租戶語意回答快取命中率與節省的 token 數（平台管理員）"""
+    try:
+        claims = get_jwt()
+        role = claims.get('role', '')
+        
+        if role != 'platform_admin':
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        return jsonify({
+            'success': True,
+            'stats': answer_cache.get_stats()
+        }), 200
+    except Exception as e:
+        logger.error(f"獲取語意回答快取統計錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
@@ -0,0 +1,203 @@
+from quart import Blueprint, request, jsonify, Response
+from pydantic import ValidationError
+from models.conversation import ChatRequest
+from services.async_chat_service import AsyncChatService
+from services.chat_service import CONVERSATION_PAGE_SIZE
+from services.gemini_client import LLMUnavailableError, ContentBlockedError
+from routes.chat import format_sse
+from utils.async_auth import jwt_required_async, get_jwt, get_jwt_identity
+from utils.logger import logger
+
+# 與 routes/chat.py 相同的路由與權限規則（批次問答除外），由 asgi.py 提供服務
+async_chat_bp = Blueprint('async_chat', __name__, url_prefix='/v1/tenants/<tenant_id>/chat')
+
+
+@async_chat_bp.route('', methods=['POST'])
+@jwt_required_async
+async def chat(tenant_id):
+    """發送聊天消息"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        user_id = get_jwt_identity()
+        
+        # 檢查權限
+        if user_tenant_id != tenant_id:
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        data = await request.get_json()
+        chat_request = ChatRequest(**data)
+        
+        # 處理聊天請求
+        response = await AsyncChatService.chat(tenant_id, chat_request, user_id)
+        
+        return jsonify({
+            'success': True,
+            'conversation_id': response.conversation_id,
+            'message': response.message,
+            'sources': response.sources,
+            'token_usage': response.token_usage,
+            'cached': response.cached,
+            'context_stats': response.context_stats,
+            'timings': response.timings,
+            'timestamp': response.timestamp.isoformat()
+        }), 200
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'message': '數據驗證失敗',
+            'errors': e.errors()
+        }), 400
+    except LLMUnavailableError as e:
+        logger.error(f"聊天錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'AI 服務暫時無法使用，請稍後再試'
+        }), 503
+    except ContentBlockedError as e:
+        logger.warning(f"聊天回應被攔截: {e}")
+        return jsonify({
+            'success': False,
+            'message': '回應被安全機制攔截，請調整問題後再試'
+        }), 422
+    except Exception as e:
+        logger.error(f"聊天錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@async_chat_bp.route('/stream', methods=['POST'])
+@jwt_required_async
+async def chat_stream(tenant_id):
+    """串流聊天消息（Server-Sent Events）"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        user_id = get_jwt_identity()
+        
+        # 檢查權限
+        if user_tenant_id != tenant_id:
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        data = await request.get_json()
+        chat_request = ChatRequest(**data)
+        chat_request.stream = True
+        
+        async def generate():
+            # 客戶端中斷時伺服器會取消此生成器，連帶關閉 chat_stream 並停止 LLM 生成
+            events = AsyncChatService.chat_stream(tenant_id, chat_request, user_id)
+            try:
+                async for event in events:
+                    yield format_sse(event['event'], event['data']).encode('utf-8')
+            except Exception as e:
+                logger.error(f"串流錯誤: {e}")
+                yield format_sse('error', {'message': str(e)}).encode('utf-8')
+            finally:
+                await events.aclose()
+        
+        response = Response(
+            generate(),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        response.timeout = None
+        return response
+    except ValidationError as e:
+        return jsonify({
+            'success': False,
+            'message': '數據驗證失敗',
+            'errors': e.errors()
+        }), 400
+    except Exception as e:
+        logger.error(f"串流聊天錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+
+@async_chat_bp.route('/conversations', methods=['GET'])
+@jwt_required_async
+async def get_conversations(tenant_id):
+    """獲取對話列表（?limit=&cursor= 分頁）"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        user_id = get_jwt_identity()
+        
+        # 檢查權限
+        if user_tenant_id != tenant_id:
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        page = await AsyncChatService.get_conversations(
+            tenant_id,
+            user_id,
+            limit=request.args.get('limit', CONVERSATION_PAGE_SIZE, type=int),
+            cursor=request.args.get('cursor')
+        )
+        
+        return jsonify({
+            'success': True,
+            'conversations': page['conversations'],
+            'next_cursor': page['next_cursor']
+        }), 200
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"獲取對話列表錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
+@async_chat_bp.route('/conversations/<conversation_id>', methods=['GET'])
+@jwt_required_async
+async def get_conversation(tenant_id, conversation_id):
+    """獲取對話詳情"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        
+        # 檢查權限
+        if user_tenant_id != tenant_id:
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        conversation = await AsyncChatService.get_conversation(conversation_id, tenant_id)
+        
+        if conversation:
+            return jsonify({
+                'success': True,
+                'conversation': conversation
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'message': '對話不存在'
+            }), 404
+    except Exception as e:
+        logger.error(f"獲取對話錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
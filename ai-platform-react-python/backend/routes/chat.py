@@ -1,13 +1,21 @@
+import json
 from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from pydantic import ValidationError
 from models.conversation import ChatRequest
-from services.chat_service import ChatService
+from services.chat_service import ChatService, CONVERSATION_PAGE_SIZE
+from services.gemini_client import LLMUnavailableError, ContentBlockedError
+from services.batch_qa_service import BatchQAService
 from utils.logger import logger
 
 chat_bp = Blueprint('chat', __name__, url_prefix='/v1/tenants/<tenant_id>/chat')
 
 
+def format_sse(event: str, data: dict) -> str:
+    """格式化 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
 @chat_bp.route('', methods=['POST'])
 @jwt_required()
 def chat(tenant_id):
@@ -36,6 +44,9 @@ def chat(tenant_id):
             'message': response.message,
             'sources': response.sources,
             'token_usage': response.token_usage,
+            'cached': response.cached,
+            'context_stats': response.context_stats,
+            'timings': response.timings,
             'timestamp': response.timestamp.isoformat()
         }), 200
     except ValidationError as e:
@@ -44,6 +55,18 @@ def chat(tenant_id):
             'message': '數據驗證失敗',
             'errors': e.errors()
         }), 400
+    except LLMUnavailableError as e:
+        logger.error(f"聊天錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'AI 服務暫時無法使用，請稍後再試'
+        }), 503
+    except ContentBlockedError as e:
+        logger.warning(f"聊天回應被攔截: {e}")
+        return jsonify({
+            'success': False,
+            'message': '回應被安全機制攔截，請調整問題後再試'
+        }), 422
     except Exception as e:
         logger.error(f"聊天錯誤: {e}")
         return jsonify({
@@ -73,12 +96,16 @@ def chat_stream(tenant_id):
         chat_request.stream = True
         
         def generate():
+            # 客戶端中斷時 Werkzeug 會關閉此生成器，連帶關閉 chat_stream 並停止 LLM 生成
+            events = ChatService.chat_stream(tenant_id, chat_request, user_id)
             try:
-                for chunk in ChatService.chat_stream(tenant_id, chat_request, user_id):
-                    yield f"data: {chunk}\n\n"
+                for event in events:
+                    yield format_sse(event['event'], event['data'])
             except Exception as e:
                 logger.error(f"串流錯誤: {e}")
-                yield f"data: [ERROR] {str(e)}\n\n"
+                yield format_sse('error', {'message': str(e)})
+            finally:
+                events.close()
         
         return Response(
             stream_with_context(generate()),
@@ -102,10 +129,55 @@ def chat_stream(tenant_id):
         }), 500
 
 
+@chat_bp.route('/batch', methods=['POST'])
+@jwt_required()
+def chat_batch(tenant_id):
+    """批次問答（不建立對話），以 JSONL 串流回傳每題結果，最後一行為 {"summary": ...}"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        role = claims.get('role', '')
+        
+        # 檢查權限：平台管理員或同租戶的租戶管理員
+        if role not in ['platform_admin', 'tenant_admin'] or (role == 'tenant_admin' and user_tenant_id != tenant_id):
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        data = request.get_json() or {}
+        items = BatchQAService.normalize_items(data.get('questions') or [])
+        
+        def generate():
+            results = BatchQAService.run(tenant_id, items)
+            try:
+                for record in results:
+                    yield json.dumps(record, ensure_ascii=False, default=str) + '\n'
+            finally:
+                results.close()
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'X-Accel-Buffering': 'no'}
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"批次問答錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
 @chat_bp.route('/conversations', methods=['GET'])
 @jwt_required()
 def get_conversations(tenant_id):
-    """獲取對話列表"""
+    """獲取對話列表（?limit=&cursor= 分頁）"""
     try:
         claims = get_jwt()
         user_tenant_id = claims.get('tenant_id', '')
@@ -118,12 +190,23 @@ def get_conversations(tenant_id):
                 'message': '權限不足'
             }), 403
         
-        conversations = ChatService.get_conversations(tenant_id, user_id)
+        page = ChatService.get_conversations(
+            tenant_id,
+            user_id,
+            limit=request.args.get('limit', CONVERSATION_PAGE_SIZE, type=int),
+            cursor=request.args.get('cursor')
+        )
         
         return jsonify({
             'success': True,
-            'conversations': conversations
+            'conversations': page['conversations'],
+            'next_cursor': page['next_cursor']
         }), 200
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         logger.error(f"獲取對話列表錯誤: {e}")
         return jsonify({
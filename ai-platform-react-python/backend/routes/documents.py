@@ -69,7 +69,7 @@ def upload_document(tenant_id):
         if document:
             return jsonify({
                 'success': True,
-                'message': '文件上傳成功',
+                'message': '文件上傳成功，正在背景處理',
                 'document': document
             }), 201
         else:
@@ -85,6 +85,85 @@ def upload_document(tenant_id):
         }), 500
 
 
+@documents_bp.route('/bulk-upload', methods=['POST'])
+@jwt_required()
+def bulk_upload_documents(tenant_id):
+    """批次上傳多個文件或 zip 壓縮檔"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        
+        # 檢查權限
+        if user_tenant_id != tenant_id:
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        files = [f for f in request.files.getlist('files') if f.filename]
+        
+        if not files:
+            return jsonify({
+                'success': False,
+                'message': '沒有文件'
+            }), 400
+        
+        batch = DocumentService.bulk_upload(files, tenant_id)
+        
+        if batch:
+            return jsonify({
+                'success': True,
+                'message': '批次上傳已接收，正在背景處理',
+                'batch': batch
+            }), 202
+        else:
+            return jsonify({
+                'success': False,
+                'message': '批次上傳失敗'
+            }), 500
+    except Exception as e:
+        logger.error(f"批次上傳錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
+@documents_bp.route('/batches/<batch_id>', methods=['GET'])
+@jwt_required()
+def get_batch(tenant_id, batch_id):
+    """獲取批次上傳進度"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        
+        # 檢查權限
+        if user_tenant_id != tenant_id:
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        batch = DocumentService.get_batch(batch_id, tenant_id)
+        
+        if batch:
+            return jsonify({
+                'success': True,
+                'batch': batch
+            }), 200
+        else:
+            return jsonify({
+                'success': False,
+                'message': '批次不存在'
+            }), 404
+    except Exception as e:
+        logger.error(f"獲取批次進度錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
 @documents_bp.route('', methods=['GET'])
 @jwt_required()
 def get_documents(tenant_id):
@@ -148,3 +227,40 @@ def delete_document(tenant_id, document_id):
             'success': False,
             'message': '伺服器錯誤'
         }), 500
+
+
+@documents_bp.route('/<document_id>/retry', methods=['POST'])
+@jwt_required()
+def retry_document(tenant_id, document_id):
+    """重試處理失敗的文件（從檢查點繼續）"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        role = claims.get('role', '')
+        
+        # 檢查權限
+        if user_tenant_id != tenant_id or role not in ['tenant_admin', 'platform_admin']:
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        document = DocumentService.retry_document(document_id, tenant_id)
+        
+        if document:
+            return jsonify({
+                'success': True,
+                'message': '文件已重新排入處理',
+                'document': document
+            }), 202
+        else:
+            return jsonify({
+                'success': False,
+                'message': '文件不存在或不是失敗狀態'
+            }), 400
+    except Exception as e:
+        logger.error(f"重試文件處理錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required, get_jwt
 from pydantic import ValidationError
 from models.tenant import TenantCreate, TenantUpdate
 from services.tenant_service import TenantService
+from services.usage_aggregator import usage_aggregator, USAGE_FIELDS
 from utils.logger import logger
 
 tenants_bp = Blueprint('tenants', __name__, url_prefix='/v1/tenants')
@@ -73,6 +74,38 @@ def get_tenant(tenant_id):
         }), 500
 
 
+@tenants_bp.route('/<tenant_id>/usage', methods=['GET'])
+@jwt_required()
+def get_tenant_usage(tenant_id):
+    """獲取租戶每日 token 用量"""
+    try:
+        claims = get_jwt()
+        user_tenant_id = claims.get('tenant_id', '')
+        role = claims.get('role', '')
+        
+        # 檢查權限：平台管理員或同租戶的租戶管理員
+        if role not in ['platform_admin', 'tenant_admin'] or (role == 'tenant_admin' and user_tenant_id != tenant_id):
+            return jsonify({
+                'success': False,
+                'message': '權限不足'
+            }), 403
+        
+        days = max(1, min(request.args.get('days', 30, type=int), 366))
+        daily = usage_aggregator.get_daily_usage(tenant_id, days)
+        
+        return jsonify({
+            'success': True,
+            'daily': daily,
+            'total': {field: sum(day[field] for day in daily) for field in USAGE_FIELDS}
+        }), 200
+    except Exception as e:
+        logger.error(f"獲取租戶用量錯誤: {e}")
+        return jsonify({
+            'success': False,
+            'message': '伺服器錯誤'
+        }), 500
+
+
 @tenants_bp.route('', methods=['POST'])
 @jwt_required()
 def create_tenant():
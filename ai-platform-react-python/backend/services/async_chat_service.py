@@ -0,0 +1,306 @@
+import asyncio
+from typing import Optional, Dict, AsyncGenerator, List, Tuple
+from models.conversation import (
+    ChatRequest, ChatResponse, Message, MessageRole,
+    conversation_to_dict, dict_to_conversation, dict_to_message,
+    CONVERSATION_SUMMARY_PROJECTION
+)
+from services.chat_service import (
+    ChatService, CONVERSATION_PAGE_SIZE, CONVERSATION_PAGE_MAX, CONVERSATION_LIST_SORT
+)
+from services.llm_service import llm_service
+from services.history_service import HistoryService
+from utils.answer_cache import answer_cache
+from utils.async_db import get_async_conversations_collection, get_async_messages_collection
+from utils.metrics import StageRecorder
+from utils.logger import logger
+
+
+class AsyncChatService:
+    """對話服務（asyncio 版本，供 ASGI 服務使用）
+
+    等待 Gemini 與 MongoDB 時不佔用執行緒；檢索仍是同步程式碼，改在執行緒池執行。
+    提示詞、來源、回應與寫入內容的組裝共用 ChatService 的靜態方法，這裡只有 I/O 不同；
+    檢索經由 retrieval_flight、生成經由 generation_flight 合併相同的並行請求，與 Flask 服務相同。
+    """
+    
+    _pending_saves: Dict[str, asyncio.Task] = {}
+    
+    @staticmethod
+    async def create_conversation(tenant_id: str, user_id: Optional[str] = None, title: str = "新對話") -> Optional[dict]:
+        """創建新對話"""
+        try:
+            conversation = ChatService._new_conversation(tenant_id, user_id, title)
+            
+            conversations_collection = get_async_conversations_collection()
+            await conversations_collection.insert_one(conversation_to_dict(conversation))
+            
+            logger.info(f"創建新對話: {conversation.id}")
+            return conversation.dict()
+        except Exception as e:
+            logger.error(f"創建對話失敗: {e}")
+            return None
+    
+    @staticmethod
+    async def _get_or_create_conversation(
+        tenant_id: str,
+        conversation_id: Optional[str],
+        user_id: Optional[str] = None
+    ) -> str:
+        """獲取或創建對話，返回對話 ID"""
+        if conversation_id:
+            conversations_collection = get_async_conversations_collection()
+            conv_data = await conversations_collection.find_one(
+                {'_id': conversation_id, 'tenant_id': tenant_id},
+                {'_id': 1}
+            )
+            
+            if conv_data:
+                return str(conv_data['_id'])
+            
+            logger.warning(f"對話不存在: {conversation_id}")
+        
+        conversation = await AsyncChatService.create_conversation(tenant_id, user_id)
+        if not conversation:
+            raise Exception("創建對話失敗")
+        return conversation['id']
+    
+    @staticmethod
+    async def _load_conversation(
+        tenant_id: str,
+        conversation_id: Optional[str],
+        user_id: Optional[str] = None
+    ) -> Tuple[str, List[Dict]]:
+        """獲取或創建對話並組裝歷史，返回 (對話 ID, 歷史消息)"""
+        conv_id = await AsyncChatService._get_or_create_conversation(tenant_id, conversation_id, user_id)
+        if conv_id != conversation_id:
+            return conv_id, []
+        
+        # 上一輪仍在背景寫入時先等待，確保歷史包含上一輪
+        pending = AsyncChatService._pending_saves.get(conv_id)
+        if pending is not None:
+            await asyncio.wait([pending])
+        
+        return conv_id, await HistoryService.build_history_async(conv_id)
+    
+    @staticmethod
+    async def _prepare_turn(
+        tenant_id: str,
+        request: ChatRequest,
+        user_id: Optional[str],
+        timings: StageRecorder
+    ) -> Dict:
+        """準備本輪對話：對話讀取／建立與查詢嵌入＋檢索並行執行"""
+        async def load_conversation():
+            with timings.stage('conversation'):
+                return await AsyncChatService._load_conversation(
+                    tenant_id, request.conversation_id, user_id
+                )
+        
+        with timings.stage('prepare'):
+            cache_version = answer_cache.version(tenant_id) if answer_cache.enabled else None
+            (conv_id, history), (query_embedding, retrieved_docs) = await asyncio.gather(
+                load_conversation(),
+                asyncio.to_thread(
+                    ChatService._timed, timings, 'retrieval',
+                    ChatService._retrieve, tenant_id, request.message
+                )
+            )
+        
+        return ChatService._finish_prepare(
+            tenant_id, request.message, cache_version, conv_id, history, query_embedding, retrieved_docs
+        )
+    
+    @staticmethod
+    async def _save_turn(
+        conv_id: str,
+        tenant_id: str,
+        user_message: Message,
+        assistant_message: Message,
+        token_usage: Dict
+    ) -> None:
+        """保存本輪對話：消息以單次 insert 追加到 messages 集合，對話計數以 $inc 更新"""
+        message_docs, conversation_update = ChatService._turn_writes(conv_id, tenant_id, user_message, assistant_message)
+        
+        messages_collection = get_async_messages_collection()
+        await messages_collection.insert_many(message_docs)
+        
+        conversations_collection = get_async_conversations_collection()
+        await conversations_collection.update_one({'_id': conv_id}, conversation_update)
+        
+        ChatService._after_save(conv_id, tenant_id, token_usage)
+    
+    @staticmethod
+    async def _run_save(*args) -> None:
+        """背景保存對話，錯誤只記錄不拋出"""
+        try:
+            await AsyncChatService._save_turn(*args)
+        except Exception as e:
+            logger.error(f"背景保存對話失敗: {args[0]}: {e}")
+    
+    @staticmethod
+    def _save_turn_background(
+        conv_id: str,
+        tenant_id: str,
+        user_message: Message,
+        assistant_message: Message,
+        token_usage: Dict
+    ) -> None:
+        """寫後保存：回應先返回，對話寫入在背景任務完成"""
+        task = asyncio.create_task(
+            AsyncChatService._run_save(conv_id, tenant_id, user_message, assistant_message, token_usage)
+        )
+        AsyncChatService._pending_saves[conv_id] = task
+        
+        def clear(finished):
+            if AsyncChatService._pending_saves.get(conv_id) is finished:
+                del AsyncChatService._pending_saves[conv_id]
+        
+        task.add_done_callback(clear)
+    
+    @staticmethod
+    async def chat(tenant_id: str, request: ChatRequest, user_id: Optional[str] = None) -> ChatResponse:
+        """處理聊天請求"""
+        try:
+            timings = StageRecorder()
+            user_message = Message(role=MessageRole.USER, content=request.message)
+            
+            # 並行：獲取或創建對話、嵌入與 RAG 檢索
+            turn = await AsyncChatService._prepare_turn(tenant_id, request, user_id, timings)
+            conv_id = turn['conv_id']
+            
+            # 語意回答快取
+            cached = turn['cached']
+            if cached:
+                AsyncChatService._save_turn_background(
+                    conv_id, tenant_id, user_message, ChatService._cached_message(cached), {}
+                )
+                return ChatService._cached_response(conv_id, cached, timings)
+            
+            logger.info("生成 LLM 回應...")
+            with timings.stage('generation'):
+                llm_response = await llm_service.generate_response_async(
+                    **ChatService._llm_request(request.message, turn)
+                )
+            
+            assistant_message = ChatService._answer_message(tenant_id, turn, llm_response)
+            token_usage = llm_response.get('token_usage', {})
+            
+            # 更新對話（寫後保存，不阻塞回應）
+            AsyncChatService._save_turn_background(conv_id, tenant_id, user_message, assistant_message, token_usage)
+            
+            return ChatService._answer_response(conv_id, assistant_message, token_usage, turn, timings)
+        except Exception as e:
+            logger.error(f"聊天處理失敗: {e}")
+            raise
+    
+    @staticmethod
+    async def chat_stream(tenant_id: str, request: ChatRequest, user_id: Optional[str] = None) -> AsyncGenerator[Dict, None]:
+        """處理串流聊天請求，事件格式與 ChatService.chat_stream 相同
+
+        客戶端中斷時 ASGI 伺服器會取消生成器，LLM 串流隨之關閉，本輪對話不保存。
+        """
+        completed = False
+        llm_stream = None
+        try:
+            timings = StageRecorder()
+            user_message = Message(role=MessageRole.USER, content=request.message)
+            
+            turn = await AsyncChatService._prepare_turn(tenant_id, request, user_id, timings)
+            conv_id = turn['conv_id']
+            
+            # 語意回答快取命中時整段回答以單一 delta 送出
+            cached = turn['cached']
+            if cached:
+                for event in ChatService._cached_stream_events(conv_id, cached):
+                    yield event
+                await AsyncChatService._save_turn(
+                    conv_id, tenant_id, user_message, ChatService._cached_message(cached), {}
+                )
+                completed = True
+                yield ChatService._stream_done_event(conv_id, {}, timings)
+                return
+            
+            sources = ChatService._to_message_sources(turn['retrieved_docs'])
+            yield {'event': 'sources', 'data': {'conversation_id': conv_id, 'sources': sources}}
+            
+            content_parts = []
+            token_usage = {}
+            model = None
+            llm_stream = llm_service.stream_response_async(**ChatService._llm_request(request.message, turn))
+            with timings.stage('generation'):
+                async for event in llm_stream:
+                    if event['type'] == 'delta':
+                        content_parts.append(event['text'])
+                        yield {'event': 'delta', 'data': {'text': event['text']}}
+                    elif event['type'] == 'done':
+                        token_usage = event.get('token_usage', {})
+                        model = event.get('model')
+            
+            # 串流完成後保存對話
+            assistant_message = ChatService._stream_message(tenant_id, turn, sources, content_parts, token_usage, model)
+            await AsyncChatService._save_turn(conv_id, tenant_id, user_message, assistant_message, token_usage)
+            completed = True
+            
+            yield ChatService._stream_done_event(conv_id, token_usage, timings, turn)
+        except Exception as e:
+            logger.error(f"串流聊天失敗: {e}")
+            yield {'event': 'error', 'data': {'message': str(e)}}
+        finally:
+            if llm_stream is not None:
+                await llm_stream.aclose()
+            if not completed:
+                logger.info("串流聊天未完成（客戶端中斷或錯誤），本輪對話未保存")
+    
+    @staticmethod
+    async def get_conversations(
+        tenant_id: str,
+        user_id: Optional[str] = None,
+        limit: int = CONVERSATION_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Dict:
+        """獲取對話列表（只含摘要欄位），返回 {'conversations', 'next_cursor'}"""
+        limit = max(1, min(limit, CONVERSATION_PAGE_MAX))
+        query = ChatService._conversation_list_query(tenant_id, user_id, cursor)
+        
+        try:
+            conversations_collection = get_async_conversations_collection()
+            docs = await (
+                conversations_collection.find(query, CONVERSATION_SUMMARY_PROJECTION)
+                .sort(CONVERSATION_LIST_SORT)
+                .limit(limit + 1)
+                .to_list(length=limit + 1)
+            )
+            
+            return ChatService._conversation_page(docs, limit)
+        except Exception as e:
+            logger.error(f"獲取對話列表失敗: {e}")
+            return {'conversations': [], 'next_cursor': None}
+    
+    @staticmethod
+    async def get_conversation(conversation_id: str, tenant_id: str) -> Optional[dict]:
+        """獲取對話詳情"""
+        try:
+            conversations_collection = get_async_conversations_collection()
+            conv_data = await conversations_collection.find_one({
+                '_id': conversation_id,
+                'tenant_id': tenant_id
+            })
+            
+            if not conv_data:
+                return None
+            
+            conversation = dict_to_conversation(conv_data)
+            
+            # 已遷移或新版對話的消息存於 messages 集合
+            if not conversation.messages:
+                messages_collection = get_async_messages_collection()
+                docs = await messages_collection.find(
+                    {'conversation_id': conversation.id}
+                ).sort('timestamp', 1).to_list(length=None)
+                conversation.messages = [dict_to_message(doc) for doc in docs]
+            
+            return conversation.dict()
+        except Exception as e:
+            logger.error(f"獲取對話詳情失敗: {e}")
+            return None
@@ -68,7 +68,7 @@ class AuthService:
             
             # 更新最後登入時間
             users_collection.update_one(
-                {'_id': ObjectId(user.id)},
+                {'_id': user.id},
                 {'$set': {'last_login': datetime.utcnow()}}
             )
             
@@ -99,7 +99,7 @@ class AuthService:
         """根據 ID 獲取用戶"""
         try:
             users_collection = get_users_collection()
-            user_doc = users_collection.find_one({'_id': ObjectId(user_id)})
+            user_doc = users_collection.find_one({'_id': user_id})
             
             if not user_doc:
                 return None
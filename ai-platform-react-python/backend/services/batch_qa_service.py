@@ -0,0 +1,166 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Generator, List, Union
+from services.retrieval_service import RetrievalService
+from services.llm_service import llm_service
+from services.usage_aggregator import usage_aggregator
+from services.chat_service import ChatService
+from utils.context_packer import ContextPacker
+from utils.rate_limiter import RateLimiter
+from utils.metrics import metrics, percentile
+from utils.logger import logger
+from config import get_config
+
+config = get_config()
+
+
+class BatchQAService:
+    """批次問答：整批查詢一次嵌入與向量搜尋，LLM 生成在限速下並行，不建立對話
+
+    用於知識庫離線評估與 FAQ 預先生成，token 用量仍計入租戶。
+    """
+    
+    @staticmethod
+    def normalize_items(items: List[Union[str, Dict]]) -> List[Dict]:
+        """問題可為字串或含 question 欄位的物件（其他欄位如 id、expected 原樣帶到結果）"""
+        normalized = []
+        for item in items:
+            if isinstance(item, str):
+                item = {'question': item}
+            if not isinstance(item, dict) or not str(item.get('question', '')).strip():
+                raise ValueError('每個項目需為問題字串或含 question 欄位的物件')
+            normalized.append(item)
+        
+        if not normalized:
+            raise ValueError('問題列表不能為空')
+        if len(normalized) > config.BATCH_QA_MAX_QUESTIONS:
+            raise ValueError(f"單批最多 {config.BATCH_QA_MAX_QUESTIONS} 個問題")
+        return normalized
+    
+    @staticmethod
+    def _answer(tenant_id: str, item: Dict, docs: List[Dict], limiter: RateLimiter) -> Dict:
+        """為單一問題生成回答（不保存對話）"""
+        question = item['question']
+        packed_docs, context_stats = ContextPacker.pack(docs)
+        
+        waited = limiter.acquire()
+        started = time.monotonic()
+        try:
+            llm_response = llm_service.generate_response(
+                messages=llm_service.build_rag_prompt(query=question, context_docs=packed_docs),
+                grounding_sources=ChatService._to_grounding_sources(packed_docs)
+            )
+        except Exception as e:
+            logger.warning(f"批次問答生成失敗: {question[:50]}: {e}")
+            return {
+                **item,
+                'answer': None,
+                'error': str(e),
+                'sources': ChatService._to_message_sources(packed_docs),
+                'latency_ms': round((time.monotonic() - started) * 1000, 2),
+                'rate_limit_wait_ms': round(waited * 1000, 2),
+                'token_usage': {}
+            }
+        
+        token_usage = llm_response.get('token_usage', {})
+        usage_aggregator.record(tenant_id, None, token_usage)
+        return {
+            **item,
+            'answer': llm_response['content'],
+            'error': None,
+            'model': llm_response.get('model'),
+            'sources': ChatService._to_message_sources(packed_docs),
+            'context_tokens_saved': context_stats['tokens_saved'],
+            'latency_ms': round((time.monotonic() - started) * 1000, 2),
+            'rate_limit_wait_ms': round(waited * 1000, 2),
+            'token_usage': token_usage
+        }
+    
+    @staticmethod
+    def run(tenant_id: str, items: List[Union[str, Dict]]) -> Generator[Dict, None, None]:
+        """依完成順序產生每題結果，最後產生 {'summary': {...}}
+
+        呼叫端關閉生成器時取消尚未開始的生成。
+        """
+        items = BatchQAService.normalize_items(items)
+        started = time.monotonic()
+        
+        retrieval_started = time.monotonic()
+        retrieved = RetrievalService.retrieve_batch(tenant_id, [item['question'] for item in items])
+        retrieval_ms = round((time.monotonic() - retrieval_started) * 1000, 2)
+        logger.info(f"批次問答檢索完成: {len(items)} 題，{retrieval_ms} ms")
+        
+        limiter = RateLimiter(config.BATCH_QA_RATE_PER_SECOND, config.BATCH_QA_CONCURRENCY)
+        executor = ThreadPoolExecutor(max_workers=config.BATCH_QA_CONCURRENCY, thread_name_prefix='batch-qa')
+        latencies = []
+        totals = {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        failed = 0
+        try:
+            futures = {
+                executor.submit(BatchQAService._answer, tenant_id, item, docs, limiter): index
+                for index, (item, docs) in enumerate(zip(items, retrieved))
+            }
+            for future in as_completed(futures):
+                result = {'index': futures[future], **future.result()}
+                if result['error']:
+                    failed += 1
+                else:
+                    latencies.append(result['latency_ms'])
+                    for field in totals:
+                        totals[field] += int(result['token_usage'].get(field, 0) or 0)
+                yield result
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        wall_seconds = time.monotonic() - started
+        questions = metrics.counter('batch_qa_questions_total', '批次問答處理的問題數')
+        questions.inc(len(items) - failed, tenant=tenant_id, outcome='success')
+        questions.inc(failed, tenant=tenant_id, outcome='error')
+        
+        yield {'summary': {
+            'questions': len(items),
+            'succeeded': len(items) - failed,
+            'failed': failed,
+            'retrieval_ms': retrieval_ms,
+            'wall_ms': round(wall_seconds * 1000, 2),
+            'questions_per_second': round(len(items) / wall_seconds, 2) if wall_seconds else None,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 2),
+                'p95': round(percentile(latencies, 95), 2),
+                'max': round(max(latencies), 2) if latencies else 0.0
+            },
+            'token_usage': totals
+        }}
+
+
+def _read_items(path: str) -> List[Union[str, Dict]]:
+    """讀取問題檔：.jsonl 每行一個物件或字串，其他格式每行一個問題"""
+    with open(path, encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    if path.endswith('.jsonl'):
+        return [json.loads(line) for line in lines]
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批次問答：評估知識庫或預先生成 FAQ 回答，結果輸出為 JSONL')
+    parser.add_argument('--tenant', required=True, help='租戶 ID')
+    parser.add_argument('--input', required=True, help='問題檔（.jsonl 或每行一個問題的文字檔）')
+    parser.add_argument('--output', help='結果 JSONL 路徑（預設輸出到 stdout）')
+    args = parser.parse_args()
+    
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for record in BatchQAService.run(args.tenant, _read_items(args.input)):
+            if 'summary' in record:
+                print(json.dumps(record['summary'], ensure_ascii=False, indent=2), file=sys.stderr)
+            else:
+                output.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        usage_aggregator.flush()
@@ -1,177 +1,630 @@
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 from datetime import datetime
-from typing import Optional, Dict, Generator
+from typing import Optional, Dict, Generator, List, Tuple
 from bson import ObjectId
 from models.conversation import (
     Conversation, ConversationCreate, ChatRequest, ChatResponse,
-    Message, MessageRole, conversation_to_dict, dict_to_conversation
+    Message, MessageRole, conversation_to_dict, dict_to_conversation,
+    message_to_dict, dict_to_message, dict_to_conversation_summary,
+    CONVERSATION_SUMMARY_PROJECTION
 )
 from services.retrieval_service import RetrievalService
 from services.llm_service import llm_service
-from utils.db_manager import get_conversations_collection
+from services.history_service import HistoryService
+from services.usage_aggregator import usage_aggregator
+from services.embedding_service import embedding_service
+from utils.answer_cache import answer_cache
+from utils.context_packer import ContextPacker
+from utils.db_manager import get_conversations_collection, get_messages_collection
+from utils.metrics import metrics, StageRecorder
 from utils.logger import logger
+from config import get_config
+
+config = get_config()
+
+# 對話列表每頁筆數
+CONVERSATION_PAGE_SIZE = 50
+CONVERSATION_PAGE_MAX = 100
+
+# 對話列表排序（keyset 分頁鍵）
+CONVERSATION_LIST_SORT = [('updated_at', -1), ('_id', -1)]
 
 
 class ChatService:
-    """對話服務"""
+    """對話服務
+
+    不涉及 I/O 的步驟（提示詞、來源、回應與寫入內容的組裝）以靜態方法實作，AsyncChatService 共用。
+    """
+    
+    # 對話載入與檢索並行、對話寫後保存所用的執行緒池
+    _io_executor = ThreadPoolExecutor(max_workers=config.CHAT_IO_WORKERS, thread_name_prefix='chat-io')
+    _write_executor = ThreadPoolExecutor(max_workers=config.CHAT_WRITE_WORKERS, thread_name_prefix='chat-write')
+    _pending_saves: Dict[str, Future] = {}
+    _pending_lock = threading.Lock()
     
     @staticmethod
     def create_conversation(tenant_id: str, user_id: Optional[str] = None, title: str = "新對話") -> Optional[dict]:
         """創建新對話"""
         try:
-            conv_id = str(ObjectId())
-            conversation = Conversation(
-                id=conv_id,
-                tenant_id=tenant_id,
-                user_id=user_id,
-                title=title
-            )
+            conversation = ChatService._new_conversation(tenant_id, user_id, title)
             
             conversations_collection = get_conversations_collection()
             conversations_collection.insert_one(conversation_to_dict(conversation))
             
-            logger.info(f"創建新對話: {conv_id}")
+            logger.info(f"創建新對話: {conversation.id}")
             return conversation.dict()
         except Exception as e:
             logger.error(f"創建對話失敗: {e}")
             return None
     
+    @staticmethod
+    def _new_conversation(tenant_id: str, user_id: Optional[str], title: str) -> Conversation:
+        """建立新對話物件（尚未寫入）"""
+        return Conversation(
+            id=str(ObjectId()),
+            tenant_id=tenant_id,
+            user_id=user_id,
+            title=title
+        )
+    
+    @staticmethod
+    def _get_or_create_conversation(
+        tenant_id: str,
+        conversation_id: Optional[str],
+        user_id: Optional[str] = None
+    ) -> str:
+        """獲取或創建對話，返回對話 ID（只確認存在，不載入消息）"""
+        if conversation_id:
+            conversations_collection = get_conversations_collection()
+            conv_data = conversations_collection.find_one(
+                {'_id': conversation_id, 'tenant_id': tenant_id},
+                {'_id': 1}
+            )
+            
+            if conv_data:
+                return str(conv_data['_id'])
+            
+            logger.warning(f"對話不存在: {conversation_id}")
+        
+        # 創建新對話
+        conversation = ChatService.create_conversation(tenant_id, user_id)
+        if not conversation:
+            raise Exception("創建對話失敗")
+        return conversation['id']
+    
+    @staticmethod
+    def _to_grounding_sources(retrieved_docs: List[Dict]) -> List[Dict]:
+        """準備 Grounding Sources"""
+        return [{
+            'text': doc['text'],
+            'source': doc.get('source', doc.get('document_id', '')),
+            'score': doc.get('score', 0.0)
+        } for doc in retrieved_docs]
+    
+    @staticmethod
+    def _to_message_sources(retrieved_docs: List[Dict]) -> List[Dict]:
+        """準備回傳給前端及存入消息的來源摘要"""
+        return [{
+            'text': doc['text'][:200],
+            'document_id': doc['document_id'],
+            'score': doc['score']
+        } for doc in retrieved_docs]
+    
+    @staticmethod
+    def _llm_request(query: str, turn: Dict) -> Dict:
+        """組裝本輪的 LLM 請求參數（RAG 提示詞與 Grounding Sources）"""
+        return {
+            'messages': llm_service.build_rag_prompt(
+                query=query,
+                context_docs=turn['retrieved_docs'],
+                history=turn['history']
+            ),
+            'grounding_sources': ChatService._to_grounding_sources(turn['retrieved_docs'])
+        }
+    
+    @staticmethod
+    def _cached_message(cached: Dict) -> Message:
+        """由語意快取命中結果建立助手消息"""
+        return Message(
+            role=MessageRole.ASSISTANT,
+            content=cached['answer'],
+            sources=cached['sources']
+        )
+    
+    @staticmethod
+    def _timed(timings: StageRecorder, name: str, func, *args):
+        """在執行緒池中執行並記錄階段耗時"""
+        with timings.stage(name):
+            return func(*args)
+    
+    @staticmethod
+    def _load_conversation(
+        tenant_id: str,
+        conversation_id: Optional[str],
+        user_id: Optional[str] = None
+    ) -> Tuple[str, List[Dict]]:
+        """獲取或創建對話並組裝歷史，返回 (對話 ID, 歷史消息)"""
+        conv_id = ChatService._get_or_create_conversation(tenant_id, conversation_id, user_id)
+        if conv_id != conversation_id:
+            return conv_id, []
+        
+        # 上一輪仍在背景寫入時先等待，確保歷史包含上一輪
+        with ChatService._pending_lock:
+            pending = ChatService._pending_saves.get(conv_id)
+        if pending is not None:
+            wait([pending])
+        
+        return conv_id, HistoryService.build_history(conv_id)
+    
+    @staticmethod
+    def _retrieve(tenant_id: str, query: str) -> Tuple[Optional[List[float]], List[Dict]]:
+        """嵌入查詢並檢索；啟用語意快取時先取得查詢向量，供快取比對與檢索共用"""
+        query_embedding = embedding_service.embed_query(query) if answer_cache.enabled else None
+        
+        logger.info(f"執行 RAG 檢索: {query[:50]}...")
+        retrieved_docs = RetrievalService.retrieve_with_rerank(
+            tenant_id=tenant_id,
+            query=query,
+            query_embedding=query_embedding
+        )
+        return query_embedding, retrieved_docs
+    
+    @staticmethod
+    def _pack_context(tenant_id: str, retrieved_docs: List[Dict]) -> Tuple[List[Dict], Dict]:
+        """打包檢索結果到 CONTEXT_TOKEN_BUDGET 內，並記錄節省的 token 數"""
+        packed_docs, stats = ContextPacker.pack(retrieved_docs)
+        metrics.counter('context_tokens_saved_total', '檢索結果打包節省的提示詞 token 數').inc(
+            stats['tokens_saved'], tenant=tenant_id
+        )
+        logger.info(
+            f"檢索結果打包: {stats['input_chunks']} -> {stats['packed_chunks']} 個片段，"
+            f"節省 {stats['tokens_saved']} tokens"
+        )
+        return packed_docs, stats
+    
+    @staticmethod
+    def _prepare_turn(
+        tenant_id: str,
+        request: ChatRequest,
+        user_id: Optional[str],
+        timings: StageRecorder
+    ) -> Dict:
+        """準備本輪對話：對話讀取／建立與查詢嵌入＋檢索並行執行
+        
+        對話只依賴對話 ID，檢索只依賴問題本身，兩者互不相關。
+        只有不帶歷史的獨立問題才查詢語意快取；命中時已完成的檢索結果直接捨棄，未命中時打包成提示詞上下文。
+        """
+        with timings.stage('prepare'):
+            cache_version = answer_cache.version(tenant_id) if answer_cache.enabled else None
+            retrieval_future = ChatService._io_executor.submit(
+                ChatService._timed, timings, 'retrieval',
+                ChatService._retrieve, tenant_id, request.message
+            )
+            
+            with timings.stage('conversation'):
+                conv_id, history = ChatService._load_conversation(
+                    tenant_id, request.conversation_id, user_id
+                )
+            query_embedding, retrieved_docs = retrieval_future.result()
+        
+        return ChatService._finish_prepare(
+            tenant_id, request.message, cache_version, conv_id, history, query_embedding, retrieved_docs
+        )
+    
+    @staticmethod
+    def _finish_prepare(
+        tenant_id: str,
+        query: str,
+        cache_version: Optional[int],
+        conv_id: str,
+        history: List[Dict],
+        query_embedding: Optional[List[float]],
+        retrieved_docs: List[Dict]
+    ) -> Dict:
+        """對話與檢索完成後：查詢語意快取，未命中時打包檢索結果"""
+        cached = None
+        if cache_version is not None and not history:
+            cached = answer_cache.lookup(tenant_id, query_embedding)
+            if cached:
+                logger.info(f"語意回答快取命中（相似度 {cached['similarity']:.3f}）: {query[:50]}...")
+        else:
+            cache_version = None
+        
+        context_stats = {}
+        if not cached:
+            retrieved_docs, context_stats = ChatService._pack_context(tenant_id, retrieved_docs)
+        
+        return {
+            'conv_id': conv_id,
+            'history': history,
+            'query_embedding': query_embedding,
+            'cache_version': cache_version,
+            'cached': cached,
+            'retrieved_docs': retrieved_docs,
+            'context_stats': context_stats
+        }
+    
+    @staticmethod
+    def _store_cached_answer(
+        tenant_id: str,
+        query_embedding: Optional[List[float]],
+        version: Optional[int],
+        llm_response: Dict,
+        sources: List[Dict]
+    ) -> None:
+        """將新生成的回答寫入語意回答快取（模擬或錯誤回應不寫入）"""
+        if version is None or llm_response.get('model') == 'mock':
+            return
+        answer_cache.store(
+            tenant_id, query_embedding, llm_response['content'], sources,
+            llm_response.get('token_usage', {}), version
+        )
+    
+    @staticmethod
+    def _answer_message(tenant_id: str, turn: Dict, llm_response: Dict) -> Message:
+        """由 LLM 回應建立助手消息，並寫入語意回答快取"""
+        sources = ChatService._to_message_sources(turn['retrieved_docs'])
+        ChatService._store_cached_answer(
+            tenant_id, turn['query_embedding'], turn['cache_version'], llm_response, sources
+        )
+        return Message(
+            role=MessageRole.ASSISTANT,
+            content=llm_response['content'],
+            sources=sources
+        )
+    
+    @staticmethod
+    def _cached_response(conv_id: str, cached: Dict, timings: StageRecorder) -> ChatResponse:
+        """語意快取命中時的回應"""
+        return ChatResponse(
+            conversation_id=conv_id,
+            message=cached['answer'],
+            sources=cached['sources'],
+            cached=True,
+            timings=ChatService._finish_timings(timings)
+        )
+    
+    @staticmethod
+    def _answer_response(
+        conv_id: str,
+        assistant_message: Message,
+        token_usage: Dict,
+        turn: Dict,
+        timings: StageRecorder
+    ) -> ChatResponse:
+        """生成完成時的回應"""
+        return ChatResponse(
+            conversation_id=conv_id,
+            message=assistant_message.content,
+            sources=assistant_message.sources,
+            token_usage=token_usage,
+            context_stats=turn['context_stats'],
+            timings=ChatService._finish_timings(timings)
+        )
+    
+    @staticmethod
+    def _cached_stream_events(conv_id: str, cached: Dict) -> List[Dict]:
+        """語意快取命中時的串流事件：來源與整段回答（單一 delta）"""
+        return [
+            {'event': 'sources', 'data': {'conversation_id': conv_id, 'sources': cached['sources']}},
+            {'event': 'delta', 'data': {'text': cached['answer']}}
+        ]
+    
+    @staticmethod
+    def _stream_done_event(
+        conv_id: str,
+        token_usage: Dict,
+        timings: StageRecorder,
+        turn: Optional[Dict] = None
+    ) -> Dict:
+        """串流結束事件；turn 為 None 表示語意快取命中"""
+        data = {'conversation_id': conv_id, 'token_usage': token_usage}
+        if turn is None:
+            data['cached'] = True
+        else:
+            data['context_stats'] = turn['context_stats']
+        data['timings'] = ChatService._finish_timings(timings)
+        return {'event': 'done', 'data': data}
+    
+    @staticmethod
+    def _stream_message(
+        tenant_id: str,
+        turn: Dict,
+        sources: List[Dict],
+        content_parts: List[str],
+        token_usage: Dict,
+        model: Optional[str]
+    ) -> Message:
+        """由串流片段建立助手消息，並寫入語意回答快取"""
+        assistant_message = Message(
+            role=MessageRole.ASSISTANT,
+            content=''.join(content_parts),
+            sources=sources
+        )
+        ChatService._store_cached_answer(
+            tenant_id, turn['query_embedding'], turn['cache_version'],
+            {'content': assistant_message.content, 'token_usage': token_usage, 'model': model},
+            sources
+        )
+        return assistant_message
+    
+    @staticmethod
+    def _finish_timings(timings: StageRecorder) -> Dict:
+        """整理本輪各階段耗時並輸出指標
+        
+        overlap_saved_ms 為對話載入與檢索若依序執行所需時間減去實際並行耗時。
+        """
+        stages = timings.to_dict()
+        stages_ms = stages['stages_ms']
+        
+        serial_ms = stages_ms.get('conversation', 0.0) + stages_ms.get('retrieval', 0.0)
+        stages_ms['overlap_saved_ms'] = round(max(serial_ms - stages_ms.get('prepare', 0.0), 0.0), 2)
+        
+        histogram = metrics.histogram('chat_stage_seconds', '聊天各階段耗時（秒）')
+        for name in ('conversation', 'retrieval', 'prepare', 'generation'):
+            if name in stages_ms:
+                histogram.observe(stages_ms[name] / 1000, stage=name)
+        histogram.observe(stages['total_ms'] / 1000, stage='total')
+        
+        logger.info(f"聊天耗時(ms): {stages_ms}，總計 {stages['total_ms']}")
+        return {**stages_ms, 'total_ms': stages['total_ms']}
+    
+    @staticmethod
+    def _save_turn(
+        conv_id: str,
+        tenant_id: str,
+        user_message: Message,
+        assistant_message: Message,
+        token_usage: Dict
+    ) -> None:
+        """保存本輪對話：消息以單次 insert 追加到 messages 集合，對話計數以 $inc 更新"""
+        message_docs, conversation_update = ChatService._turn_writes(conv_id, tenant_id, user_message, assistant_message)
+        
+        messages_collection = get_messages_collection()
+        messages_collection.insert_many(message_docs)
+        
+        conversations_collection = get_conversations_collection()
+        conversations_collection.update_one({'_id': conv_id}, conversation_update)
+        
+        ChatService._after_save(conv_id, tenant_id, token_usage)
+    
+    @staticmethod
+    def _turn_writes(
+        conv_id: str,
+        tenant_id: str,
+        user_message: Message,
+        assistant_message: Message
+    ) -> Tuple[List[Dict], Dict]:
+        """本輪要寫入的消息文件與對話更新，返回 (消息文件, 對話更新)"""
+        message_docs = [
+            message_to_dict(user_message, conv_id, tenant_id),
+            message_to_dict(assistant_message, conv_id, tenant_id)
+        ]
+        conversation_update = {
+            '$inc': {'message_count': 2},
+            '$set': {
+                'last_message_preview': assistant_message.content[:100],
+                'updated_at': datetime.utcnow()
+            }
+        }
+        return message_docs, conversation_update
+    
+    @staticmethod
+    def _after_save(conv_id: str, tenant_id: str, token_usage: Dict) -> None:
+        """對話寫入後：累計 token 用量並排程摘要更新"""
+        logger.info(f"對話更新成功: {conv_id}")
+        
+        # token 用量由彙總器累加後批次寫入租戶、對話與每日彙總
+        usage_aggregator.record(tenant_id, conv_id, token_usage)
+        
+        # 較早輪次於背景合併進滾動摘要
+        HistoryService.schedule_summary_refresh(conv_id)
+    
+    @staticmethod
+    def _run_save(*args) -> None:
+        """背景保存對話，錯誤只記錄不拋出"""
+        try:
+            ChatService._save_turn(*args)
+        except Exception as e:
+            logger.error(f"背景保存對話失敗: {args[0]}: {e}")
+    
+    @staticmethod
+    def _clear_pending_save(conv_id: str, future: Future) -> None:
+        """背景保存完成後移除待寫記錄"""
+        with ChatService._pending_lock:
+            if ChatService._pending_saves.get(conv_id) is future:
+                del ChatService._pending_saves[conv_id]
+    
+    @staticmethod
+    def _save_turn_async(
+        conv_id: str,
+        tenant_id: str,
+        user_message: Message,
+        assistant_message: Message,
+        token_usage: Dict
+    ) -> None:
+        """寫後保存：回應先返回，對話寫入交由背景執行緒；同一對話的下一輪會等待寫入完成"""
+        with ChatService._pending_lock:
+            future = ChatService._write_executor.submit(
+                ChatService._run_save, conv_id, tenant_id, user_message, assistant_message, token_usage
+            )
+            ChatService._pending_saves[conv_id] = future
+        future.add_done_callback(lambda f: ChatService._clear_pending_save(conv_id, f))
+    
     @staticmethod
     def chat(tenant_id: str, request: ChatRequest, user_id: Optional[str] = None) -> ChatResponse:
         """處理聊天請求"""
         try:
-            conversations_collection = get_conversations_collection()
+            timings = StageRecorder()
             
-            # 獲取或創建對話
-            if request.conversation_id:
-                conv_data = conversations_collection.find_one({
-                    '_id': ObjectId(request.conversation_id),
-                    'tenant_id': tenant_id
-                })
-                
-                if not conv_data:
-                    logger.warning(f"對話不存在: {request.conversation_id}")
-                    conversation = ChatService.create_conversation(tenant_id, user_id)
-                    if not conversation:
-                        raise Exception("創建對話失敗")
-                    conv_id = conversation['id']
-                    messages = []
-                else:
-                    conversation = dict_to_conversation(conv_data)
-                    conv_id = conversation.id
-                    messages = conversation.messages
-            else:
-                # 創建新對話
-                conversation = ChatService.create_conversation(tenant_id, user_id)
-                if not conversation:
-                    raise Exception("創建對話失敗")
-                conv_id = conversation['id']
-                messages = []
-            
-            # 添加用戶消息
+            # 用戶消息
             user_message = Message(
                 role=MessageRole.USER,
                 content=request.message
             )
-            messages.append(user_message)
-            
-            # RAG 檢索
-            logger.info(f"執行 RAG 檢索: {request.message[:50]}...")
-            retrieved_docs = RetrievalService.retrieve_with_rerank(
-                tenant_id=tenant_id,
-                query=request.message
-            )
             
-            # 構建 RAG 提示詞
-            llm_messages = llm_service.build_rag_prompt(
-                query=request.message,
-                context_docs=retrieved_docs
-            )
+            # 並行：獲取或創建對話、嵌入與 RAG 檢索
+            turn = ChatService._prepare_turn(tenant_id, request, user_id, timings)
+            conv_id = turn['conv_id']
             
-            # 準備 Grounding Sources
-            grounding_sources = [{
-                'text': doc['text'],
-                'source': doc.get('source', doc.get('document_id', '')),
-                'score': doc.get('score', 0.0)
-            } for doc in retrieved_docs]
+            # 語意回答快取
+            cached = turn['cached']
+            if cached:
+                ChatService._save_turn_async(conv_id, tenant_id, user_message, ChatService._cached_message(cached), {})
+                return ChatService._cached_response(conv_id, cached, timings)
             
-            # 生成回應（帶 Grounding）
+            # 生成回應（帶 Grounding）；串流請走 chat_stream
             logger.info("生成 LLM 回應...")
-            llm_response = llm_service.generate_response(
-                messages=llm_messages,
-                stream=request.stream,
-                grounding_sources=grounding_sources
-            )
+            with timings.stage('generation'):
+                llm_response = llm_service.generate_response(**ChatService._llm_request(request.message, turn))
             
-            # 添加助手消息
-            assistant_message = Message(
-                role=MessageRole.ASSISTANT,
-                content=llm_response['content'],
-                sources=[{
-                    'text': doc['text'][:200],
-                    'document_id': doc['document_id'],
-                    'score': doc['score']
-                } for doc in retrieved_docs]
-            )
-            messages.append(assistant_message)
-            
-            # 更新對話
-            conversations_collection.update_one(
-                {'_id': ObjectId(conv_id)},
-                {
-                    '$set': {
-                        'messages': [msg.dict() for msg in messages],
-                        'message_count': len(messages),
-                        'token_usage': llm_response.get('token_usage', {}),
-                        'updated_at': datetime.utcnow()
-                    }
-                }
-            )
+            # 助手消息
+            assistant_message = ChatService._answer_message(tenant_id, turn, llm_response)
+            token_usage = llm_response.get('token_usage', {})
             
-            logger.info(f"對話更新成功: {conv_id}")
-            
-            # 返回回應
-            return ChatResponse(
-                conversation_id=conv_id,
-                message=llm_response['content'],
-                sources=[{
-                    'text': doc['text'][:200],
-                    'document_id': doc['document_id'],
-                    'score': doc['score']
-                } for doc in retrieved_docs],
-                token_usage=llm_response.get('token_usage', {})
-            )
+            # 更新對話（寫後保存，不阻塞回應）
+            ChatService._save_turn_async(conv_id, tenant_id, user_message, assistant_message, token_usage)
+            
+            return ChatService._answer_response(conv_id, assistant_message, token_usage, turn, timings)
         except Exception as e:
             logger.error(f"聊天處理失敗: {e}")
             raise
     
     @staticmethod
-    def chat_stream(tenant_id: str, request: ChatRequest, user_id: Optional[str] = None) -> Generator:
-        """處理串流聊天請求"""
+    def chat_stream(tenant_id: str, request: ChatRequest, user_id: Optional[str] = None) -> Generator[Dict, None, None]:
+        """處理串流聊天請求
+
+        依序產生事件：
+        - {'event': 'sources', 'data': {...}}：對話 ID 與檢索來源
+        - {'event': 'delta', 'data': {'text': ...}}：增量文本
+        - {'event': 'done', 'data': {...}}：token 使用量、上下文打包統計與各階段耗時，對話於此時保存
+        - {'event': 'error', 'data': {'message': ...}}：發生錯誤
+        客戶端中斷時生成器會被關閉，LLM 串流隨之停止，本輪對話不保存。
+        """
+        completed = False
+        llm_stream = None
         try:
-            # 簡化版本：返回完整回應
-            # 生產環境應該實作真正的串流
-            response = ChatService.chat(tenant_id, request, user_id)
-            yield response.message
+            timings = StageRecorder()
+            user_message = Message(role=MessageRole.USER, content=request.message)
+            
+            # 並行：獲取或創建對話、嵌入與 RAG 檢索
+            turn = ChatService._prepare_turn(tenant_id, request, user_id, timings)
+            conv_id = turn['conv_id']
+            
+            # 語意回答快取命中時整段回答以單一 delta 送出
+            cached = turn['cached']
+            if cached:
+                yield from ChatService._cached_stream_events(conv_id, cached)
+                ChatService._save_turn(conv_id, tenant_id, user_message, ChatService._cached_message(cached), {})
+                completed = True
+                yield ChatService._stream_done_event(conv_id, {}, timings)
+                return
+            
+            # 來源先送出
+            sources = ChatService._to_message_sources(turn['retrieved_docs'])
+            yield {'event': 'sources', 'data': {'conversation_id': conv_id, 'sources': sources}}
+            
+            # 增量文本
+            content_parts = []
+            token_usage = {}
+            model = None
+            llm_stream = llm_service.stream_response(**ChatService._llm_request(request.message, turn))
+            with timings.stage('generation'):
+                for event in llm_stream:
+                    if event['type'] == 'delta':
+                        content_parts.append(event['text'])
+                        yield {'event': 'delta', 'data': {'text': event['text']}}
+                    elif event['type'] == 'done':
+                        token_usage = event.get('token_usage', {})
+                        model = event.get('model')
+            
+            # 串流完成後保存對話
+            assistant_message = ChatService._stream_message(tenant_id, turn, sources, content_parts, token_usage, model)
+            ChatService._save_turn(conv_id, tenant_id, user_message, assistant_message, token_usage)
+            completed = True
+            
+            yield ChatService._stream_done_event(conv_id, token_usage, timings, turn)
         except Exception as e:
             logger.error(f"串流聊天失敗: {e}")
-            yield f"錯誤：{str(e)}"
+            yield {'event': 'error', 'data': {'message': str(e)}}
+        finally:
+            if llm_stream is not None:
+                llm_stream.close()
+            if not completed:
+                logger.info("串流聊天未完成（客戶端中斷或錯誤），本輪對話未保存")
+    
+    @staticmethod
+    def encode_cursor(updated_at: datetime, conv_id: str) -> str:
+        """將列表最後一筆的排序鍵（updated_at, _id）編碼為游標"""
+        raw = f"{updated_at.isoformat()}|{conv_id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+        """解碼游標，格式錯誤時拋出 ValueError"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+            updated_at, conv_id = raw.split('|', 1)
+            return datetime.fromisoformat(updated_at), conv_id
+        except Exception:
+            raise ValueError("無效的游標")
+    
+    @staticmethod
+    def _conversation_list_query(tenant_id: str, user_id: Optional[str], cursor: Optional[str]) -> Dict:
+        """對話列表查詢條件：依 (updated_at, _id) 倒序的 keyset 分頁"""
+        query = {'tenant_id': tenant_id}
+        if user_id:
+            query['user_id'] = user_id
+        
+        if cursor:
+            updated_at, conv_id = ChatService.decode_cursor(cursor)
+            query['$or'] = [
+                {'updated_at': {'$lt': updated_at}},
+                {'updated_at': updated_at, '_id': {'$lt': conv_id}}
+            ]
+        
+        return query
     
     @staticmethod
-    def get_conversations(tenant_id: str, user_id: Optional[str] = None) -> list:
-        """獲取對話列表"""
+    def _conversation_page(docs: List[Dict], limit: int) -> Dict:
+        """整理分頁結果（查詢時多取一筆用於判斷是否還有下一頁）"""
+        conversations = [dict_to_conversation_summary(doc) for doc in docs[:limit]]
+        
+        next_cursor = None
+        if len(docs) > limit:
+            last = conversations[-1]
+            next_cursor = ChatService.encode_cursor(last.updated_at, last.id)
+        
+        return {
+            'conversations': [conv.dict() for conv in conversations],
+            'next_cursor': next_cursor
+        }
+    
+    @staticmethod
+    def get_conversations(
+        tenant_id: str,
+        user_id: Optional[str] = None,
+        limit: int = CONVERSATION_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Dict:
+        """獲取對話列表（只含摘要欄位），返回 {'conversations', 'next_cursor'}"""
+        limit = max(1, min(limit, CONVERSATION_PAGE_MAX))
+        query = ChatService._conversation_list_query(tenant_id, user_id, cursor)
+        
         try:
             conversations_collection = get_conversations_collection()
+            docs = list(
+                conversations_collection.find(query, CONVERSATION_SUMMARY_PROJECTION)
+                .sort(CONVERSATION_LIST_SORT)
+                .limit(limit + 1)
+            )
             
-            query = {'tenant_id': tenant_id}
-            if user_id:
-                query['user_id'] = user_id
-            
-            convs = conversations_collection.find(query).sort('updated_at', -1).limit(50)
-            
-            return [dict_to_conversation(conv).dict() for conv in convs]
+            return ChatService._conversation_page(docs, limit)
         except Exception as e:
             logger.error(f"獲取對話列表失敗: {e}")
-            return []
+            return {'conversations': [], 'next_cursor': None}
     
     @staticmethod
     def get_conversation(conversation_id: str, tenant_id: str) -> Optional[dict]:
@@ -179,7 +632,7 @@ class ChatService:
         try:
             conversations_collection = get_conversations_collection()
             conv_data = conversations_collection.find_one({
-                '_id': ObjectId(conversation_id),
+                '_id': conversation_id,
                 'tenant_id': tenant_id
             })
             
@@ -187,7 +640,26 @@ class ChatService:
                 return None
             
             conversation = dict_to_conversation(conv_data)
+            
+            # 已遷移或新版對話的消息存於 messages 集合
+            if not conversation.messages:
+                conversation.messages = ChatService.get_messages(conversation.id)
+            
             return conversation.dict()
         except Exception as e:
             logger.error(f"獲取對話詳情失敗: {e}")
             return None
+    
+    @staticmethod
+    def get_messages(conversation_id: str, limit: Optional[int] = None) -> List[Message]:
+        """依時間順序獲取對話消息；指定 limit 時只取最近的 limit 條"""
+        messages_collection = get_messages_collection()
+        cursor = messages_collection.find({'conversation_id': conversation_id})
+        
+        if limit:
+            docs = list(cursor.sort('timestamp', -1).limit(limit))
+            docs.reverse()
+        else:
+            docs = cursor.sort('timestamp', 1)
+        
+        return [dict_to_message(doc) for doc in docs]
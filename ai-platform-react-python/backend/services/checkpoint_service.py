@@ -0,0 +1,121 @@
+from datetime import datetime
+from typing import Optional, List
+from utils.db_manager import (
+    get_documents_collection, get_document_checkpoints_collection,
+    get_checkpoint_chunks_collection, get_checkpoint_vectors_collection
+)
+from utils.logger import logger
+
+# 每個分塊批次保存的塊數，避免單一 MongoDB 文件超過 16 MB 上限
+CHUNK_BATCH_SIZE = 1000
+
+
+class CheckpointService:
+    """文件處理檢查點服務：保存解析文本引用、分塊列表與已完成的嵌入向量
+
+    檢查點本身只記錄進度，分塊與向量按批次存放在各自的集合中。
+    """
+    
+    @staticmethod
+    def load(document_id: str) -> Optional[dict]:
+        """讀取文件的檢查點狀態"""
+        try:
+            return get_document_checkpoints_collection().find_one({'_id': document_id})
+        except Exception as e:
+            logger.error(f"讀取檢查點失敗 {document_id}: {e}")
+            return None
+    
+    @staticmethod
+    def save_state(document_id: str, tenant_id: str, text_ref: Optional[str], chunks: Optional[List[dict]]) -> None:
+        """保存解析與分塊結果（表格文件的分塊可重新串流產生，不保存）"""
+        # 分塊重新產生後，舊的分塊與向量批次已不再對應
+        get_checkpoint_chunks_collection().delete_many({'document_id': document_id})
+        get_checkpoint_vectors_collection().delete_many({'document_id': document_id})
+        
+        if chunks:
+            get_checkpoint_chunks_collection().insert_many([
+                {
+                    'document_id': document_id,
+                    'start': start,
+                    'chunks': chunks[start:start + CHUNK_BATCH_SIZE]
+                }
+                for start in range(0, len(chunks), CHUNK_BATCH_SIZE)
+            ])
+        
+        # 分塊寫入完成後才寫檢查點，檢查點存在即代表分塊完整
+        get_document_checkpoints_collection().replace_one(
+            {'_id': document_id},
+            {
+                '_id': document_id,
+                'tenant_id': tenant_id,
+                'text_ref': text_ref,
+                'chunk_count': len(chunks) if chunks else 0,
+                'embedded_count': 0,
+                'created_at': datetime.utcnow(),
+                'updated_at': datetime.utcnow()
+            },
+            upsert=True
+        )
+    
+    @staticmethod
+    def load_chunks(document_id: str, chunk_count: int) -> Optional[List[dict]]:
+        """讀取檢查點中的分塊列表，數量與 chunk_count 不符時返回 None"""
+        docs = get_checkpoint_chunks_collection().find({'document_id': document_id}).sort('start', 1)
+        
+        chunks = []
+        for doc in docs:
+            if doc['start'] != len(chunks):
+                return None
+            chunks.extend(doc['chunks'])
+        
+        if not chunks or len(chunks) != chunk_count:
+            return None
+        return chunks
+    
+    @staticmethod
+    def save_vectors(document_id: str, start: int, embeddings: List[List[float]]) -> None:
+        """保存一批已完成的嵌入向量，並推進進度與心跳時間"""
+        now = datetime.utcnow()
+        get_checkpoint_vectors_collection().insert_one({
+            'document_id': document_id,
+            'start': start,
+            'count': len(embeddings),
+            'embeddings': embeddings
+        })
+        get_document_checkpoints_collection().update_one(
+            {'_id': document_id},
+            {'$max': {'embedded_count': start + len(embeddings)}, '$set': {'updated_at': now}}
+        )
+        # 更新文件的 updated_at 作為處理心跳，供卡住偵測使用
+        get_documents_collection().update_one(
+            {'_id': document_id},
+            {'$set': {'updated_at': now}}
+        )
+    
+    @staticmethod
+    def load_vectors(document_id: str, start: int, end: int) -> Optional[List[List[float]]]:
+        """讀取 [start, end) 範圍的已保存向量，範圍不完整時返回 None"""
+        docs = get_checkpoint_vectors_collection().find(
+            {'document_id': document_id, 'start': {'$lt': end}}
+        ).sort('start', 1)
+        
+        embeddings = {}
+        for doc in docs:
+            for offset, embedding in enumerate(doc['embeddings']):
+                index = doc['start'] + offset
+                if start <= index < end:
+                    embeddings[index] = embedding
+        
+        if len(embeddings) != end - start:
+            return None
+        return [embeddings[i] for i in range(start, end)]
+    
+    @staticmethod
+    def clear(document_id: str) -> None:
+        """處理完成後刪除檢查點"""
+        try:
+            get_document_checkpoints_collection().delete_one({'_id': document_id})
+            get_checkpoint_chunks_collection().delete_many({'document_id': document_id})
+            get_checkpoint_vectors_collection().delete_many({'document_id': document_id})
+        except Exception as e:
+            logger.warning(f"刪除檢查點失敗 {document_id}: {e}")
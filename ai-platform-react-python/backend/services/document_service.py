@@ -1,169 +1,687 @@
 import os
+import json
 import uuid
-from datetime import datetime
+import itertools
+from contextlib import nullcontext
+import shutil
+import zipfile
+from datetime import datetime, timedelta
 from typing import Optional, List
 from bson import ObjectId
+from pymongo import ReturnDocument
 from werkzeug.utils import secure_filename
-from models.document import Document, DocumentCreate, DocumentStatus, document_to_dict, dict_to_document
+from models.document import (
+    Document, DocumentCreate, DocumentStatus, IngestionBatch, BatchStatus,
+    document_to_dict, dict_to_document, batch_to_dict, dict_to_batch
+)
 from services.embedding_service import embedding_service
-from utils.db_manager import get_documents_collection
+from services.checkpoint_service import CheckpointService
+from utils.db_manager import get_documents_collection, get_ingestion_batches_collection
 from utils.file_parser import FileParser
+from utils.parse_cache import parse_cache
 from utils.text_processor import TextProcessor
 from utils.vector_store import vector_store_manager
+from utils.answer_cache import answer_cache
+from utils.metrics import metrics, percentile, StageRecorder
 from utils.logger import logger
 from config import get_config
 
 config = get_config()
 
+# 表格文件用於預覽、關鍵詞與語言偵測的樣本字數
+TABULAR_SAMPLE_SIZE = 5000
+
 
 class DocumentService:
     """文件服務"""
     
+    @staticmethod
+    def _is_allowed_file(filename: str) -> bool:
+        """檢查文件類型是否允許"""
+        return '.' in filename and \
+               filename.rsplit('.', 1)[1].lower() in config.ALLOWED_EXTENSIONS
+    
+    @staticmethod
+    def _allocate_file_path(tenant_id: str, filename: str) -> tuple:
+        """分配上傳文件的存儲路徑，返回 (安全文件名, 副檔名, 路徑)"""
+        # 確保上傳目錄存在
+        upload_dir = os.path.join(config.UPLOAD_FOLDER, tenant_id)
+        os.makedirs(upload_dir, exist_ok=True)
+        
+        # 生成安全的文件名
+        safe_filename = secure_filename(filename)
+        file_id = str(uuid.uuid4())
+        file_ext = os.path.splitext(safe_filename)[1]
+        new_filename = f"{file_id}{file_ext}"
+        file_path = os.path.join(upload_dir, new_filename)
+        
+        return safe_filename, file_ext, file_path
+    
+    @staticmethod
+    def _create_document_record(
+        tenant_id: str,
+        safe_filename: str,
+        file_ext: str,
+        file_path: str,
+        batch_id: Optional[str] = None
+    ) -> Document:
+        """創建文件記錄並保存到資料庫"""
+        doc_id = str(ObjectId())
+        document = Document(
+            id=doc_id,
+            tenant_id=tenant_id,
+            filename=safe_filename,
+            file_path=file_path,
+            file_size=os.path.getsize(file_path),
+            file_type=file_ext.lower(),
+            content_hash=parse_cache.file_sha256(file_path),
+            status=DocumentStatus.PROCESSING,
+            batch_id=batch_id
+        )
+        
+        documents_collection = get_documents_collection()
+        documents_collection.insert_one(document_to_dict(document))
+        
+        return document
+    
     @staticmethod
     def upload_document(file, tenant_id: str, filename: str) -> Optional[dict]:
         """上傳文件"""
+        # 延遲導入，避免與匯入排程器循環導入
+        from services.ingestion_scheduler import ingestion_scheduler
+        
         try:
-            # 確保上傳目錄存在
-            upload_dir = os.path.join(config.UPLOAD_FOLDER, tenant_id)
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # 生成安全的文件名
-            safe_filename = secure_filename(filename)
-            file_id = str(uuid.uuid4())
-            file_ext = os.path.splitext(safe_filename)[1]
-            new_filename = f"{file_id}{file_ext}"
-            file_path = os.path.join(upload_dir, new_filename)
+            safe_filename, file_ext, file_path = DocumentService._allocate_file_path(tenant_id, filename)
             
             # 保存文件
             file.save(file_path)
-            file_size = os.path.getsize(file_path)
             
             # 創建文件記錄
-            doc_id = str(ObjectId())
-            document = Document(
-                id=doc_id,
-                tenant_id=tenant_id,
-                filename=safe_filename,
-                file_path=file_path,
-                file_size=file_size,
-                file_type=file_ext.lower(),
-                status=DocumentStatus.PROCESSING
-            )
-            
-            # 保存到資料庫
-            documents_collection = get_documents_collection()
-            documents_collection.insert_one(document_to_dict(document))
+            document = DocumentService._create_document_record(tenant_id, safe_filename, file_ext, file_path)
             
             logger.info(f"文件上傳成功: {safe_filename}")
             
-            # 異步處理文件（這裡同步處理，生產環境應使用 Celery）
-            DocumentService.process_document(doc_id, tenant_id)
+            # 排入租戶佇列，由排程器公平地送入匯入管線
+            ingestion_scheduler.enqueue(tenant_id, document.id)
             
             return document.dict()
         except Exception as e:
             logger.error(f"文件上傳失敗: {e}")
             return None
     
+    @staticmethod
+    def bulk_upload(files: list, tenant_id: str) -> Optional[dict]:
+        """批次上傳多個文件或 zip 壓縮檔，並送入匯入管線"""
+        # 延遲導入，避免與匯入排程器循環導入
+        from services.ingestion_scheduler import ingestion_scheduler
+        
+        try:
+            batch = IngestionBatch(id=str(ObjectId()), tenant_id=tenant_id)
+            batches_collection = get_ingestion_batches_collection()
+            batches_collection.insert_one(batch_to_dict(batch))
+            
+            documents = []
+            for file in files:
+                if len(documents) >= config.BULK_MAX_FILES:
+                    batch.skipped_files.append({'filename': file.filename, 'reason': '超過批次文件數量上限'})
+                    continue
+                
+                if file.filename.lower().endswith('.zip'):
+                    documents.extend(DocumentService._extract_zip(file, tenant_id, batch, config.BULK_MAX_FILES - len(documents)))
+                elif not DocumentService._is_allowed_file(file.filename):
+                    batch.skipped_files.append({'filename': file.filename, 'reason': '不支援的文件類型'})
+                elif DocumentService._upload_size(file) > config.MAX_FILE_SIZE:
+                    batch.skipped_files.append({'filename': file.filename, 'reason': '文件過大'})
+                else:
+                    safe_filename, file_ext, file_path = DocumentService._allocate_file_path(tenant_id, file.filename)
+                    file.save(file_path)
+                    documents.append(DocumentService._create_document_record(
+                        tenant_id, safe_filename, file_ext, file_path, batch_id=batch.id
+                    ))
+            
+            batch.document_ids = [doc.id for doc in documents]
+            batch.total_files = len(documents)
+            if not documents:
+                batch.status = BatchStatus.COMPLETED_WITH_ERRORS
+            
+            batches_collection.update_one(
+                {'_id': batch.id},
+                {'$set': {
+                    'document_ids': batch.document_ids,
+                    'total_files': batch.total_files,
+                    'skipped_files': batch.skipped_files,
+                    'status': batch.status,
+                    'updated_at': datetime.utcnow()
+                }}
+            )
+            
+            logger.info(f"批次上傳已接收: {batch.id}，共 {batch.total_files} 個文件，略過 {len(batch.skipped_files)} 個")
+            
+            # 排入租戶佇列：排程器依權重公平派送，管線中不同文件的解析與嵌入階段會重疊執行
+            for doc in documents:
+                ingestion_scheduler.enqueue(tenant_id, doc.id, batch_id=batch.id)
+            
+            return batch.dict()
+        except Exception as e:
+            logger.error(f"批次上傳失敗: {e}")
+            return None
+    
+    @staticmethod
+    def _upload_size(file) -> int:
+        """取得上傳文件的大小（位元組），不讀入內存"""
+        file.stream.seek(0, os.SEEK_END)
+        size = file.stream.tell()
+        file.stream.seek(0)
+        return size
+    
+    @staticmethod
+    def _extract_zip(file, tenant_id: str, batch: IngestionBatch, max_files: int) -> List[Document]:
+        """逐一串流解壓 zip 內的文件到磁碟，不將整個壓縮檔載入內存"""
+        documents = []
+        total_uncompressed = 0
+        
+        try:
+            # Werkzeug 會將大型上傳暫存於磁碟，ZipFile 只會隨機讀取中央目錄與各項目
+            with zipfile.ZipFile(file.stream) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    
+                    entry_name = os.path.basename(info.filename)
+                    if not entry_name or entry_name.startswith('.'):
+                        continue
+                    
+                    if len(documents) >= max_files:
+                        batch.skipped_files.append({'filename': entry_name, 'reason': '超過批次文件數量上限'})
+                        continue
+                    
+                    if not DocumentService._is_allowed_file(entry_name):
+                        batch.skipped_files.append({'filename': entry_name, 'reason': '不支援的文件類型'})
+                        continue
+                    
+                    if info.file_size > config.MAX_FILE_SIZE:
+                        batch.skipped_files.append({'filename': entry_name, 'reason': '文件過大'})
+                        continue
+                    
+                    # 防止壓縮炸彈
+                    total_uncompressed += info.file_size
+                    if total_uncompressed > config.BULK_MAX_UPLOAD_SIZE:
+                        batch.skipped_files.append({'filename': entry_name, 'reason': '壓縮檔解壓後總大小超過上限'})
+                        continue
+                    
+                    safe_filename, file_ext, file_path = DocumentService._allocate_file_path(tenant_id, entry_name)
+                    with archive.open(info) as source, open(file_path, 'wb') as target:
+                        shutil.copyfileobj(source, target, length=1024 * 1024)
+                    
+                    documents.append(DocumentService._create_document_record(
+                        tenant_id, safe_filename, file_ext, file_path, batch_id=batch.id
+                    ))
+        except zipfile.BadZipFile as e:
+            logger.warning(f"無效的 zip 文件 {file.filename}: {e}")
+            batch.skipped_files.append({'filename': file.filename, 'reason': '無效的 zip 文件'})
+        
+        return documents
+    
+    @staticmethod
+    def get_batch(batch_id: str, tenant_id: str) -> Optional[dict]:
+        """獲取批次上傳進度"""
+        try:
+            batches_collection = get_ingestion_batches_collection()
+            batch_data = batches_collection.find_one({'_id': batch_id, 'tenant_id': tenant_id})
+            
+            if not batch_data:
+                return None
+            
+            batch = dict_to_batch(batch_data).dict()
+            
+            # 附上各文件的處理狀態
+            documents_collection = get_documents_collection()
+            docs = documents_collection.find(
+                {'batch_id': batch_id, 'tenant_id': tenant_id},
+                {'filename': 1, 'status': 1, 'chunks_count': 1, 'error_message': 1}
+            )
+            batch['documents'] = [{
+                'id': str(doc['_id']),
+                'filename': doc.get('filename'),
+                'status': doc.get('status'),
+                'chunks_count': doc.get('chunks_count', 0),
+                'error_message': doc.get('error_message')
+            } for doc in docs]
+            batch['progress'] = batch['processed_files'] / batch['total_files'] if batch['total_files'] else 1.0
+            
+            return batch
+        except Exception as e:
+            logger.error(f"獲取批次進度失敗: {e}")
+            return None
+    
+    @staticmethod
+    def record_batch_result(batch_id: str, success: bool) -> None:
+        """記錄批次中單一文件的處理結果並更新整體狀態"""
+        try:
+            batches_collection = get_ingestion_batches_collection()
+            batch_data = batches_collection.find_one_and_update(
+                {'_id': batch_id},
+                {
+                    '$inc': {
+                        'processed_files': 1,
+                        'succeeded_files' if success else 'failed_files': 1
+                    },
+                    '$set': {'updated_at': datetime.utcnow()}
+                },
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if batch_data and batch_data['processed_files'] >= batch_data['total_files']:
+                status = BatchStatus.COMPLETED if batch_data['failed_files'] == 0 else BatchStatus.COMPLETED_WITH_ERRORS
+                batches_collection.update_one({'_id': batch_id}, {'$set': {'status': status}})
+                logger.info(f"批次處理完成: {batch_id}，狀態: {status}")
+        except Exception as e:
+            logger.error(f"更新批次進度失敗: {e}")
+    
+    @staticmethod
+    def _mark_failed(document_id: str, error_message: str, stats: Optional[StageRecorder] = None) -> None:
+        """將文件標記為處理失敗"""
+        update = {
+            'status': DocumentStatus.FAILED,
+            'error_message': error_message,
+            'updated_at': datetime.utcnow()
+        }
+        if stats is not None:
+            update['processing_stats'] = DocumentService._publish_stats(stats, success=False)
+        
+        documents_collection = get_documents_collection()
+        documents_collection.update_one(
+            {'_id': document_id},
+            {'$set': update}
+        )
+    
+    @staticmethod
+    def _publish_stats(stats: StageRecorder, success: bool) -> dict:
+        """將處理統計匯出為直方圖與計數器，並返回存入文件記錄的字典"""
+        for stage, elapsed_ms in stats.stages.items():
+            metrics.histogram(
+                'ingestion_stage_seconds', '文件匯入各階段耗時（秒）'
+            ).observe(elapsed_ms / 1000, stage=stage)
+        
+        for name, value in stats.counters.items():
+            metrics.counter(f'ingestion_{name}_total', f'文件匯入累計 {name}').inc(value)
+        
+        result = stats.to_dict()
+        metrics.histogram('ingestion_document_seconds', '單一文件匯入總耗時（秒）').observe(
+            result['total_ms'] / 1000, outcome='completed' if success else 'failed'
+        )
+        return result
+    
     @staticmethod
     def process_document(document_id: str, tenant_id: str) -> bool:
         """處理文件 - 提取文本、分塊、嵌入"""
+        context = DocumentService.prepare_document(document_id, tenant_id)
+        if context is None:
+            return False
+        
+        return DocumentService.index_document(context)
+    
+    @staticmethod
+    def prepare_document(document_id: str, tenant_id: str) -> Optional[dict]:
+        """處理階段一：提取文本並分塊"""
+        stats = StageRecorder()
+        
         try:
             documents_collection = get_documents_collection()
-            doc_data = documents_collection.find_one({'_id': ObjectId(document_id)})
+            doc_data = documents_collection.find_one({'_id': document_id})
             
             if not doc_data:
                 logger.error(f"文件不存在: {document_id}")
-                return False
+                return None
             
             document = dict_to_document(doc_data)
-            
-            # 1. 提取文本
             logger.info(f"開始處理文件: {document.filename}")
-            text = FileParser.parse_file(document.file_path)
+            stats.count('bytes', document.file_size)
+            
+            # 有檢查點時從上次進度繼續
+            checkpoint = CheckpointService.load(document_id)
+            resume_from = checkpoint.get('embedded_count', 0) if checkpoint else 0
+            if checkpoint:
+                logger.info(f"從檢查點恢復處理: {document.filename}，已嵌入 {resume_from} 個塊")
+                stats.count('resumed_chunks', resume_from)
+            
+            # 表格文件逐列串流分塊，不載入完整文本（讀取時間計入 chunk 階段）
+            if FileParser.is_tabular(document.file_path):
+                chunks = FileParser.iter_table_chunks(document.file_path)
+                with stats.stage('chunk'):
+                    first_chunk = next(chunks, None)
+                
+                if first_chunk is None:
+                    DocumentService._mark_failed(document_id, '文件內容為空或無法解析', stats)
+                    return None
+                
+                # 分塊結果是確定性的，恢復時重新串流即可，只需保存嵌入進度
+                if not checkpoint:
+                    CheckpointService.save_state(document_id, tenant_id, text_ref=None, chunks=None)
+                
+                return {
+                    'document_id': document_id,
+                    'tenant_id': tenant_id,
+                    'filename': document.filename,
+                    'text': None,
+                    'chunks': itertools.chain([first_chunk], chunks),
+                    'resume_from': resume_from,
+                    'stats': stats
+                }
+            
+            # 1. 提取文本（恢復時會命中解析快取）
+            with stats.stage('parse'):
+                text = FileParser.parse_file(document.file_path, content_hash=document.content_hash)
+            stats.count('pages', FileParser.count_pages(document.file_path))
             
             if not text or len(text.strip()) < 10:
-                documents_collection.update_one(
-                    {'_id': ObjectId(document_id)},
-                    {'$set': {
-                        'status': DocumentStatus.FAILED,
-                        'error_message': '文件內容為空或無法解析',
-                        'updated_at': datetime.utcnow()
-                    }}
-                )
-                return False
+                DocumentService._mark_failed(document_id, '文件內容為空或無法解析', stats)
+                return None
             
-            # 2. 文本分塊
-            chunks = TextProcessor.split_into_chunks(text)
+            # 2. 文本分塊（恢復時沿用檢查點中的分塊，確保與已保存的向量一致）
+            chunks = None
+            if checkpoint and checkpoint.get('chunk_count'):
+                chunks = CheckpointService.load_chunks(document_id, checkpoint['chunk_count'])
+            if chunks is None:
+                with stats.stage('chunk'):
+                    chunks = TextProcessor.split_into_chunks(text)
+                text_ref = parse_cache.make_key(
+                    document.content_hash or parse_cache.file_sha256(document.file_path),
+                    FileParser.PARSER_VERSION
+                )
+                CheckpointService.save_state(document_id, tenant_id, text_ref=text_ref, chunks=chunks)
+                resume_from = 0
             logger.info(f"文本已分割為 {len(chunks)} 個塊")
             
-            # 3. 生成嵌入向量
-            chunk_texts = [chunk['text'] for chunk in chunks]
-            embeddings = embedding_service.embed_batch(chunk_texts)
-            
-            if not embeddings:
-                documents_collection.update_one(
-                    {'_id': ObjectId(document_id)},
-                    {'$set': {
-                        'status': DocumentStatus.FAILED,
-                        'error_message': '嵌入生成失敗',
-                        'updated_at': datetime.utcnow()
-                    }}
-                )
-                return False
+            return {
+                'document_id': document_id,
+                'tenant_id': tenant_id,
+                'filename': document.filename,
+                'text': text,
+                'chunks': chunks,
+                'resume_from': resume_from,
+                'stats': stats
+            }
+        except Exception as e:
+            logger.error(f"文件處理失敗: {e}")
+            DocumentService._mark_failed(document_id, str(e), stats)
+            return None
+    
+    @staticmethod
+    def index_document(context: dict) -> bool:
+        """處理階段二：分批生成嵌入、存入向量資料庫並更新文件狀態"""
+        document_id = context['document_id']
+        tenant_id = context['tenant_id']
+        text = context['text']
+        stats = context.get('stats') or StageRecorder()
+        resume_from = context.get('resume_from', 0)
+        batch_size = config.INGEST_EMBED_BATCH_SIZE
+        
+        try:
+            documents_collection = get_documents_collection()
             
-            # 4. 存入向量資料庫
-            ids = [f"{document_id}_{i}" for i in range(len(chunks))]
-            document_ids = [document_id] * len(chunks)
-            chunk_indices = list(range(len(chunks)))
-            metadata_list = ['{}'] * len(chunks)  # 可以添加更多元數據
-            
-            success = vector_store_manager.insert_vectors(
-                tenant_id=tenant_id,
-                ids=ids,
-                embeddings=embeddings,
-                texts=chunk_texts,
-                document_ids=document_ids,
-                chunk_indices=chunk_indices,
-                metadata_list=metadata_list
-            )
+            # 恢復時先清除本進程可能已寫入的部分向量，再由檢查點重新寫入
+            if resume_from:
+                vector_store_manager.delete_by_document(tenant_id, document_id)
+            
+            # 表格文件沒有完整文本，取前幾個塊作為預覽、關鍵詞與語言偵測的樣本
+            sample_parts = []
+            sample_length = 0
+            
+            chunks_count = 0
+            chunk_iter = iter(context['chunks'])
             
-            if not success:
-                logger.warning("向量存儲失敗，但文件處理繼續")
+            while True:
+                # 表格文件在此才真正讀取列，計入 chunk 階段
+                with stats.stage('chunk') if text is None else nullcontext():
+                    batch = list(itertools.islice(chunk_iter, batch_size))
+                if not batch:
+                    break
+                
+                if text is None and sample_length < TABULAR_SAMPLE_SIZE:
+                    for chunk in batch:
+                        sample_parts.append(chunk['text'])
+                        sample_length += len(chunk['text'])
+                
+                # 3. 生成嵌入向量（已在檢查點中的批次直接讀取，不重複呼叫 API）
+                chunk_texts = [chunk['text'] for chunk in batch]
+                batch_end = chunks_count + len(batch)
+                embeddings = None
+                if batch_end <= resume_from:
+                    with stats.stage('checkpoint_load'):
+                        embeddings = CheckpointService.load_vectors(document_id, chunks_count, batch_end)
+                
+                if embeddings is None:
+                    # 目前每個文本一次 API 呼叫
+                    with stats.stage('embed'):
+                        embeddings = embedding_service.embed_batch(chunk_texts)
+                    stats.count('embedding_calls', len(chunk_texts))
+                    
+                    if not embeddings:
+                        DocumentService._mark_failed(document_id, '嵌入生成失敗', stats)
+                        return False
+                    
+                    with stats.stage('checkpoint_save'):
+                        CheckpointService.save_vectors(document_id, chunks_count, embeddings)
+                
+                # 4. 存入向量資料庫
+                chunk_indices = list(range(chunks_count, chunks_count + len(batch)))
+                with stats.stage('vector_insert'):
+                    success = vector_store_manager.insert_vectors(
+                        tenant_id=tenant_id,
+                        ids=[f"{document_id}_{i}" for i in chunk_indices],
+                        embeddings=embeddings,
+                        texts=chunk_texts,
+                        document_ids=[document_id] * len(batch),
+                        chunk_indices=chunk_indices,
+                        metadata_list=[json.dumps(chunk.get('metadata', {}), ensure_ascii=False) for chunk in batch]
+                    )
+                
+                if not success:
+                    logger.warning("向量存儲失敗，但文件處理繼續")
+                
+                chunks_count += len(batch)
+            
+            stats.count('chunks', chunks_count)
+            
+            if text is None:
+                text = "\n".join(sample_parts)[:TABULAR_SAMPLE_SIZE]
+                logger.info(f"表格已串流分割為 {chunks_count} 個塊")
             
             # 5. 提取關鍵詞和語言
-            keywords = TextProcessor.extract_keywords(text)
-            language = TextProcessor.detect_language(text)
+            with stats.stage('keywords'):
+                keywords = TextProcessor.extract_keywords(text)
+            with stats.stage('language'):
+                language = TextProcessor.detect_language(text)
             
             # 6. 更新文件狀態
             documents_collection.update_one(
-                {'_id': ObjectId(document_id)},
+                {'_id': document_id},
                 {'$set': {
                     'status': DocumentStatus.COMPLETED,
-                    'chunks_count': len(chunks),
+                    'chunks_count': chunks_count,
                     'text_preview': text[:500],
                     'language': language,
                     'keywords': keywords,
+                    'processing_stats': DocumentService._publish_stats(stats, success=True),
                     'processed_at': datetime.utcnow(),
                     'updated_at': datetime.utcnow()
                 }}
             )
             
-            logger.info(f"文件處理完成: {document.filename}")
+            CheckpointService.clear(document_id)
+            answer_cache.invalidate(tenant_id)
+            DocumentService._enqueue_rag_import(document_id, tenant_id)
+            
+            logger.info(f"文件處理完成: {context['filename']}，各階段耗時(ms): {stats.stages}")
             return True
         except Exception as e:
             logger.error(f"文件處理失敗: {e}")
             
             # 更新失敗狀態
+            DocumentService._mark_failed(document_id, str(e), stats)
+            return False
+    
+    @staticmethod
+    def _enqueue_rag_import(document_id: str, tenant_id: str) -> None:
+        """使用 RAG Engine 時上傳文件到 GCS 並排入 RAG 匯入，不等待匯入完成（狀態見 rag_status）"""
+        if not config.USE_RAG_ENGINE:
+            return
+        
+        try:
+            from services.rag_engine_service import rag_engine_service
+            from services.cloud_storage_service import cloud_storage_service
+            
+            doc_data = get_documents_collection().find_one({'_id': document_id}, {'file_path': 1})
+            file_ext = os.path.splitext(doc_data['file_path'])[1]
+            
+            # 以文件 ID 命名，匯入完成後依檔名找回對應的 RAG 文件
+            gcs_uri = cloud_storage_service.upload_from_filename(doc_data['file_path'], tenant_id, f"{document_id}{file_ext}")
+            if not gcs_uri:
+                logger.warning(f"文件未上傳到 GCS，略過 RAG Engine 匯入: {document_id}")
+                return
+            
+            rag_engine_service.enqueue_import(tenant_id, document_id, gcs_uri)
+        except ImportError:
+            logger.warning("RAG Engine 服務不可用，略過 RAG 匯入")
+        except Exception as e:
+            logger.error(f"排入 RAG 匯入失敗 {document_id}: {e}")
+    
+    @staticmethod
+    def _delete_rag_copies(document: Document) -> None:
+        """刪除文件在 RAG Engine 與 GCS 的副本（失敗只記錄，不影響刪除文件）"""
+        try:
+            from services.rag_engine_service import rag_engine_service
+            from services.cloud_storage_service import cloud_storage_service
+            
+            rag_engine_service.delete_files(document.tenant_id, document.rag_file_names)
+            if document.rag_gcs_uri:
+                cloud_storage_service.delete_file(document.rag_gcs_uri)
+        except Exception as e:
+            logger.error(f"刪除 RAG 副本失敗 {document.id}: {e}")
+    
+    @staticmethod
+    def retry_document(document_id: str, tenant_id: str) -> Optional[dict]:
+        """重試處理失敗的文件（從檢查點繼續）"""
+        from services.ingestion_scheduler import ingestion_scheduler
+        
+        try:
             documents_collection = get_documents_collection()
-            documents_collection.update_one(
-                {'_id': ObjectId(document_id)},
+            doc_data = documents_collection.find_one_and_update(
+                {'_id': document_id, 'tenant_id': tenant_id, 'status': DocumentStatus.FAILED},
                 {'$set': {
-                    'status': DocumentStatus.FAILED,
-                    'error_message': str(e),
+                    'status': DocumentStatus.PROCESSING,
+                    'error_message': None,
+                    'resume_count': 0,
                     'updated_at': datetime.utcnow()
-                }}
+                }},
+                return_document=ReturnDocument.AFTER
             )
-            return False
+            
+            if not doc_data:
+                logger.warning(f"文件不存在或不是失敗狀態: {document_id}")
+                return None
+            
+            ingestion_scheduler.enqueue(tenant_id, document_id)
+            return dict_to_document(doc_data).dict()
+        except Exception as e:
+            logger.error(f"重試文件處理失敗: {e}")
+            return None
+    
+    @staticmethod
+    def resume_stuck_documents(stale_seconds: int = None) -> int:
+        """偵測長時間停留在 PROCESSING 的文件並從檢查點恢復處理
+        
+        只依資料庫中的狀態與心跳判斷：排程器會定期更新佇列中與處理中文件的 updated_at，
+        超過 stale_seconds 未更新即視為所屬進程已中斷，再以原子更新認領，多個 worker 不會重複恢復。
+        恢復超過 INGEST_MAX_RESUMES 次仍未完成的文件標記為失敗，避免無限重試。
+        """
+        from services.ingestion_scheduler import ingestion_scheduler
+        
+        if stale_seconds is None:
+            stale_seconds = config.INGEST_STALE_AFTER_SECONDS
+        
+        resumed = 0
+        try:
+            documents_collection = get_documents_collection()
+            cutoff = datetime.utcnow() - timedelta(seconds=stale_seconds)
+            
+            for doc in documents_collection.find(
+                {'status': DocumentStatus.PROCESSING, 'updated_at': {'$lt': cutoff}},
+                {'_id': 1}
+            ):
+                document_id = str(doc['_id'])
+                
+                # 以更新心跳時間原子認領，避免多個 worker 重複恢復同一文件
+                claimed = documents_collection.find_one_and_update(
+                    {'_id': doc['_id'], 'status': DocumentStatus.PROCESSING, 'updated_at': {'$lt': cutoff}},
+                    {'$set': {'updated_at': datetime.utcnow()}, '$inc': {'resume_count': 1}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if not claimed:
+                    continue
+                
+                if claimed['resume_count'] > config.INGEST_MAX_RESUMES:
+                    logger.warning(f"文件恢復次數過多，標記為失敗: {claimed.get('filename')} ({document_id})")
+                    DocumentService._mark_failed(document_id, '多次恢復處理仍未完成')
+                    if claimed.get('batch_id'):
+                        DocumentService.record_batch_result(claimed['batch_id'], success=False)
+                    continue
+                
+                logger.info(f"恢復卡住的文件: {claimed.get('filename')} ({document_id})")
+                ingestion_scheduler.enqueue(claimed['tenant_id'], document_id, batch_id=claimed.get('batch_id'))
+                resumed += 1
+            
+            if resumed:
+                logger.info(f"共恢復 {resumed} 個卡住的文件")
+            return resumed
+        except Exception as e:
+            logger.error(f"恢復卡住的文件失敗: {e}")
+            return resumed
+    
+    @staticmethod
+    def get_ingestion_stats(tenant_id: str, limit: int = 200) -> dict:
+        """統計租戶最近處理文件的各階段 p50/p95"""
+        try:
+            documents_collection = get_documents_collection()
+            docs = documents_collection.find(
+                {'tenant_id': tenant_id, 'processing_stats': {'$exists': True}},
+                {'processing_stats': 1, 'status': 1}
+            ).sort('updated_at', -1).limit(limit)
+            
+            stage_values = {}
+            counter_values = {}
+            totals = []
+            failed = 0
+            
+            for doc in docs:
+                doc_stats = doc.get('processing_stats') or {}
+                if doc.get('status') == DocumentStatus.FAILED:
+                    failed += 1
+                totals.append(doc_stats.get('total_ms', 0.0))
+                for stage, value in doc_stats.get('stages_ms', {}).items():
+                    stage_values.setdefault(stage, []).append(value)
+                for name, value in doc_stats.get('counters', {}).items():
+                    counter_values.setdefault(name, []).append(value)
+            
+            def summarize(values):
+                return {
+                    'p50': round(percentile(values, 50), 2),
+                    'p95': round(percentile(values, 95), 2),
+                    'max': round(max(values), 2) if values else 0.0
+                }
+            
+            return {
+                'tenant_id': tenant_id,
+                'documents': len(totals),
+                'failed': failed,
+                'total_ms': summarize(totals),
+                'stages_ms': {stage: summarize(values) for stage, values in stage_values.items()},
+                'counters': {name: summarize(values) for name, values in counter_values.items()}
+            }
+        except Exception as e:
+            logger.error(f"獲取匯入統計失敗: {e}")
+            return {}
     
     @staticmethod
     def get_documents(tenant_id: str) -> List[dict]:
@@ -182,7 +700,7 @@ class DocumentService:
         """刪除文件"""
         try:
             documents_collection = get_documents_collection()
-            doc_data = documents_collection.find_one({'_id': ObjectId(document_id), 'tenant_id': tenant_id})
+            doc_data = documents_collection.find_one({'_id': document_id, 'tenant_id': tenant_id})
             
             if not doc_data:
                 logger.warning(f"文件不存在或無權限: {document_id}")
@@ -190,15 +708,21 @@ class DocumentService:
             
             document = dict_to_document(doc_data)
             
-            # 刪除向量數據
+            # 刪除向量數據與處理檢查點
             vector_store_manager.delete_by_document(tenant_id, document_id)
+            CheckpointService.clear(document_id)
+            answer_cache.invalidate(tenant_id)
+            
+            # 刪除已匯入 RAG Engine 的文件與 GCS 副本
+            if document.rag_file_names or document.rag_gcs_uri:
+                DocumentService._delete_rag_copies(document)
             
             # 刪除物理文件
             if os.path.exists(document.file_path):
                 os.remove(document.file_path)
             
             # 刪除資料庫記錄
-            documents_collection.delete_one({'_id': ObjectId(document_id)})
+            documents_collection.delete_one({'_id': document_id})
             
             logger.info(f"文件已刪除: {document.filename}")
             return True
@@ -1,5 +1,7 @@
 import google.generativeai as genai
 from typing import List
+from services import fake_llm
+from utils.circuit_breaker import get_breaker
 from config import get_config
 from utils.logger import logger
 
@@ -22,17 +24,28 @@ class EmbeddingService:
         """初始化 Gemini API"""
         if not self._initialized:
             try:
+                if config.LLM_BACKEND == 'fake':
+                    self._embed_content = fake_llm.embed_content
+                    self._initialized = True
+                    logger.warning(f"LLM_BACKEND=fake，使用本機模擬嵌入（{config.FAKE_LLM_URL or '同進程'}）")
+                    return
+                
                 if not config.GOOGLE_API_KEY:
                     logger.warning("未配置 GOOGLE_API_KEY，嵌入功能將不可用")
                     return
                 
                 genai.configure(api_key=config.GOOGLE_API_KEY)
+                self._embed_content = genai.embed_content
                 self._initialized = True
                 logger.info(f"Gemini Embedding 服務初始化成功，模型: {config.EMBEDDING_MODEL}")
             except Exception as e:
                 logger.error(f"Gemini Embedding 初始化失敗: {e}")
                 raise
     
+    def _embed(self, **kwargs):
+        """經由斷路器呼叫嵌入 API；斷路器開啟時立即拋出 CircuitOpenError，由各方法以失敗處理"""
+        return get_breaker('embedding').call(self._embed_content, **kwargs)
+    
     def embed_text(self, text: str) -> List[float]:
         """將文本轉換為向量"""
         try:
@@ -40,7 +53,7 @@ class EmbeddingService:
                 logger.error("Gemini Embedding 服務未初始化")
                 return []
             
-            result = genai.embed_content(
+            result = self._embed(
                 model=config.EMBEDDING_MODEL,
                 content=text,
                 task_type="retrieval_document"
@@ -65,7 +78,7 @@ class EmbeddingService:
                 batch = texts[i:i + batch_size]
                 
                 for text in batch:
-                    result = genai.embed_content(
+                    result = self._embed(
                         model=config.EMBEDDING_MODEL,
                         content=text,
                         task_type="retrieval_document"
@@ -79,6 +92,27 @@ class EmbeddingService:
             logger.error(f"批次嵌入失敗: {e}")
             return []
     
+    def embed_queries(self, queries: List[str], batch_size: int = 100) -> List[List[float]]:
+        """批次將查詢轉換為向量：每批以單次 API 呼叫嵌入（Gemini 每次最多 100 筆）"""
+        try:
+            if not self._initialized:
+                logger.error("Gemini Embedding 服務未初始化")
+                return []
+            
+            embeddings = []
+            for i in range(0, len(queries), batch_size):
+                result = self._embed(
+                    model=config.EMBEDDING_MODEL,
+                    content=queries[i:i + batch_size],
+                    task_type="retrieval_query"
+                )
+                embeddings.extend(result['embedding'])
+            
+            return embeddings
+        except Exception as e:
+            logger.error(f"批次查詢嵌入失敗: {e}")
+            return []
+    
     def embed_query(self, query: str) -> List[float]:
         """將查詢轉換為向量（用於檢索）"""
         try:
@@ -86,7 +120,7 @@ class EmbeddingService:
                 logger.error("Gemini Embedding 服務未初始化")
                 return []
             
-            result = genai.embed_content(
+            result = self._embed(
                 model=config.EMBEDDING_MODEL,
                 content=query,
                 task_type="retrieval_query"
@@ -0,0 +1,304 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, Iterator, List, Optional
+from google.api_core import exceptions as google_exceptions
+from utils.text_processor import TextProcessor
+from config import get_config
+
+config = get_config()
+
+# 模擬回應的詞彙，每個詞視為一個 token
+_VOCABULARY = (
+    '根據', '知識庫', '內容', '說明', '如下', '首先', '其次', '此外', '請', '參考',
+    '相關', '規定', '流程', '資料', '客戶', '服務', '申請', '時間', '方式', '[來源 1]'
+)
+
+
+class _FakeResponse:
+    """與 Gemini 回應相同介面的最小物件（text、parts、usage_metadata）"""
+    
+    def __init__(self, text: str, prompt_tokens: int = 0, completion_tokens: int = 0):
+        self.text = text
+        self.parts = [text] if text else []
+        self.usage_metadata = SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=completion_tokens,
+            total_token_count=prompt_tokens + completion_tokens
+        )
+
+
+def _jittered(seconds: float) -> float:
+    """依 FAKE_LLM_JITTER 加入隨機延遲偏差"""
+    return max(seconds * (1 + random.uniform(-config.FAKE_LLM_JITTER, config.FAKE_LLM_JITTER)), 0.0)
+
+
+def _inject_error() -> None:
+    """依 FAKE_LLM_ERROR_RATE 模擬 503 錯誤"""
+    if random.random() < config.FAKE_LLM_ERROR_RATE:
+        raise google_exceptions.ServiceUnavailable('fake LLM injected error')
+
+
+def _plan_tokens(prompt: str, max_tokens: Optional[int]) -> List[str]:
+    """依提示詞決定回應內容，相同提示詞得到相同回應"""
+    count = config.FAKE_LLM_OUTPUT_TOKENS
+    if max_tokens:
+        count = min(count, max_tokens)
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+    return [rng.choice(_VOCABULARY) for _ in range(count)]
+
+
+def _check_deadline(started: float, timeout: Optional[float]) -> None:
+    """超過請求期限時與真實 API 一樣拋出 DeadlineExceeded"""
+    if timeout is not None and time.monotonic() - started > timeout:
+        raise google_exceptions.DeadlineExceeded('fake LLM deadline exceeded')
+
+
+def _sleep_within(seconds: float, started: float, timeout: Optional[float]) -> None:
+    """睡眠，但不超過期限"""
+    if timeout is not None:
+        seconds = min(seconds, max(started + timeout - time.monotonic(), 0) + 0.001)
+    time.sleep(seconds)
+    _check_deadline(started, timeout)
+
+
+def generate_chunks(prompt: str, max_tokens: Optional[int] = None, timeout: Optional[float] = None) -> Iterator[_FakeResponse]:
+    """依 FAKE_LLM_TTFT_MS 與 FAKE_LLM_TOKENS_PER_SECOND 逐段產生回應，最後一段帶 token 用量"""
+    started = time.monotonic()
+    _inject_error()
+    
+    tokens = _plan_tokens(prompt, max_tokens)
+    prompt_tokens = TextProcessor.estimate_tokens(prompt)
+    step = max(config.FAKE_LLM_CHUNK_TOKENS, 1)
+    
+    _sleep_within(_jittered(config.FAKE_LLM_TTFT_MS / 1000), started, timeout)
+    for i in range(0, len(tokens), step):
+        if i > 0:
+            _sleep_within(_jittered(step / config.FAKE_LLM_TOKENS_PER_SECOND), started, timeout)
+        last = i + step >= len(tokens)
+        yield _FakeResponse(
+            ''.join(tokens[i:i + step]),
+            prompt_tokens if last else 0,
+            len(tokens) if last else 0
+        )
+
+
+def _collect(chunks: Iterator[_FakeResponse]) -> _FakeResponse:
+    """非串流生成：讀完所有片段後合併為一個回應"""
+    chunks = list(chunks)
+    return _FakeResponse(
+        ''.join(chunk.text for chunk in chunks),
+        chunks[-1].usage_metadata.prompt_token_count,
+        chunks[-1].usage_metadata.candidates_token_count
+    )
+
+
+def embed(text: str, dimension: Optional[int] = None) -> List[float]:
+    """特徵雜湊向量：相同文本得到相同向量，共用詞彙越多越相似"""
+    dimension = dimension or config.EMBEDDING_DIMENSION
+    vector = [0.0] * dimension
+    words = text.split() if ' ' in text.strip() else list(text)
+    for word in words:
+        digest = hashlib.md5(word.lower().encode('utf-8')).digest()
+        index = int.from_bytes(digest[:4], 'little') % dimension
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class _HttpBackend:
+    """FAKE_LLM_URL 指向的獨立模擬伺服器客戶端"""
+    
+    def __init__(self, base_url: str):
+        self._base_url = base_url.rstrip('/')
+    
+    def _post(self, path: str, payload: Dict, timeout: Optional[float]):
+        """送出請求，HTTP 錯誤轉換為與 Gemini 相同的例外類型"""
+        request = urllib.request.Request(
+            f"{self._base_url}{path}",
+            data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 503:
+                raise google_exceptions.ServiceUnavailable(e.read().decode('utf-8', 'replace'))
+            if e.code == 504:
+                raise google_exceptions.DeadlineExceeded(e.read().decode('utf-8', 'replace'))
+            raise google_exceptions.InternalServerError(f"fake LLM server HTTP {e.code}")
+        except TimeoutError as e:
+            raise google_exceptions.DeadlineExceeded(str(e))
+    
+    def generate_chunks(self, prompt: str, max_tokens: Optional[int], timeout: Optional[float]) -> Iterator[_FakeResponse]:
+        response = self._post('/v1/generate', {'prompt': prompt, 'max_tokens': max_tokens, 'timeout': timeout}, timeout)
+        with response:
+            for line in response:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                if 'error' in event:
+                    raise google_exceptions.DeadlineExceeded(event['error'])
+                yield _FakeResponse(event['text'], event.get('prompt_tokens', 0), event.get('completion_tokens', 0))
+    
+    def embed(self, content) -> Dict:
+        with self._post('/v1/embed', {'content': content}, None) as response:
+            return json.loads(response.read())
+
+
+class FakeGenerativeModel:
+    """與 genai.GenerativeModel 相同呼叫方式的模擬模型（LLM_BACKEND=fake）"""
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._http = _HttpBackend(config.FAKE_LLM_URL) if config.FAKE_LLM_URL else None
+    
+    @staticmethod
+    def _check_kwargs(kwargs: Dict) -> None:
+        """與 google-generativeai 0.3 相同：未知的參數視為 GenerateContentRequest 的欄位而拒絕"""
+        if kwargs:
+            raise ValueError(f"Unknown field for GenerateContentRequest: {', '.join(kwargs)}")
+    
+    def _chunks(self, prompt: str, generation_config) -> Iterator[_FakeResponse]:
+        max_tokens = getattr(generation_config, 'max_output_tokens', None)
+        if self._http is not None:
+            return self._http.generate_chunks(prompt, max_tokens, None)
+        return generate_chunks(prompt, max_tokens)
+    
+    def generate_content(self, contents: str, *, generation_config=None, safety_settings=None, stream: bool = False, **kwargs):
+        self._check_kwargs(kwargs)
+        chunks = self._chunks(contents, generation_config)
+        return chunks if stream else _collect(chunks)
+    
+    async def generate_content_async(self, contents: str, *, generation_config=None, safety_settings=None, stream: bool = False, **kwargs):
+        self._check_kwargs(kwargs)
+        if not stream:
+            return await asyncio.to_thread(self.generate_content, contents, generation_config=generation_config)
+        return _AsyncChunks(self._chunks(contents, generation_config))
+
+
+class _AsyncChunks:
+    """在執行緒中讀取同步片段的非同步迭代器"""
+    
+    def __init__(self, chunks: Iterator[_FakeResponse]):
+        self._chunks = chunks
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self) -> _FakeResponse:
+        chunk = await asyncio.to_thread(next, self._chunks, None)
+        if chunk is None:
+            raise StopAsyncIteration
+        return chunk
+
+
+def embed_content(model: str, content, task_type: str = None) -> Dict:
+    """與 genai.embed_content 相同呼叫方式的模擬嵌入；content 為列表時一次呼叫返回多個向量"""
+    if config.FAKE_LLM_URL:
+        return _HttpBackend(config.FAKE_LLM_URL).embed(content)
+    
+    time.sleep(_jittered(config.FAKE_EMBEDDING_LATENCY_MS / 1000))
+    if isinstance(content, list):
+        return {'embedding': [embed(text) for text in content]}
+    return {'embedding': embed(content)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """模擬伺服器：POST /v1/generate 以 NDJSON 串流回應片段，POST /v1/embed 返回向量"""
+    
+    protocol_version = 'HTTP/1.0'
+    
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+    
+    def _send_json(self, status: int, payload: Dict) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客戶端已逾時離開
+            pass
+    
+    def do_POST(self):
+        payload = self._read_json()
+        
+        if self.path == '/v1/embed':
+            self._send_json(200, embed_content('', payload.get('content', '')))
+            return
+        
+        if self.path != '/v1/generate':
+            self._send_json(404, {'error': 'not found'})
+            return
+        
+        try:
+            chunks = generate_chunks(payload.get('prompt', ''), payload.get('max_tokens'), payload.get('timeout'))
+            first = next(chunks)
+        except google_exceptions.ServiceUnavailable as e:
+            self._send_json(503, {'error': str(e)})
+            return
+        except google_exceptions.DeadlineExceeded as e:
+            self._send_json(504, {'error': str(e)})
+            return
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        try:
+            for chunk in _prepend(first, chunks):
+                self.wfile.write((json.dumps({
+                    'text': chunk.text,
+                    'prompt_tokens': chunk.usage_metadata.prompt_token_count,
+                    'completion_tokens': chunk.usage_metadata.candidates_token_count
+                }, ensure_ascii=False) + '\n').encode('utf-8'))
+                self.wfile.flush()
+        except google_exceptions.DeadlineExceeded as e:
+            self.wfile.write((json.dumps({'error': str(e)}) + '\n').encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    def log_message(self, format, *args):
+        pass
+
+
+def _prepend(first, rest: Iterator) -> Iterator:
+    """將已讀取的第一個片段接回串流"""
+    yield first
+    yield from rest
+
+
+def serve(host: str = '127.0.0.1', port: int = 8090) -> None:
+    """啟動模擬 LLM／嵌入伺服器"""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    print(
+        f"Fake LLM server on http://{host}:{port} "
+        f"(ttft={config.FAKE_LLM_TTFT_MS}ms, rate={config.FAKE_LLM_TOKENS_PER_SECOND} tok/s, "
+        f"jitter={config.FAKE_LLM_JITTER}, error_rate={config.FAKE_LLM_ERROR_RATE})"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本機模擬 Gemini LLM 與嵌入伺服器（壓測用）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -0,0 +1,331 @@
+import asyncio
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, List, Optional, Tuple
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from services.fake_llm import FakeGenerativeModel
+from config import get_config
+from utils.circuit_breaker import get_breaker, CircuitOpenError
+from utils.metrics import metrics, percentile
+from utils.logger import logger
+
+config = get_config()
+
+# 可重試的錯誤：逾時、限流與伺服器端暫時性錯誤
+RETRYABLE_ERRORS = (
+    TimeoutError,
+    asyncio.TimeoutError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests
+)
+
+# 計入斷路器失敗的錯誤：可重試的錯誤以外，再加上連線錯誤與其他 5xx；其餘用戶端錯誤代表服務本身可用
+BREAKER_FAILURE_ERRORS = RETRYABLE_ERRORS + (ConnectionError, google_exceptions.ServerError)
+
+# 計算 p95 延遲所需的最少樣本數，不足時使用 GEMINI_HEDGE_MIN_DELAY_SECONDS
+MIN_LATENCY_SAMPLES = 20
+
+
+class LLMUnavailableError(Exception):
+    """主要與備援模型都在期限內失敗"""
+
+
+class ContentBlockedError(Exception):
+    """回應被安全機制攔截或沒有內容，改用備援模型也不會改變結果"""
+
+
+class _ModelSlot:
+    """單一模型與其最近的成功延遲"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.model = FakeGenerativeModel(name) if config.LLM_BACKEND == 'fake' else genai.GenerativeModel(name)
+        self.latencies = deque(maxlen=200)
+        self.lock = threading.Lock()
+        self.breaker = get_breaker(f"llm:{name}")
+    
+    def record_latency(self, seconds: float) -> None:
+        with self.lock:
+            self.latencies.append(seconds)
+    
+    def hedge_delay(self) -> float:
+        """送出對沖請求前的等待時間：最近延遲的 p95，樣本不足時使用設定的下限"""
+        with self.lock:
+            samples = list(self.latencies)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return config.GEMINI_HEDGE_MIN_DELAY_SECONDS
+        return max(percentile(samples, 95), config.GEMINI_HEDGE_MIN_DELAY_SECONDS)
+
+
+class GeminiClient:
+    """具容錯能力的 Gemini 呼叫：整體期限、p95 對沖請求、退避重試與備援模型
+
+    每次呼叫的結果（success/timeout/retryable_error/blocked/error）都記錄於 llm_requests_total 指標。
+    """
+    
+    def __init__(self):
+        """建立主要與備援模型（Gemini 需已呼叫 genai.configure；LLM_BACKEND=fake 時使用模擬模型）"""
+        self._slots = [_ModelSlot(config.GEMINI_MODEL)]
+        if config.GEMINI_FALLBACK_MODEL and config.GEMINI_FALLBACK_MODEL != config.GEMINI_MODEL:
+            self._slots.append(_ModelSlot(config.GEMINI_FALLBACK_MODEL))
+        
+        # 同步呼叫無法中途取消，落後的對沖請求在背景執行完畢後丟棄
+        self._executor = ThreadPoolExecutor(max_workers=config.GEMINI_CALL_WORKERS, thread_name_prefix='gemini')
+        
+        self._requests = metrics.counter('llm_requests_total', 'Gemini 呼叫次數（依模型與結果）')
+        self._latency = metrics.histogram('llm_request_seconds', 'Gemini 成功呼叫耗時（秒）')
+        self._hedges = metrics.counter('llm_hedged_requests_total', 'Gemini 對沖請求（result=launched 送出、won 先完成）')
+        self._fallbacks = metrics.counter('llm_fallbacks_total', '改用備援模型的次數')
+        self._failures = metrics.counter('llm_failures_total', '主要與備援模型皆失敗的請求數')
+    
+    @property
+    def model_names(self) -> List[str]:
+        return [slot.name for slot in self._slots]
+    
+    @staticmethod
+    def _outcome(error: BaseException) -> str:
+        """將錯誤分類為指標標籤"""
+        if isinstance(error, (TimeoutError, asyncio.TimeoutError, google_exceptions.DeadlineExceeded)):
+            return 'timeout'
+        if isinstance(error, RETRYABLE_ERRORS):
+            return 'retryable_error'
+        if isinstance(error, ContentBlockedError):
+            return 'blocked'
+        return 'error'
+    
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """指數退避加隨機抖動"""
+        base = config.GEMINI_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+        return base + random.uniform(0, base)
+    
+    def _record(self, slot: _ModelSlot, started: float, error: Optional[BaseException] = None) -> None:
+        """記錄一次呼叫結果（同時回報斷路器，只有逾時、傳輸、限流與 5xx 錯誤計為失敗）"""
+        elapsed = time.monotonic() - started
+        slot.breaker.record(not isinstance(error, BREAKER_FAILURE_ERRORS), elapsed)
+        if error is None:
+            slot.record_latency(elapsed)
+            self._latency.observe(elapsed, model=slot.name)
+            self._requests.inc(model=slot.name, outcome='success')
+        else:
+            self._requests.inc(model=slot.name, outcome=self._outcome(error))
+    
+    @staticmethod
+    def _check_content(response):
+        """安全攔截等沒有內容的回應在讀取 text 時拋出 ValueError，轉為 ContentBlockedError"""
+        try:
+            _ = response.text
+        except ValueError as e:
+            raise ContentBlockedError(f"回應被攔截或沒有內容: {e}") from e
+        return response
+    
+    def _call(self, slot: _ModelSlot, prompt: str, generation_config):
+        """單次同步呼叫（google-generativeai 0.3 不支援單次請求期限，期限由 _hedged_call 等待 future 控制）"""
+        response = slot.model.generate_content(prompt, generation_config=generation_config)
+        return self._check_content(response)
+    
+    def _hedged_call(self, slot: _ModelSlot, prompt: str, generation_config, timeout: float):
+        """送出請求，超過 p95 延遲仍未完成時再送出一個相同請求，採用先成功者"""
+        deadline = time.monotonic() + timeout
+        primary = self._executor.submit(self._call, slot, prompt, generation_config)
+        pending = {primary}
+        
+        hedge_delay = slot.hedge_delay()
+        if config.GEMINI_HEDGE_ENABLED and hedge_delay < timeout:
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done:
+                pending.add(self._executor.submit(self._call, slot, prompt, generation_config))
+                self._hedges.inc(model=slot.name, result='launched')
+        
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f"Gemini 呼叫超過 {timeout:.1f} 秒")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._hedges.inc(model=slot.name, result='won')
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def _run(self, operation: str, func) -> Tuple[object, str]:
+        """依序以主要、備援模型執行 func(slot, timeout)，可重試的錯誤退避後重試，整體不超過 GEMINI_TIMEOUT_SECONDS"""
+        deadline = time.monotonic() + config.GEMINI_TIMEOUT_SECONDS
+        last_error = None
+        
+        for index, slot in enumerate(self._slots):
+            if index > 0:
+                self._fallbacks.inc(model=slot.name)
+                logger.warning(f"Gemini 主要模型失敗，改用備援模型: {slot.name}")
+            
+            for attempt in range(config.GEMINI_MAX_RETRIES + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                # 斷路器開啟時不等待失敗，直接改用下一個模型
+                if not slot.breaker.allow():
+                    last_error = CircuitOpenError(f"{slot.breaker.name} 斷路器開啟中")
+                    self._requests.inc(model=slot.name, outcome='circuit_open')
+                    break
+                
+                started = time.monotonic()
+                try:
+                    result = func(slot, min(remaining, config.GEMINI_ATTEMPT_TIMEOUT_SECONDS))
+                    self._record(slot, started)
+                    return result, slot.name
+                except ContentBlockedError as e:
+                    # 安全攔截與模型可用性無關，直接交給呼叫端
+                    self._record(slot, started, e)
+                    raise
+                except Exception as e:
+                    self._record(slot, started, e)
+                    last_error = e
+                    logger.warning(f"Gemini {operation}失敗（{slot.name} 第 {attempt + 1} 次）: {e}")
+                    if not isinstance(e, RETRYABLE_ERRORS):
+                        # 不可重試的錯誤直接改用下一個模型
+                        break
+                
+                if attempt < config.GEMINI_MAX_RETRIES:
+                    time.sleep(min(self._backoff(attempt), max(deadline - time.monotonic(), 0)))
+        
+        self._failures.inc()
+        raise LLMUnavailableError(f"Gemini 暫時無法使用: {last_error}")
+    
+    def generate(self, prompt: str, generation_config) -> Tuple[object, str]:
+        """生成回應，返回 (回應, 實際使用的模型)"""
+        return self._run(
+            '生成',
+            lambda slot, timeout: self._hedged_call(slot, prompt, generation_config, timeout)
+        )
+    
+    def open_stream(self, prompt: str, generation_config) -> Tuple[Iterator, str]:
+        """開啟串流並取得第一個片段（重試與備援只在第一個片段前進行），返回 (片段迭代器, 模型)"""
+        def open_first(slot: _ModelSlot) -> Iterator:
+            chunks = iter(slot.model.generate_content(prompt, generation_config=generation_config, stream=True))
+            return itertools.chain([next(chunks)], chunks)
+        
+        def start(slot: _ModelSlot, timeout: float) -> Iterator:
+            # 在執行緒中等待第一個片段，超過期限即放棄（逾時的請求在背景執行完畢後丟棄）
+            future = self._executor.submit(open_first, slot)
+            done, _ = wait([future], timeout=timeout)
+            if not done:
+                raise TimeoutError(f"Gemini 串流開啟超過 {timeout:.1f} 秒")
+            return future.result()
+        
+        return self._run('串流開啟', start)
+    
+    async def _call_async(self, slot: _ModelSlot, prompt: str, generation_config, timeout: float):
+        """單次非同步呼叫"""
+        response = await asyncio.wait_for(
+            slot.model.generate_content_async(prompt, generation_config=generation_config),
+            timeout
+        )
+        return self._check_content(response)
+    
+    async def _hedged_call_async(self, slot: _ModelSlot, prompt: str, generation_config, timeout: float):
+        """_hedged_call 的非同步版本，落後的請求會被取消"""
+        deadline = time.monotonic() + timeout
+        primary = asyncio.ensure_future(self._call_async(slot, prompt, generation_config, timeout))
+        pending = {primary}
+        
+        try:
+            hedge_delay = slot.hedge_delay()
+            if config.GEMINI_HEDGE_ENABLED and hedge_delay < timeout:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    remaining = deadline - time.monotonic()
+                    pending.add(asyncio.ensure_future(self._call_async(slot, prompt, generation_config, remaining)))
+                    self._hedges.inc(model=slot.name, result='launched')
+            
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError(f"Gemini 呼叫超過 {timeout:.1f} 秒")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._hedges.inc(model=slot.name, result='won')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _run_async(self, operation: str, func) -> Tuple[object, str]:
+        """_run 的非同步版本，func(slot, timeout) 為協程"""
+        deadline = time.monotonic() + config.GEMINI_TIMEOUT_SECONDS
+        last_error = None
+        
+        for index, slot in enumerate(self._slots):
+            if index > 0:
+                self._fallbacks.inc(model=slot.name)
+                logger.warning(f"Gemini 主要模型失敗，改用備援模型: {slot.name}")
+            
+            for attempt in range(config.GEMINI_MAX_RETRIES + 1):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                
+                # 斷路器開啟時不等待失敗，直接改用下一個模型
+                if not slot.breaker.allow():
+                    last_error = CircuitOpenError(f"{slot.breaker.name} 斷路器開啟中")
+                    self._requests.inc(model=slot.name, outcome='circuit_open')
+                    break
+                
+                started = time.monotonic()
+                try:
+                    result = await func(slot, min(remaining, config.GEMINI_ATTEMPT_TIMEOUT_SECONDS))
+                    self._record(slot, started)
+                    return result, slot.name
+                except ContentBlockedError as e:
+                    # 安全攔截與模型可用性無關，直接交給呼叫端
+                    self._record(slot, started, e)
+                    raise
+                except Exception as e:
+                    self._record(slot, started, e)
+                    last_error = e
+                    logger.warning(f"Gemini {operation}失敗（{slot.name} 第 {attempt + 1} 次）: {e}")
+                    if not isinstance(e, RETRYABLE_ERRORS):
+                        break
+                
+                if attempt < config.GEMINI_MAX_RETRIES:
+                    await asyncio.sleep(min(self._backoff(attempt), max(deadline - time.monotonic(), 0)))
+        
+        self._failures.inc()
+        raise LLMUnavailableError(f"Gemini 暫時無法使用: {last_error}")
+    
+    async def generate_async(self, prompt: str, generation_config) -> Tuple[object, str]:
+        """generate 的非同步版本"""
+        return await self._run_async(
+            '生成',
+            lambda slot, timeout: self._hedged_call_async(slot, prompt, generation_config, timeout)
+        )
+    
+    async def open_stream_async(self, prompt: str, generation_config) -> Tuple[Tuple[object, object], str]:
+        """open_stream 的非同步版本，返回 ((第一個片段, 其餘片段的非同步迭代器), 模型)"""
+        async def start(slot: _ModelSlot, timeout: float):
+            deadline = time.monotonic() + timeout
+            response = await asyncio.wait_for(
+                slot.model.generate_content_async(prompt, generation_config=generation_config, stream=True),
+                timeout
+            )
+            chunks = response.__aiter__()
+            first = await asyncio.wait_for(chunks.__anext__(), max(deadline - time.monotonic(), 0.001))
+            return first, chunks
+        
+        return await self._run_async('串流開啟', start)
@@ -0,0 +1,220 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from models.conversation import MessageRole, dict_to_message
+from services.llm_service import llm_service
+from utils.db_manager import get_conversations_collection, get_messages_collection
+from utils.async_db import get_async_conversations_collection, get_async_messages_collection
+from utils.text_processor import TextProcessor
+from utils.logger import logger
+from config import get_config
+
+config = get_config()
+
+SUMMARY_PROMPT = """你負責維護一段對話的摘要，供後續回答時參考。
+請將「既有摘要」與「新增對話」合併為一段精簡的繁體中文摘要：
+1. 保留用戶的目標、提到的關鍵事實、名稱與數字
+2. 保留助手已給出的重要結論
+3. 省略寒暄與重複內容
+4. 只輸出摘要本身"""
+
+
+class HistoryService:
+    """對話歷史組裝服務
+
+    最近的消息在 token 預算內原文放入提示詞；超出預算的較早消息
+    於背景合併進對話上的滾動摘要，因此提示詞大小不隨對話長度增長。
+    """
+    
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='history-summary')
+    _pending = set()
+    _lock = threading.Lock()
+    
+    @staticmethod
+    def _message_tokens(message) -> int:
+        """估算單條消息的 token 數（含角色標記）"""
+        return TextProcessor.estimate_tokens(message.content) + 4
+    
+    @staticmethod
+    def _split_window(messages: list, budget: int) -> int:
+        """從最新消息往前累計，返回預算內窗口的起始索引"""
+        used = 0
+        start = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            used += HistoryService._message_tokens(messages[i])
+            if used > budget:
+                break
+            start = i
+        return start
+    
+    @staticmethod
+    def _load_summary_state(conversation_id: str) -> Dict:
+        """讀取對話上的摘要欄位"""
+        conversations_collection = get_conversations_collection()
+        conv_data = conversations_collection.find_one(
+            {'_id': conversation_id},
+            {'history_summary': 1, 'summarized_until': 1}
+        )
+        return conv_data or {}
+    
+    @staticmethod
+    def _unsummarized_query(conversation_id: str, summarized_until: Optional[datetime]) -> Dict:
+        """尚未納入摘要的消息查詢條件"""
+        query = {'conversation_id': conversation_id}
+        if summarized_until:
+            query['timestamp'] = {'$gt': summarized_until}
+        return query
+    
+    @staticmethod
+    def _recent_messages_query(conversation_id: str, state: Dict) -> Tuple[Dict, Dict]:
+        """最近未摘要消息的查詢條件與投影（同步與非同步讀取共用）"""
+        return (
+            HistoryService._unsummarized_query(conversation_id, state.get('summarized_until')),
+            {'role': 1, 'content': 1, 'timestamp': 1}
+        )
+    
+    @staticmethod
+    def assemble_history(summary: Optional[str], docs: List[Dict]) -> List[Dict[str, str]]:
+        """以摘要與最近消息（時間倒序的文檔）組裝歷史，最近消息只保留預算內的部分"""
+        budget = config.HISTORY_TOKEN_BUDGET
+        history = []
+        if summary:
+            history.append({
+                'role': MessageRole.SYSTEM,
+                'content': f"先前對話摘要：{summary}"
+            })
+            budget -= TextProcessor.estimate_tokens(summary)
+        
+        messages = [dict_to_message(doc) for doc in reversed(docs)]
+        
+        start = HistoryService._split_window(messages, max(budget, 0))
+        for message in messages[start:]:
+            history.append({'role': message.role, 'content': message.content})
+        
+        return history
+    
+    @staticmethod
+    def build_history(conversation_id: str) -> List[Dict[str, str]]:
+        """組裝放入提示詞的歷史消息（摘要 + 預算內的最近消息）"""
+        try:
+            state = HistoryService._load_summary_state(conversation_id)
+            
+            query, projection = HistoryService._recent_messages_query(conversation_id, state)
+            messages_collection = get_messages_collection()
+            docs = list(
+                messages_collection.find(query, projection)
+                .sort('timestamp', -1).limit(config.HISTORY_MAX_MESSAGES)
+            )
+            
+            return HistoryService.assemble_history(state.get('history_summary'), docs)
+        except Exception as e:
+            logger.error(f"組裝對話歷史失敗: {e}")
+            return []
+    
+    @staticmethod
+    async def build_history_async(conversation_id: str) -> List[Dict[str, str]]:
+        """build_history 的非同步版本（使用非同步 MongoDB 驅動）"""
+        try:
+            conversations_collection = get_async_conversations_collection()
+            state = await conversations_collection.find_one(
+                {'_id': conversation_id},
+                {'history_summary': 1, 'summarized_until': 1}
+            ) or {}
+            
+            query, projection = HistoryService._recent_messages_query(conversation_id, state)
+            messages_collection = get_async_messages_collection()
+            docs = await (
+                messages_collection.find(query, projection)
+                .sort('timestamp', -1).limit(config.HISTORY_MAX_MESSAGES)
+                .to_list(length=config.HISTORY_MAX_MESSAGES)
+            )
+            
+            return HistoryService.assemble_history(state.get('history_summary'), docs)
+        except Exception as e:
+            logger.error(f"組裝對話歷史失敗: {e}")
+            return []
+    
+    @staticmethod
+    def schedule_summary_refresh(conversation_id: str) -> None:
+        """在背景更新滾動摘要（同一對話同時只排一次）"""
+        with HistoryService._lock:
+            if conversation_id in HistoryService._pending:
+                return
+            HistoryService._pending.add(conversation_id)
+        
+        HistoryService._executor.submit(HistoryService._refresh_summary, conversation_id)
+    
+    @staticmethod
+    def _refresh_summary(conversation_id: str) -> None:
+        """將超出歷史窗口的消息合併進滾動摘要"""
+        try:
+            state = HistoryService._load_summary_state(conversation_id)
+            summary = state.get('history_summary') or ''
+            
+            messages_collection = get_messages_collection()
+            docs = messages_collection.find(
+                HistoryService._unsummarized_query(conversation_id, state.get('summarized_until')),
+                {'role': 1, 'content': 1, 'timestamp': 1}
+            ).sort('timestamp', 1)
+            messages = [dict_to_message(doc) for doc in docs]
+            
+            # 與 build_history 相同的窗口規則：超出條數或 token 預算的部分需要摘要
+            budget = config.HISTORY_TOKEN_BUDGET - TextProcessor.estimate_tokens(summary)
+            recent = messages[-config.HISTORY_MAX_MESSAGES:]
+            start = len(messages) - len(recent) + HistoryService._split_window(recent, max(budget, 0))
+            overflow = messages[:start]
+            if not overflow:
+                return
+            
+            new_summary = HistoryService._summarize(summary, overflow)
+            
+            conversations_collection = get_conversations_collection()
+            conversations_collection.update_one(
+                {'_id': conversation_id},
+                {'$set': {
+                    'history_summary': new_summary,
+                    'summarized_until': overflow[-1].timestamp
+                }}
+            )
+            logger.info(f"對話摘要已更新: {conversation_id}，納入 {len(overflow)} 條消息")
+        except Exception as e:
+            logger.error(f"更新對話摘要失敗: {e}")
+        finally:
+            with HistoryService._lock:
+                HistoryService._pending.discard(conversation_id)
+    
+    @staticmethod
+    def _summarize(summary: str, messages: list) -> str:
+        """以 LLM 合併摘要；LLM 不可用時退回擷取式摘要"""
+        transcript = "\n".join(
+            f"{'用戶' if m.role == MessageRole.USER else '助手'}：{m.content}" for m in messages
+        )
+        
+        try:
+            response = llm_service.generate_response(
+                messages=[
+                    {'role': MessageRole.SYSTEM, 'content': SUMMARY_PROMPT},
+                    {'role': MessageRole.USER, 'content': f"既有摘要：\n{summary or '（無）'}\n\n新增對話：\n{transcript}"}
+                ],
+                temperature=0.2,
+                max_tokens=config.HISTORY_SUMMARY_MAX_TOKENS
+            )
+        except Exception as e:
+            logger.warning(f"LLM 摘要失敗，改用擷取式摘要: {e}")
+            response = {}
+        if response.get('model') != 'mock' and response.get('content'):
+            return HistoryService._truncate(response['content'].strip())
+        
+        lines = [summary] if summary else []
+        lines += [f"{'用戶' if m.role == MessageRole.USER else '助手'}：{m.content[:80]}" for m in messages]
+        return HistoryService._truncate("\n".join(lines), keep_tail=True)
+    
+    @staticmethod
+    def _truncate(text: str, keep_tail: bool = False) -> str:
+        """將摘要截斷到 HISTORY_SUMMARY_MAX_TOKENS 以內"""
+        limit = config.HISTORY_SUMMARY_MAX_TOKENS
+        while text and TextProcessor.estimate_tokens(text) > limit:
+            cut = max(1, len(text) // 10)
+            text = text[cut:] if keep_tail else text[:-cut]
+        return text
@@ -0,0 +1,109 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable
+from services.document_service import DocumentService
+from config import get_config
+from utils.logger import logger
+
+config = get_config()
+
+
+class IngestionPipeline:
+    """文件匯入管線：解析/分塊與嵌入/存儲分屬不同執行緒池，不同文件的階段可重疊執行"""
+    
+    _instance = None
+    _initialized = False
+    
+    def __new__(cls):
+        """單例模式"""
+        if cls._instance is None:
+            cls._instance = super(IngestionPipeline, cls).__new__(cls)
+        return cls._instance
+    
+    def __init__(self):
+        """初始化各階段執行緒池"""
+        if not self._initialized:
+            self._parse_executor = ThreadPoolExecutor(
+                max_workers=config.INGEST_PARSE_WORKERS,
+                thread_name_prefix='ingest-parse'
+            )
+            self._embed_executor = ThreadPoolExecutor(
+                max_workers=config.INGEST_EMBED_WORKERS,
+                thread_name_prefix='ingest-embed'
+            )
+            self._lock = threading.Lock()
+            self._active = set()
+            self._initialized = True
+            logger.info(
+                f"匯入管線初始化成功，解析執行緒: {config.INGEST_PARSE_WORKERS}，"
+                f"嵌入執行緒: {config.INGEST_EMBED_WORKERS}"
+            )
+    
+    @property
+    def in_flight(self) -> int:
+        """正在管線中的文件數量"""
+        return len(self._active)
+    
+    def is_active(self, document_id: str) -> bool:
+        """文件是否已在本進程的管線中"""
+        return document_id in self._active
+    
+    def submit(
+        self,
+        document_id: str,
+        tenant_id: str,
+        batch_id: Optional[str] = None,
+        on_done: Optional[Callable[[bool], None]] = None
+    ) -> bool:
+        """提交文件進入管線，完成後呼叫 on_done(success)；重複提交時返回 False"""
+        with self._lock:
+            if document_id in self._active:
+                logger.warning(f"文件已在管線中，略過重複提交: {document_id}")
+                return False
+            self._active.add(document_id)
+        
+        job = {'document_id': document_id, 'tenant_id': tenant_id, 'batch_id': batch_id, 'on_done': on_done}
+        self._parse_executor.submit(self._run_prepare, job)
+        return True
+    
+    def _run_prepare(self, job: dict) -> None:
+        """階段一：解析與分塊，完成後交給嵌入階段"""
+        try:
+            context = DocumentService.prepare_document(job['document_id'], job['tenant_id'])
+        except Exception as e:
+            logger.error(f"管線解析階段失敗 {job['document_id']}: {e}")
+            context = None
+        
+        if context is None:
+            self._finish(job, False)
+            return
+        
+        self._embed_executor.submit(self._run_index, job, context)
+    
+    def _run_index(self, job: dict, context: dict) -> None:
+        """階段二：嵌入與存儲"""
+        try:
+            success = DocumentService.index_document(context)
+        except Exception as e:
+            logger.error(f"管線嵌入階段失敗 {job['document_id']}: {e}")
+            success = False
+        
+        self._finish(job, success)
+    
+    def _finish(self, job: dict, success: bool) -> None:
+        """記錄文件處理結果"""
+        with self._lock:
+            self._active.discard(job['document_id'])
+        
+        if job['batch_id']:
+            DocumentService.record_batch_result(job['batch_id'], success)
+        
+        if job['on_done']:
+            try:
+                job['on_done'](success)
+            except Exception as e:
+                logger.error(f"管線完成回呼失敗 {job['document_id']}: {e}")
+
+
+# 創建全局匯入管線實例
+ingestion_pipeline = IngestionPipeline()
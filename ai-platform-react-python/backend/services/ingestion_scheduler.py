@@ -0,0 +1,228 @@
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional
+from datetime import datetime
+from models.document import DocumentStatus
+from services.ingestion_pipeline import ingestion_pipeline
+from utils.db_manager import get_tenants_collection, get_documents_collection
+from utils.metrics import metrics, percentile
+from utils.logger import logger
+from config import get_config
+
+config = get_config()
+
+# 租戶方案快取秒數
+PLAN_CACHE_TTL = 300
+
+
+class IngestionScheduler:
+    """多租戶公平排程：每租戶獨立佇列，依方案權重做 Deficit Round Robin，並限制每租戶並行數"""
+    
+    _instance = None
+    _initialized = False
+    
+    def __new__(cls):
+        """單例模式"""
+        if cls._instance is None:
+            cls._instance = super(IngestionScheduler, cls).__new__(cls)
+        return cls._instance
+    
+    def __init__(self):
+        """初始化佇列與派送執行緒"""
+        if not self._initialized:
+            self._cond = threading.Condition()
+            self._queues: Dict[str, deque] = {}
+            self._ring = deque()  # 有待處理工作的租戶輪詢順序
+            self._deficit: Dict[str, float] = {}
+            self._running: Dict[str, int] = {}
+            self._total_running = 0
+            self._pending_ids = set()
+            self._waits: Dict[str, deque] = {}
+            self._dispatched: Dict[str, int] = {}
+            self._plans: Dict[str, tuple] = {}  # {tenant_id: (plan, 讀取時間)}
+            
+            self._max_in_flight = config.INGEST_MAX_IN_FLIGHT
+            self._tenant_max_concurrent = config.INGEST_TENANT_MAX_CONCURRENT
+            
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='ingest-scheduler', daemon=True)
+            self._dispatcher.start()
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='ingest-heartbeat', daemon=True)
+            self._heartbeat.start()
+            self._initialized = True
+            logger.info(
+                f"匯入排程器初始化成功，全域並行上限: {self._max_in_flight}，"
+                f"每租戶並行上限: {self._tenant_max_concurrent}"
+            )
+    
+    def enqueue(self, tenant_id: str, document_id: str, batch_id: Optional[str] = None) -> bool:
+        """將文件排入租戶佇列；已在佇列或處理中時返回 False"""
+        # 在鎖外讀取方案，派送時只讀快取
+        self._refresh_plan(tenant_id)
+        
+        with self._cond:
+            if document_id in self._pending_ids:
+                return False
+            
+            self._pending_ids.add(document_id)
+            queue = self._queues.setdefault(tenant_id, deque())
+            queue.append({
+                'document_id': document_id,
+                'tenant_id': tenant_id,
+                'batch_id': batch_id,
+                'enqueued_at': time.monotonic()
+            })
+            
+            if tenant_id not in self._ring:
+                self._ring.append(tenant_id)
+                self._deficit[tenant_id] = 0.0
+            
+            metrics.gauge('ingestion_queue_depth', '各租戶匯入佇列長度').set(len(queue), tenant_id=tenant_id)
+            self._cond.notify()
+        return True
+    
+    def _refresh_plan(self, tenant_id: str) -> None:
+        """快取過期時重新讀取租戶方案；會查詢資料庫，不可在持有 _cond 時呼叫"""
+        cached = self._plans.get(tenant_id)
+        if cached and time.monotonic() - cached[1] < PLAN_CACHE_TTL:
+            return
+        
+        plan = cached[0] if cached else ''
+        try:
+            tenant = get_tenants_collection().find_one({'_id': tenant_id}, {'plan': 1})
+            plan = (tenant or {}).get('plan', '')
+        except Exception as e:
+            logger.warning(f"讀取租戶方案失敗 {tenant_id}: {e}")
+        
+        self._plans[tenant_id] = (plan, time.monotonic())
+    
+    def _weight(self, tenant_id: str) -> int:
+        """依快取的租戶方案取得排程權重（每輪可派送的文件數），不查詢資料庫"""
+        plan = self._plans.get(tenant_id, ('', 0.0))[0]
+        return max(1, int(config.INGEST_PLAN_WEIGHTS.get(plan, 1)))
+    
+    def _pick(self) -> Optional[dict]:
+        """Deficit Round Robin：輪詢租戶，額度不足時補上權重，達並行上限的租戶略過"""
+        for _ in range(len(self._ring)):
+            tenant_id = self._ring[0]
+            
+            if self._running.get(tenant_id, 0) >= self._tenant_max_concurrent:
+                self._ring.rotate(-1)
+                continue
+            
+            if self._deficit[tenant_id] < 1:
+                self._deficit[tenant_id] += self._weight(tenant_id)
+            
+            queue = self._queues[tenant_id]
+            job = queue.popleft()
+            self._deficit[tenant_id] -= 1
+            
+            if not queue:
+                # 佇列清空時移出輪詢並重置額度
+                self._ring.popleft()
+                self._deficit[tenant_id] = 0.0
+            elif self._deficit[tenant_id] < 1:
+                self._ring.rotate(-1)
+            
+            return job
+        return None
+    
+    def _dispatch_loop(self) -> None:
+        """派送執行緒：有空閒額度時依公平順序把工作交給匯入管線"""
+        while True:
+            with self._cond:
+                job = None
+                while job is None:
+                    if self._total_running < self._max_in_flight:
+                        job = self._pick()
+                    if job is None:
+                        self._cond.wait()
+                
+                tenant_id = job['tenant_id']
+                self._running[tenant_id] = self._running.get(tenant_id, 0) + 1
+                self._total_running += 1
+                self._dispatched[tenant_id] = self._dispatched.get(tenant_id, 0) + 1
+                
+                wait_seconds = time.monotonic() - job['enqueued_at']
+                self._waits.setdefault(tenant_id, deque(maxlen=200)).append(wait_seconds)
+                metrics.gauge('ingestion_queue_depth', '各租戶匯入佇列長度').set(
+                    len(self._queues[tenant_id]), tenant_id=tenant_id
+                )
+            
+            metrics.histogram('ingestion_queue_wait_seconds', '文件在匯入佇列中的等待時間（秒）').observe(wait_seconds)
+            
+            submitted = ingestion_pipeline.submit(
+                job['document_id'],
+                tenant_id,
+                batch_id=job['batch_id'],
+                on_done=lambda success, job=job: self._release(job)
+            )
+            if not submitted:
+                self._release(job)
+    
+    def _heartbeat_loop(self) -> None:
+        """定期更新佇列中與處理中文件的 updated_at，讓其他進程的卡住偵測不會誤判
+        
+        同時在鎖外刷新排隊中租戶的方案快取。
+        """
+        while True:
+            time.sleep(config.INGEST_HEARTBEAT_SECONDS)
+            with self._cond:
+                document_ids = list(self._pending_ids)
+                tenant_ids = list(self._ring)
+            
+            for tenant_id in tenant_ids:
+                self._refresh_plan(tenant_id)
+            
+            if not document_ids:
+                continue
+            
+            try:
+                get_documents_collection().update_many(
+                    {
+                        '_id': {'$in': document_ids},
+                        'status': DocumentStatus.PROCESSING
+                    },
+                    {'$set': {'updated_at': datetime.utcnow()}}
+                )
+            except Exception as e:
+                logger.warning(f"更新匯入心跳失敗: {e}")
+    
+    def _release(self, job: dict) -> None:
+        """工作完成後釋放租戶與全域並行額度"""
+        with self._cond:
+            tenant_id = job['tenant_id']
+            self._running[tenant_id] = max(0, self._running.get(tenant_id, 0) - 1)
+            self._total_running = max(0, self._total_running - 1)
+            self._pending_ids.discard(job['document_id'])
+            self._cond.notify()
+    
+    def get_stats(self) -> dict:
+        """獲取各租戶的佇列長度、執行中數量與等待時間"""
+        now = time.monotonic()
+        with self._cond:
+            tenant_ids = set(self._queues) | set(self._running)
+            tenants = {}
+            for tenant_id in tenant_ids:
+                queue = self._queues.get(tenant_id, deque())
+                waits = list(self._waits.get(tenant_id, []))
+                tenants[tenant_id] = {
+                    'queue_depth': len(queue),
+                    'running': self._running.get(tenant_id, 0),
+                    'dispatched': self._dispatched.get(tenant_id, 0),
+                    'weight': self._weight(tenant_id),
+                    'oldest_wait_seconds': round(now - queue[0]['enqueued_at'], 3) if queue else 0.0,
+                    'wait_p50_seconds': round(percentile(waits, 50), 3),
+                    'wait_p95_seconds': round(percentile(waits, 95), 3)
+                }
+            
+            return {
+                'max_in_flight': self._max_in_flight,
+                'tenant_max_concurrent': self._tenant_max_concurrent,
+                'running': self._total_running,
+                'tenants': tenants
+            }
+
+
+# 創建全局匯入排程器實例
+ingestion_scheduler = IngestionScheduler()
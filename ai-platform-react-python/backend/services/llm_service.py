@@ -1,10 +1,17 @@
+import json
+import hashlib
 import google.generativeai as genai
-from typing import List, Dict, Optional, Generator
+from typing import List, Dict, Optional, Generator, AsyncGenerator
 from config import get_config
+from services.gemini_client import GeminiClient
+from utils.singleflight import SingleFlight
 from utils.logger import logger
 
 config = get_config()
 
+# 合併提示詞相同的並行生成
+generation_flight = SingleFlight('generation')
+
 
 class LLMService:
     """Gemini LLM 服務（支援 Grounding）"""
@@ -12,19 +19,41 @@ class LLMService:
     def __init__(self):
         """初始化 Gemini API"""
         try:
+            if config.LLM_BACKEND == 'fake':
+                self._client = GeminiClient()
+                self._initialized = True
+                logger.warning(f"LLM_BACKEND=fake，使用本機模擬 LLM（{config.FAKE_LLM_URL or '同進程'}）")
+                return
+            
             if not config.GOOGLE_API_KEY:
                 logger.warning("未配置 GOOGLE_API_KEY，將使用模擬回應")
                 self._initialized = False
                 return
             
             genai.configure(api_key=config.GOOGLE_API_KEY)
-            self._model = genai.GenerativeModel(config.GEMINI_MODEL)
+            self._client = GeminiClient()
             self._initialized = True
-            logger.info(f"Gemini LLM 服務初始化成功，模型: {config.GEMINI_MODEL}")
+            logger.info(f"Gemini LLM 服務初始化成功，模型: {', '.join(self._client.model_names)}")
         except Exception as e:
             logger.error(f"Gemini 初始化失敗: {e}")
             self._initialized = False
     
+    @staticmethod
+    def _flight_key(
+        messages: List[Dict[str, str]],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        grounding_sources: Optional[List[Dict]]
+    ) -> str:
+        """以提示詞內容（含歷史與檢索來源）與生成參數計算合併鍵"""
+        payload = json.dumps(
+            [messages, [source.get('text', '') for source in grounding_sources or []], temperature, max_tokens],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
     def generate_response(
         self,
         messages: List[Dict[str, str]],
@@ -33,69 +62,260 @@ class LLMService:
         stream: bool = False,
         grounding_sources: Optional[List[Dict]] = None
     ) -> Dict:
-        """生成回應（支援 Grounding）"""
-        try:
-            if not self._initialized:
-                logger.warning("Gemini 未配置，使用模擬回應")
-                return self._mock_response(messages)
-            
-            # 使用配置的默認值
-            if temperature is None:
-                temperature = config.GEMINI_TEMPERATURE
-            if max_tokens is None:
-                max_tokens = config.GEMINI_MAX_TOKENS
-            
-            # 轉換訊息格式為 Gemini 格式
-            prompt = self._convert_messages_to_prompt(messages)
-            
-            # 如果有 Grounding Sources，添加到 prompt
-            if grounding_sources and config.USE_GROUNDING:
-                context = self._format_grounding_sources(grounding_sources)
-                prompt = f"{context}\n\n{prompt}"
-            
-            # 配置生成參數
-            generation_config = genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
-            )
-            
-            # 生成回應
-            if stream:
-                return self._generate_stream(prompt, generation_config)
-            else:
-                response = self._model.generate_content(
-                    prompt,
-                    generation_config=generation_config
-                )
-                
-                # 提取 token 使用量
-                token_usage = {
-                    'prompt_tokens': getattr(response.usage_metadata, 'prompt_token_count', 0) if hasattr(response, 'usage_metadata') else 0,
-                    'completion_tokens': getattr(response.usage_metadata, 'candidates_token_count', 0) if hasattr(response, 'usage_metadata') else 0,
-                    'total_tokens': getattr(response.usage_metadata, 'total_token_count', 0) if hasattr(response, 'usage_metadata') else 0
-                }
-                
-                # 構建 Citations（從 grounding_sources）
-                citations = []
-                if grounding_sources:
-                    for i, source in enumerate(grounding_sources):
-                        citations.append({
-                            'index': i + 1,
-                            'text': source.get('text', '')[:200],
-                            'source': source.get('source', ''),
-                            'score': source.get('score', 0.0)
-                        })
-                
-                return {
-                    'content': response.text,
-                    'token_usage': token_usage,
-                    'model': config.GEMINI_MODEL,
-                    'citations': citations,
-                    'grounded': bool(grounding_sources)
-                }
-        except Exception as e:
-            logger.error(f"Gemini 生成失敗: {e}")
+        """生成回應（支援 Grounding）；提示詞與參數相同的並行請求共用同一次 Gemini 呼叫，結果為唯讀"""
+        if stream or not config.SINGLEFLIGHT_ENABLED:
+            return self._generate_response(messages, temperature, max_tokens, stream, grounding_sources)
+        
+        return generation_flight.do(
+            self._flight_key(messages, temperature, max_tokens, grounding_sources),
+            self._generate_response, messages, temperature, max_tokens, False, grounding_sources
+        )
+    
+    def _generate_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        stream: bool = False,
+        grounding_sources: Optional[List[Dict]] = None
+    ) -> Dict:
+        """生成回應（支援 Grounding）
+        
+        逾時、重試與備援模型由 GeminiClient 處理；全部失敗時拋出 LLMUnavailableError，不以模擬回應代替。
+        """
+        if not self._initialized:
+            logger.warning("Gemini 未配置，使用模擬回應")
+            return self._mock_response(messages)
+        
+        prompt = self._prepare_prompt(messages, grounding_sources)
+        generation_config = self._build_generation_config(temperature, max_tokens)
+        
+        # 生成回應
+        if stream:
+            return self._generate_stream(prompt, generation_config)
+        
+        response, model = self._client.generate(prompt, generation_config)
+        
+        # 提取 token 使用量
+        token_usage = self._extract_token_usage(response)
+        
+        # 構建 Citations（從 grounding_sources）
+        citations = []
+        if grounding_sources:
+            for i, source in enumerate(grounding_sources):
+                citations.append({
+                    'index': i + 1,
+                    'text': source.get('text', '')[:200],
+                    'source': source.get('source', ''),
+                    'score': source.get('score', 0.0)
+                })
+        
+        return {
+            'content': response.text,
+            'token_usage': token_usage,
+            'model': model,
+            'citations': citations,
+            'grounded': bool(grounding_sources)
+        }
+    
+    def _prepare_prompt(self, messages: List[Dict[str, str]], grounding_sources: Optional[List[Dict]] = None) -> str:
+        """轉換訊息並附加 Grounding Sources，產生送給 Gemini 的提示詞"""
+        # 轉換訊息格式為 Gemini 格式
+        prompt = self._convert_messages_to_prompt(messages)
+        
+        # 如果有 Grounding Sources，添加到 prompt
+        if grounding_sources and config.USE_GROUNDING:
+            context = self._format_grounding_sources(grounding_sources)
+            prompt = f"{context}\n\n{prompt}"
+        
+        return prompt
+    
+    def _build_generation_config(self, temperature: float = None, max_tokens: int = None):
+        """配置生成參數（未指定時使用配置的默認值）"""
+        if temperature is None:
+            temperature = config.GEMINI_TEMPERATURE
+        if max_tokens is None:
+            max_tokens = config.GEMINI_MAX_TOKENS
+        
+        return genai.types.GenerationConfig(
+            temperature=temperature,
+            max_output_tokens=max_tokens
+        )
+    
+    @staticmethod
+    def _extract_token_usage(response) -> Dict:
+        """從 Gemini 回應提取 token 使用量"""
+        usage = getattr(response, 'usage_metadata', None)
+        return {
+            'prompt_tokens': getattr(usage, 'prompt_token_count', 0) if usage else 0,
+            'completion_tokens': getattr(usage, 'candidates_token_count', 0) if usage else 0,
+            'total_tokens': getattr(usage, 'total_token_count', 0) if usage else 0
+        }
+    
+    def stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        grounding_sources: Optional[List[Dict]] = None
+    ) -> Generator[Dict, None, None]:
+        """串流生成回應，逐步產生 {'type': 'delta', 'text'} 事件，最後產生 {'type': 'done', 'token_usage'}
+        
+        提示詞與參數相同的並行請求訂閱同一個 Gemini 串流，後加入者從頭重播。
+        呼叫端停止迭代或關閉生成器即退訂；所有訂閱者都離開時停止從 Gemini 讀取串流。
+        """
+        if not config.SINGLEFLIGHT_ENABLED:
+            return self._stream_response(messages, temperature, max_tokens, grounding_sources)
+        
+        return generation_flight.stream(
+            self._flight_key(messages, temperature, max_tokens, grounding_sources),
+            lambda: self._stream_response(messages, temperature, max_tokens, grounding_sources)
+        )
+    
+    def _stream_response(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        grounding_sources: Optional[List[Dict]] = None
+    ) -> Generator[Dict, None, None]:
+        """串流生成回應（單一 Gemini 串流）"""
+        if not self._initialized:
+            logger.warning("Gemini 未配置，使用模擬回應")
+            mock = self._mock_response(messages)
+            for i in range(0, len(mock['content']), 8):
+                yield {'type': 'delta', 'text': mock['content'][i:i + 8]}
+            yield {'type': 'done', 'token_usage': mock['token_usage'], 'model': mock['model']}
+            return
+        
+        prompt = self._prepare_prompt(messages, grounding_sources)
+        generation_config = self._build_generation_config(temperature, max_tokens)
+        
+        # 第一個片段前的逾時、重試與備援由 GeminiClient 處理，之後的錯誤直接拋出
+        chunks, model = self._client.open_stream(prompt, generation_config)
+        
+        # 客戶端中斷時生成器會在 yield 處被關閉，不再讀取剩餘串流，回應物件被回收時串流即取消
+        last_chunk = None
+        for chunk in chunks:
+            last_chunk = chunk
+            text = chunk.text if chunk.parts else ''
+            if text:
+                yield {'type': 'delta', 'text': text}
+        
+        # token 使用量附在最後一個串流片段上
+        yield {
+            'type': 'done',
+            'token_usage': self._extract_token_usage(last_chunk),
+            'model': model
+        }
+    
+    async def generate_response_async(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        grounding_sources: Optional[List[Dict]] = None
+    ) -> Dict:
+        """非同步生成回應（ASGI 服務用，等待 Gemini 時不佔用執行緒）；與 generate_response 相同地合併並行的相同提示詞"""
+        if not config.SINGLEFLIGHT_ENABLED:
+            return await self._generate_response_async(messages, temperature, max_tokens, grounding_sources)
+        
+        return await generation_flight.do_async(
+            self._flight_key(messages, temperature, max_tokens, grounding_sources),
+            self._generate_response_async, messages, temperature, max_tokens, grounding_sources
+        )
+    
+    async def _generate_response_async(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        grounding_sources: Optional[List[Dict]] = None
+    ) -> Dict:
+        """非同步生成回應（單一 Gemini 呼叫）"""
+        if not self._initialized:
+            logger.warning("Gemini 未配置，使用模擬回應")
             return self._mock_response(messages)
+        
+        response, model = await self._client.generate_async(
+            self._prepare_prompt(messages, grounding_sources),
+            self._build_generation_config(temperature, max_tokens)
+        )
+        
+        citations = [{
+            'index': i + 1,
+            'text': source.get('text', '')[:200],
+            'source': source.get('source', ''),
+            'score': source.get('score', 0.0)
+        } for i, source in enumerate(grounding_sources or [])]
+        
+        return {
+            'content': response.text,
+            'token_usage': self._extract_token_usage(response),
+            'model': model,
+            'citations': citations,
+            'grounded': bool(grounding_sources)
+        }
+    
+    async def stream_response_async(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        grounding_sources: Optional[List[Dict]] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """stream_response 的非同步版本，事件格式與串流合併方式相同"""
+        if not config.SINGLEFLIGHT_ENABLED:
+            source = self._stream_response_async(messages, temperature, max_tokens, grounding_sources)
+        else:
+            source = generation_flight.stream_async(
+                self._flight_key(messages, temperature, max_tokens, grounding_sources),
+                lambda: self._stream_response_async(messages, temperature, max_tokens, grounding_sources)
+            )
+        
+        try:
+            async for event in source:
+                yield event
+        finally:
+            await source.aclose()
+    
+    async def _stream_response_async(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float = None,
+        max_tokens: int = None,
+        grounding_sources: Optional[List[Dict]] = None
+    ) -> AsyncGenerator[Dict, None]:
+        """非同步串流生成回應（單一 Gemini 串流）"""
+        if not self._initialized:
+            logger.warning("Gemini 未配置，使用模擬回應")
+            mock = self._mock_response(messages)
+            for i in range(0, len(mock['content']), 8):
+                yield {'type': 'delta', 'text': mock['content'][i:i + 8]}
+            yield {'type': 'done', 'token_usage': mock['token_usage'], 'model': mock['model']}
+            return
+        
+        (first_chunk, chunks), model = await self._client.open_stream_async(
+            self._prepare_prompt(messages, grounding_sources),
+            self._build_generation_config(temperature, max_tokens)
+        )
+        
+        last_chunk = first_chunk
+        text = first_chunk.text if first_chunk.parts else ''
+        if text:
+            yield {'type': 'delta', 'text': text}
+        
+        async for chunk in chunks:
+            last_chunk = chunk
+            text = chunk.text if chunk.parts else ''
+            if text:
+                yield {'type': 'delta', 'text': text}
+        
+        yield {
+            'type': 'done',
+            'token_usage': self._extract_token_usage(last_chunk),
+            'model': model
+        }
     
     def _format_grounding_sources(self, sources: List[Dict]) -> str:
         """格式化 Grounding Sources 為 Context"""
@@ -109,11 +329,7 @@ class LLMService:
     def _generate_stream(self, prompt: str, generation_config) -> Generator:
         """串流生成回應"""
         try:
-            response = self._model.generate_content(
-                prompt,
-                generation_config=generation_config,
-                stream=True
-            )
+            response, _ = self._client.open_stream(prompt, generation_config)
             
             for chunk in response:
                 if chunk.text:
@@ -161,9 +377,10 @@ class LLMService:
         self,
         query: str,
         context_docs: List[Dict],
-        system_prompt: Optional[str] = None
+        system_prompt: Optional[str] = None,
+        history: Optional[List[Dict[str, str]]] = None
     ) -> List[Dict[str, str]]:
-        """構建 RAG 提示詞"""
+        """構建 RAG 提示詞（history 為 HistoryService 組裝的歷史消息）"""
         if system_prompt is None:
             system_prompt = """你是一個專業的AI助手，基於提供的知識庫內容回答用戶問題。
 請遵循以下規則：
@@ -173,10 +390,10 @@ class LLMService:
 4. 使用繁體中文回答
 5. 在回答中標註引用來源（使用 [來源 N] 的格式）"""
         
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": query}
-        ]
+        messages = [{"role": "system", "content": system_prompt}]
+        if history:
+            messages.extend(history)
+        messages.append({"role": "user", "content": query})
         
         return messages
 
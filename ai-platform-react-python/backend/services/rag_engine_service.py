@@ -1,18 +1,46 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from vertexai.preview import rag
 from google.cloud import aiplatform
+from google.cloud.aiplatform_v1beta1 import (
+    VertexRagDataServiceClient, ImportRagFilesRequest, ImportRagFilesConfig, GcsSource, RagFileChunkingConfig
+)
+from google.api_core import exceptions as google_exceptions
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from typing import Optional, List, Dict
 from config import get_config
+from models.document import RagImportStatus
+from utils.db_manager import get_rag_corpora_collection, get_tenants_collection, get_documents_collection
+from utils.answer_cache import answer_cache
+from utils.circuit_breaker import get_breaker
+from utils.metrics import metrics
 from utils.logger import logger
 
 config = get_config()
 
+# 匯入操作查詢失敗的累計次數上限，超過後將文件標記為失敗
+MAX_POLL_ERRORS = 10
+
 
 class RAGEngineService:
-    """Vertex AI RAG Engine 服務"""
+    """Vertex AI RAG Engine 服務
+
+    租戶與 Corpus 的對應保存在 rag_corpora 集合，啟動時載入記憶體；
+    rag.list_corpora 只用於對帳（reconcile），不在請求路徑上掃描。
+    """
     
     _instance = None
     _initialized = False
     _corpuses = {}  # {tenant_id: corpus_name}
+    _create_lock = threading.Lock()  # 避免同進程為同一租戶重複建立 Corpus
+    _stop = threading.Event()
+    _data_client = None  # RAG 資料服務 GAPIC 客戶端（提交匯入與查詢長時間操作）
+    _import_thread = None
+    _import_lock = threading.Lock()
     
     def __new__(cls):
         """單例模式"""
@@ -39,48 +67,226 @@ class RAGEngineService:
                 logger.error(f"RAG Engine 初始化失敗: {e}")
                 self._initialized = False
     
+    @staticmethod
+    def _display_name(tenant_id: str) -> str:
+        """租戶 Corpus 的顯示名稱"""
+        return f"{config.RAG_CORPUS_PREFIX}_{tenant_id}_corpus"
+    
+    @staticmethod
+    def _tenant_from_display_name(display_name: str) -> Optional[str]:
+        """從顯示名稱解析租戶 ID，不是本平台建立的 Corpus 時返回 None"""
+        prefix, suffix = f"{config.RAG_CORPUS_PREFIX}_", '_corpus'
+        if display_name and display_name.startswith(prefix) and display_name.endswith(suffix):
+            return display_name[len(prefix):-len(suffix)] or None
+        return None
+    
+    def load_registry(self) -> int:
+        """從 rag_corpora 集合載入所有租戶的 Corpus 對應，返回筆數"""
+        corpuses = {
+            doc['tenant_id']: doc['corpus_name']
+            for doc in get_rag_corpora_collection().find({}, {'_id': 0, 'tenant_id': 1, 'corpus_name': 1})
+        }
+        self._corpuses = corpuses
+        metrics.gauge('rag_corpus_registry_size', '已登記的租戶 Corpus 數').set(len(corpuses))
+        logger.info(f"已載入 {len(corpuses)} 個租戶的 RAG Corpus 對應")
+        return len(corpuses)
+    
+    def _register(self, tenant_id: str, corpus_name: str) -> str:
+        """登記租戶的 Corpus；已有登記時保留既有值（多個進程同時建立時以先寫入者為準），返回生效的名稱"""
+        now = datetime.utcnow()
+        collection = get_rag_corpora_collection()
+        try:
+            doc = collection.find_one_and_update(
+                {'tenant_id': tenant_id},
+                {
+                    '$setOnInsert': {
+                        'tenant_id': tenant_id,
+                        'corpus_name': corpus_name,
+                        'display_name': self._display_name(tenant_id),
+                        'created_at': now
+                    },
+                    '$set': {'updated_at': now}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            doc = collection.find_one({'tenant_id': tenant_id})
+        
+        self._corpuses[tenant_id] = doc['corpus_name']
+        return doc['corpus_name']
+    
+    def _unregister(self, tenant_id: str) -> None:
+        """移除租戶的 Corpus 登記"""
+        self._corpuses.pop(tenant_id, None)
+        get_rag_corpora_collection().delete_one({'tenant_id': tenant_id})
+    
+    def _lookup_corpus(self, tenant_id: str) -> Optional[str]:
+        """先查記憶體，再查 rag_corpora（其他進程建立的 Corpus）"""
+        corpus_name = self._corpuses.get(tenant_id)
+        if corpus_name:
+            return corpus_name
+        
+        doc = get_rag_corpora_collection().find_one({'tenant_id': tenant_id}, {'corpus_name': 1})
+        if doc:
+            self._corpuses[tenant_id] = doc['corpus_name']
+            return doc['corpus_name']
+        return None
+    
     def create_or_get_corpus(self, tenant_id: str) -> Optional[str]:
         """為租戶創建或獲取 RAG Corpus"""
         if not self._initialized:
             logger.warning("RAG Engine 未初始化")
             return None
         
-        # 檢查快取
-        if tenant_id in self._corpuses:
-            return self._corpuses[tenant_id]
-        
         try:
-            corpus_display_name = f"{config.RAG_CORPUS_PREFIX}_{tenant_id}_corpus"
-            
-            # 嘗試列出現有 corpus
-            corpuses = rag.list_corpora()
-            for corpus in corpuses:
-                if corpus.display_name == corpus_display_name:
-                    self._corpuses[tenant_id] = corpus.name
-                    logger.info(f"找到現有 Corpus: {corpus.name}")
-                    return corpus.name
-            
-            # 創建新 corpus
-            corpus = rag.create_corpus(
-                display_name=corpus_display_name,
-                description=f"Knowledge base for tenant {tenant_id}"
-            )
+            corpus_name = self._lookup_corpus(tenant_id)
+            if corpus_name:
+                return corpus_name
+            
+            with self._create_lock:
+                corpus_name = self._lookup_corpus(tenant_id)
+                if corpus_name:
+                    return corpus_name
+                
+                # 創建新 corpus
+                corpus = rag.create_corpus(
+                    display_name=self._display_name(tenant_id),
+                    description=f"Knowledge base for tenant {tenant_id}"
+                )
+                corpus_name = self._register(tenant_id, corpus.name)
+            
+            if corpus_name != corpus.name:
+                # 其他進程已先登記，刪除多建立的 Corpus
+                logger.warning(f"租戶 {tenant_id} 已有 Corpus {corpus_name}，刪除重複建立的 {corpus.name}")
+                try:
+                    rag.delete_corpus(name=corpus.name)
+                except Exception as e:
+                    logger.error(f"刪除重複 Corpus 失敗: {e}")
+                return corpus_name
             
-            self._corpuses[tenant_id] = corpus.name
             logger.info(f"成功創建 Corpus: {corpus.name}")
             return corpus.name
         except Exception as e:
             logger.error(f"創建/獲取 Corpus 失敗: {e}")
             return None
     
+    def reconcile(self) -> Dict:
+        """以 rag.list_corpora 對帳：登記遺漏的 Corpus、移除已不存在的登記，並重新載入記憶體
+        
+        同一租戶在 RAG Engine 有多個 Corpus 時保留已登記者，只記錄警告。
+        """
+        if not self._initialized:
+            logger.warning("RAG Engine 未初始化")
+            return {}
+        
+        # 先讀登記再列出 Corpus：對帳期間新建立並登記的 Corpus 不會被誤判為已不存在
+        registered = {
+            doc['tenant_id']: doc['corpus_name']
+            for doc in get_rag_corpora_collection().find({}, {'_id': 0, 'tenant_id': 1, 'corpus_name': 1})
+        }
+        
+        listed = {}  # {tenant_id: [corpus_name]}
+        for corpus in rag.list_corpora():
+            tenant_id = self._tenant_from_display_name(corpus.display_name)
+            if tenant_id:
+                listed.setdefault(tenant_id, []).append(corpus.name)
+        
+        stats = {'listed': len(listed), 'registered': len(registered), 'added': 0, 'removed': 0, 'conflicts': 0}
+        for tenant_id, names in listed.items():
+            if tenant_id not in registered:
+                self._register(tenant_id, names[0])
+                stats['added'] += 1
+            elif registered[tenant_id] not in names:
+                logger.warning(f"租戶 {tenant_id} 登記的 Corpus 不存在，改為 {names[0]}")
+                get_rag_corpora_collection().update_one(
+                    {'tenant_id': tenant_id},
+                    {'$set': {'corpus_name': names[0], 'updated_at': datetime.utcnow()}}
+                )
+                stats['added'] += 1
+            if len(names) > 1:
+                logger.warning(f"租戶 {tenant_id} 有 {len(names)} 個 Corpus: {names}")
+                stats['conflicts'] += 1
+        
+        for tenant_id in registered:
+            if tenant_id not in listed:
+                logger.warning(f"租戶 {tenant_id} 登記的 Corpus {registered[tenant_id]} 已不存在，移除登記")
+                self._unregister(tenant_id)
+                stats['removed'] += 1
+        
+        self.load_registry()
+        logger.info(f"RAG Corpus 對帳完成: {stats}")
+        return stats
+    
+    def warm_up(self) -> int:
+        """載入 Corpus 登記，並預先查詢活躍租戶的 Corpus（建立連線與憑證，同時清除已被刪除的登記）
+        
+        登記為空時（例如升級後首次啟動）先執行一次對帳，避免為既有租戶重複建立 Corpus。返回預熱的租戶數。
+        """
+        if not self._initialized:
+            return 0
+        
+        if self.load_registry() == 0:
+            self.reconcile()
+        
+        tenants = get_tenants_collection().find(
+            {'status': 'active'}, {'_id': 1}
+        ).sort('updated_at', -1).limit(config.RAG_CORPUS_WARMUP_TENANTS)
+        
+        warmed = 0
+        for tenant in tenants:
+            tenant_id = str(tenant['_id'])
+            corpus_name = self._corpuses.get(tenant_id)
+            if not corpus_name:
+                continue
+            try:
+                rag.get_corpus(name=corpus_name)
+                warmed += 1
+            except google_exceptions.NotFound:
+                logger.warning(f"租戶 {tenant_id} 的 Corpus {corpus_name} 已不存在，移除登記")
+                self._unregister(tenant_id)
+            except Exception as e:
+                logger.warning(f"預熱租戶 {tenant_id} 的 Corpus 失敗: {e}")
+        
+        logger.info(f"RAG Corpus 預熱完成: {warmed} 個活躍租戶")
+        return warmed
+    
+    def start_background_jobs(self) -> None:
+        """背景執行預熱，之後每 RAG_CORPUS_RECONCILE_INTERVAL_SECONDS 對帳一次（0 為不定期對帳）"""
+        if not self._initialized:
+            return
+        
+        def run():
+            try:
+                self.warm_up()
+            except Exception as e:
+                logger.error(f"RAG Corpus 預熱失敗: {e}")
+            
+            interval = config.RAG_CORPUS_RECONCILE_INTERVAL_SECONDS
+            while interval > 0 and not self._stop.wait(interval):
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    logger.error(f"RAG Corpus 對帳失敗: {e}")
+        
+        threading.Thread(target=run, name='rag-corpus-registry', daemon=True).start()
+    
+    def _get_data_client(self) -> VertexRagDataServiceClient:
+        """獲取（必要時建立）RAG 資料服務客戶端"""
+        if self._data_client is None:
+            RAGEngineService._data_client = VertexRagDataServiceClient(
+                client_options={'api_endpoint': f"{config.GOOGLE_LOCATION}-aiplatform.googleapis.com"}
+            )
+        return self._data_client
+    
     def import_files(
         self,
         tenant_id: str,
         gcs_uris: List[str],
         chunk_size: int = 512,
         chunk_overlap: int = 100
-    ) -> Optional[List[str]]:
-        """匯入文件到 RAG Corpus"""
+    ) -> Optional[str]:
+        """提交匯入文件到 RAG Corpus 的長時間操作，不等待匯入與切塊完成，返回操作名稱"""
         if not self._initialized:
             logger.warning("RAG Engine 未初始化")
             return None
@@ -90,22 +296,239 @@ class RAGEngineService:
             if not corpus_name:
                 return None
             
-            # 匯入文件
-            response = rag.import_files(
-                corpus_name=corpus_name,
-                paths=gcs_uris,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
+            operation = self._get_data_client().import_rag_files(request=ImportRagFilesRequest(
+                parent=corpus_name,
+                import_rag_files_config=ImportRagFilesConfig(
+                    gcs_source=GcsSource(uris=gcs_uris),
+                    rag_file_chunking_config=RagFileChunkingConfig(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+                )
+            ))
             
-            # 提取 RagFile 名稱
-            rag_file_names = [f.name for f in response.imported_rag_files]
+            operation_name = operation.operation.name
+            logger.info(f"已提交 {len(gcs_uris)} 個文件的匯入操作: {operation_name}")
+            return operation_name
+        except Exception as e:
+            logger.error(f"提交文件匯入失敗: {e}")
+            return None
+    
+    def enqueue_import(self, tenant_id: str, document_id: str, gcs_uri: str) -> None:
+        """將文件標記為待匯入，由背景工作合併同租戶的文件後一次提交"""
+        get_documents_collection().update_one(
+            {'_id': document_id},
+            {
+                '$set': {
+                    'rag_status': RagImportStatus.PENDING,
+                    'rag_gcs_uri': gcs_uri,
+                    'rag_operation': None,
+                    'rag_error': None,
+                    'updated_at': datetime.utcnow()
+                },
+                '$unset': {'rag_claim': ''}
+            }
+        )
+        self.start_import_worker()
+    
+    def start_import_worker(self) -> None:
+        """啟動匯入背景工作（已啟動時略過）：每 RAG_IMPORT_POLL_SECONDS 提交待匯入文件並檢查進行中的操作"""
+        if not self._initialized or self._import_thread is not None:
+            return
+        
+        with self._import_lock:
+            if self._import_thread is not None:
+                return
+            RAGEngineService._import_thread = threading.Thread(target=self._import_loop, name='rag-import', daemon=True)
+            self._import_thread.start()
+    
+    def _import_loop(self) -> None:
+        """匯入背景工作；等待的間隔同時是合併同租戶文件的時間窗"""
+        while not self._stop.wait(config.RAG_IMPORT_POLL_SECONDS):
+            try:
+                self.submit_pending_imports()
+            except Exception as e:
+                logger.error(f"提交 RAG 匯入失敗: {e}")
             
-            logger.info(f"成功匯入 {len(rag_file_names)} 個文件到 Corpus")
-            return rag_file_names
+            try:
+                self.poll_import_operations()
+            except Exception as e:
+                logger.error(f"檢查 RAG 匯入操作失敗: {e}")
+    
+    def submit_pending_imports(self) -> int:
+        """將待匯入文件依租戶合併提交（每次最多 RAG_IMPORT_MAX_FILES 個），返回提交的操作數
+        
+        文件先以 claim 標記原子認領，多個進程同時執行時不會重複提交。
+        """
+        documents_collection = get_documents_collection()
+        
+        # 提交途中進程中斷而停留在 submitting 的文件退回待匯入
+        documents_collection.update_many(
+            {
+                'rag_status': RagImportStatus.SUBMITTING,
+                'updated_at': {'$lt': datetime.utcnow() - timedelta(seconds=config.INGEST_STALE_AFTER_SECONDS)}
+            },
+            {'$set': {'rag_status': RagImportStatus.PENDING}, '$unset': {'rag_claim': ''}}
+        )
+        
+        submitted = 0
+        for tenant_id in documents_collection.distinct('tenant_id', {'rag_status': RagImportStatus.PENDING}):
+            while True:
+                pending = [doc['_id'] for doc in documents_collection.find(
+                    {'tenant_id': tenant_id, 'rag_status': RagImportStatus.PENDING}, {'_id': 1}
+                ).limit(config.RAG_IMPORT_MAX_FILES)]
+                if not pending:
+                    break
+                
+                claim = str(uuid.uuid4())
+                documents_collection.update_many(
+                    {'_id': {'$in': pending}, 'rag_status': RagImportStatus.PENDING},
+                    {'$set': {'rag_status': RagImportStatus.SUBMITTING, 'rag_claim': claim, 'updated_at': datetime.utcnow()}}
+                )
+                claimed = list(documents_collection.find({'rag_claim': claim}, {'_id': 1, 'rag_gcs_uri': 1}))
+                if not claimed:
+                    continue
+                
+                ids = [doc['_id'] for doc in claimed]
+                operation_name = self.import_files(tenant_id, [doc['rag_gcs_uri'] for doc in claimed])
+                if not operation_name:
+                    # 下一輪重試
+                    documents_collection.update_many(
+                        {'_id': {'$in': ids}},
+                        {'$set': {'rag_status': RagImportStatus.PENDING}, '$unset': {'rag_claim': ''}}
+                    )
+                    break
+                
+                now = datetime.utcnow()
+                documents_collection.update_many(
+                    {'_id': {'$in': ids}},
+                    {
+                        '$set': {
+                            'rag_status': RagImportStatus.IMPORTING,
+                            'rag_operation': operation_name,
+                            'rag_submitted_at': now,
+                            'updated_at': now
+                        },
+                        '$unset': {'rag_claim': ''}
+                    }
+                )
+                metrics.histogram(
+                    'rag_import_batch_files', '每次 RAG 匯入合併的文件數', buckets=(1, 2, 5, 10, 25, 50, 100)
+                ).observe(len(ids))
+                submitted += 1
+        
+        return submitted
+    
+    def _fail_imports(self, operation_name: str, error: str) -> None:
+        """將屬於某個匯入操作的文件標記為失敗"""
+        get_documents_collection().update_many(
+            {'rag_operation': operation_name, 'rag_status': RagImportStatus.IMPORTING},
+            {'$set': {
+                'rag_status': RagImportStatus.FAILED,
+                'rag_error': error,
+                'updated_at': datetime.utcnow()
+            }}
+        )
+    
+    def _check_operation(self, operation_name: str):
+        """查詢單一匯入操作，返回完成的操作，未完成或查詢失敗時返回 None
+        
+        操作不存在或無權限時將文件標記為失敗；暫時性錯誤重試，累計 MAX_POLL_ERRORS 次後標記為失敗。
+        """
+        documents_collection = get_documents_collection()
+        try:
+            operation = self._get_data_client().get_operation(request={'name': operation_name})
+        except (google_exceptions.NotFound, google_exceptions.PermissionDenied, google_exceptions.InvalidArgument) as e:
+            logger.error(f"RAG 匯入操作無法查詢 {operation_name}: {e}")
+            self._fail_imports(operation_name, f"無法查詢匯入操作: {e}")
+            return None
         except Exception as e:
-            logger.error(f"匯入文件失敗: {e}")
+            logger.warning(f"查詢 RAG 匯入操作失敗 {operation_name}: {e}")
+            documents_collection.update_many(
+                {'rag_operation': operation_name, 'rag_status': RagImportStatus.IMPORTING},
+                {'$inc': {'rag_poll_errors': 1}}
+            )
+            documents_collection.update_many(
+                {
+                    'rag_operation': operation_name,
+                    'rag_status': RagImportStatus.IMPORTING,
+                    'rag_poll_errors': {'$gte': MAX_POLL_ERRORS}
+                },
+                {'$set': {
+                    'rag_status': RagImportStatus.FAILED,
+                    'rag_error': f"已 {MAX_POLL_ERRORS} 次查詢匯入操作失敗: {e}",
+                    'updated_at': datetime.utcnow()
+                }}
+            )
             return None
+        
+        return operation if operation.done else None
+    
+    def poll_import_operations(self) -> int:
+        """檢查進行中的匯入操作，完成時依 Corpus 中的 RAG 文件更新各文件狀態，返回完成的操作數
+        
+        先查詢所有操作再列出 Corpus，每個租戶每輪只列出一次。
+        """
+        documents_collection = get_documents_collection()
+        finished = 0
+        
+        completed = []  # [(操作名稱, 文件列表)]
+        for operation_name in documents_collection.distinct('rag_operation', {'rag_status': RagImportStatus.IMPORTING}):
+            operation = self._check_operation(operation_name)
+            if operation is None:
+                continue
+            
+            if operation.HasField('error') and operation.error.code:
+                logger.error(f"RAG 匯入操作失敗 {operation_name}: {operation.error.message}")
+                self._fail_imports(operation_name, operation.error.message)
+                finished += 1
+                continue
+            
+            docs = list(documents_collection.find(
+                {'rag_operation': operation_name, 'rag_status': RagImportStatus.IMPORTING},
+                {'_id': 1, 'tenant_id': 1, 'rag_gcs_uri': 1, 'rag_submitted_at': 1}
+            ))
+            if docs:
+                completed.append((operation_name, docs))
+        
+        # 匯入回應只有成功與失敗數量，依檔名（文件 ID）對應到 RAG 文件
+        listings = {}  # {tenant_id: {display_name: rag_file_name}}
+        for operation_name, docs in completed:
+            tenant_id = docs[0]['tenant_id']
+            if tenant_id not in listings:
+                try:
+                    corpus_name = self.create_or_get_corpus(tenant_id)
+                    listings[tenant_id] = {
+                        rag_file.display_name: rag_file.name for rag_file in rag.list_files(corpus_name=corpus_name)
+                    }
+                except Exception as e:
+                    logger.warning(f"列出租戶 {tenant_id} 的 RAG 文件失敗，下一輪重試: {e}")
+                    listings[tenant_id] = None
+            rag_files = listings[tenant_id]
+            if rag_files is None:
+                continue
+            finished += 1
+            
+            now = datetime.utcnow()
+            for doc in docs:
+                rag_file_name = rag_files.get(os.path.basename(doc['rag_gcs_uri']))
+                if rag_file_name:
+                    update = {'rag_status': RagImportStatus.COMPLETED, 'rag_file_names': [rag_file_name]}
+                else:
+                    update = {'rag_status': RagImportStatus.FAILED, 'rag_error': 'RAG Engine 未匯入此文件'}
+                update['updated_at'] = now
+                documents_collection.update_one({'_id': doc['_id']}, {'$set': update})
+                
+                if doc.get('rag_submitted_at'):
+                    metrics.histogram('rag_import_seconds', 'RAG Engine 匯入耗時（秒）').observe(
+                        (now - doc['rag_submitted_at']).total_seconds(),
+                        outcome=update['rag_status']
+                    )
+            
+            logger.info(f"RAG 匯入操作完成 {operation_name}: {len(docs)} 個文件")
+        
+        for tenant_id, rag_files in listings.items():
+            if rag_files is not None:
+                answer_cache.invalidate(tenant_id)
+        
+        return finished
     
     def retrieval_query(
         self,
@@ -113,7 +536,10 @@ class RAGEngineService:
         query: str,
         similarity_top_k: int = 5
     ) -> List[Dict]:
-        """使用 RAG Engine 進行檢索"""
+        """使用 RAG Engine 進行檢索
+        
+        檢索經由斷路器；失敗或斷路器開啟時拋出例外，由 RetrievalService 立即回退到向量存儲。
+        """
         if not self._initialized:
             logger.warning("RAG Engine 未初始化")
             return []
@@ -124,7 +550,8 @@ class RAGEngineService:
                 return []
             
             # 執行檢索
-            response = rag.retrieval_query(
+            response = get_breaker('rag_engine').call(
+                rag.retrieval_query,
                 corpus_name=corpus_name,
                 text=query,
                 similarity_top_k=similarity_top_k
@@ -144,26 +571,30 @@ class RAGEngineService:
             return results
         except Exception as e:
             logger.error(f"RAG 檢索失敗: {e}")
-            return []
+            raise
     
     def delete_files(self, tenant_id: str, rag_file_names: List[str]) -> bool:
-        """刪除 RAG 文件"""
+        """並行刪除 RAG 文件（最多 RAG_DELETE_CONCURRENCY 個同時進行），全部成功時返回 True"""
         if not self._initialized:
             return False
+        if not rag_file_names:
+            return True
         
-        try:
-            corpus_name = self.create_or_get_corpus(tenant_id)
-            if not corpus_name:
-                return False
-            
-            for file_name in rag_file_names:
+        def delete(file_name: str) -> bool:
+            try:
                 rag.delete_file(name=file_name)
-            
-            logger.info(f"成功刪除 {len(rag_file_names)} 個 RAG 文件")
-            return True
-        except Exception as e:
-            logger.error(f"刪除 RAG 文件失敗: {e}")
-            return False
+                return True
+            except google_exceptions.NotFound:
+                return True
+            except Exception as e:
+                logger.error(f"刪除 RAG 文件失敗 {file_name}: {e}")
+                return False
+        
+        with ThreadPoolExecutor(max_workers=min(config.RAG_DELETE_CONCURRENCY, len(rag_file_names))) as executor:
+            deleted = sum(executor.map(delete, rag_file_names))
+        
+        logger.info(f"租戶 {tenant_id} 已刪除 {deleted}/{len(rag_file_names)} 個 RAG 文件")
+        return deleted == len(rag_file_names)
     
     def delete_corpus(self, tenant_id: str) -> bool:
         """刪除租戶的 Corpus"""
@@ -177,9 +608,8 @@ class RAGEngineService:
             
             rag.delete_corpus(name=corpus_name)
             
-            # 從快取移除
-            if tenant_id in self._corpuses:
-                del self._corpuses[tenant_id]
+            # 移除登記
+            self._unregister(tenant_id)
             
             logger.info(f"成功刪除 Corpus: {corpus_name}")
             return True
@@ -190,3 +620,7 @@ class RAGEngineService:
 
 # 創建全局 RAG Engine 服務實例
 rag_engine_service = RAGEngineService()
+
+
+if __name__ == '__main__':
+    print(rag_engine_service.reconcile())
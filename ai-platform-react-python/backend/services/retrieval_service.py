@@ -1,6 +1,11 @@
-from typing import List, Dict
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Dict, Optional
 from services.embedding_service import embedding_service
 from utils.vector_store import vector_store_manager
+from utils.singleflight import SingleFlight
+from utils.text_processor import TextProcessor
+from utils.metrics import metrics
 from utils.logger import logger
 from config import get_config
 
@@ -14,61 +19,85 @@ except ImportError:
     RAG_ENGINE_AVAILABLE = False
     logger.warning("RAG Engine 服務不可用，將使用向量存儲")
 
+# 合併相同問題的並行檢索
+retrieval_flight = SingleFlight('retrieval')
+
+# 扇出檢索：同時查詢 RAG Engine 與向量存儲，逾時的後端在背景完成後丟棄
+_fanout_executor = ThreadPoolExecutor(max_workers=config.RETRIEVAL_FANOUT_WORKERS, thread_name_prefix='retrieval-fanout')
+
 
 class RetrievalService:
     """檢索服務（支援 RAG Engine 和 Vector Store）"""
     
     @staticmethod
-    def search(tenant_id: str, query: str, top_k: int = None) -> List[Dict]:
-        """搜尋相關文檔片段"""
+    def search(
+        tenant_id: str,
+        query: str,
+        top_k: int = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
+        """搜尋相關文檔片段（可傳入已計算的查詢向量以免重複嵌入）"""
         if top_k is None:
             top_k = config.TOP_K_RETRIEVAL
         
-        # 優先使用 RAG Engine
+        # 扇出模式同時查詢兩個後端；否則優先使用 RAG Engine
+        if config.USE_RAG_ENGINE and RAG_ENGINE_AVAILABLE and config.RETRIEVAL_FANOUT_ENABLED:
+            return RetrievalService._search_fanout(tenant_id, query, top_k, query_embedding)
         if config.USE_RAG_ENGINE and RAG_ENGINE_AVAILABLE:
             return RetrievalService._search_with_rag_engine(tenant_id, query, top_k)
         else:
-            return RetrievalService._search_with_vector_store(tenant_id, query, top_k)
+            return RetrievalService._search_with_vector_store(tenant_id, query, top_k, query_embedding)
+    
+    @staticmethod
+    def _query_rag_engine(tenant_id: str, query: str, top_k: int) -> List[Dict]:
+        """查詢 RAG Engine 並格式化為統一格式"""
+        logger.info(f"使用 RAG Engine 檢索: {query[:50]}...")
+        
+        results = rag_engine_service.retrieval_query(
+            tenant_id=tenant_id,
+            query=query,
+            similarity_top_k=top_k
+        )
+        
+        # 格式化為統一格式
+        documents = []
+        for i, result in enumerate(results):
+            documents.append({
+                'id': f"rag_{i}",
+                'text': result.get('text', ''),
+                'document_id': result.get('source', '').split('/')[-1] if result.get('source') else '',
+                'chunk_index': i,
+                'score': result.get('score', 0.0),
+                'source': result.get('source', ''),
+                'metadata': result.get('metadata', {})
+            })
+        
+        logger.info(f"RAG Engine 檢索到 {len(documents)} 個相關片段")
+        return documents
     
     @staticmethod
     def _search_with_rag_engine(tenant_id: str, query: str, top_k: int) -> List[Dict]:
-        """使用 RAG Engine 檢索"""
+        """使用 RAG Engine 檢索，失敗時回退到向量存儲"""
         try:
-            logger.info(f"使用 RAG Engine 檢索: {query[:50]}...")
-            
-            results = rag_engine_service.retrieval_query(
-                tenant_id=tenant_id,
-                query=query,
-                similarity_top_k=top_k
-            )
-            
-            # 格式化為統一格式
-            documents = []
-            for i, result in enumerate(results):
-                documents.append({
-                    'id': f"rag_{i}",
-                    'text': result.get('text', ''),
-                    'document_id': result.get('source', '').split('/')[-1] if result.get('source') else '',
-                    'chunk_index': i,
-                    'score': result.get('score', 0.0),
-                    'source': result.get('source', ''),
-                    'metadata': result.get('metadata', {})
-                })
-            
-            logger.info(f"RAG Engine 檢索到 {len(documents)} 個相關片段")
-            return documents
+            return RetrievalService._query_rag_engine(tenant_id, query, top_k)
         except Exception as e:
             logger.error(f"RAG Engine 檢索失敗: {e}，回退到向量存儲")
             return RetrievalService._search_with_vector_store(tenant_id, query, top_k)
     
     @staticmethod
-    def _search_with_vector_store(tenant_id: str, query: str, top_k: int) -> List[Dict]:
+    def _search_with_vector_store(
+        tenant_id: str,
+        query: str,
+        top_k: int,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
         """使用向量存儲檢索"""
         try:
             logger.info(f"使用向量存儲檢索: {query[:50]}...")
             
             # 將查詢轉換為向量（使用 retrieval_query 任務類型）
-            query_embedding = embedding_service.embed_query(query)
+            if not query_embedding:
+                query_embedding = embedding_service.embed_query(query)
             
             if not query_embedding:
                 logger.error("查詢嵌入失敗")
@@ -81,48 +110,196 @@ class RetrievalService:
                 top_k=top_k
             )
             
-            # 格式化結果
-            documents = []
-            for hit in results:
-                documents.append({
-                    'id': hit.id,
-                    'text': hit.entity.get('text', ''),
-                    'document_id': hit.entity.get('document_id', ''),
-                    'chunk_index': hit.entity.get('chunk_index', 0),
-                    'score': hit.score,
-                    'source': '',
-                    'metadata': hit.entity.get('metadata', {})
-                })
-            
+            documents = RetrievalService._format_hits(results)
             logger.info(f"向量存儲檢索到 {len(documents)} 個相關片段")
             return documents
         except Exception as e:
             logger.error(f"向量存儲檢索失敗: {e}")
             return []
     
+    @staticmethod
+    def _timed_backend(backend: str, func, *args) -> List[Dict]:
+        """執行單一後端查詢並記錄耗時"""
+        started = time.monotonic()
+        try:
+            return func(*args)
+        finally:
+            metrics.histogram('retrieval_backend_seconds', '扇出檢索各後端耗時（秒）').observe(
+                time.monotonic() - started, backend=backend
+            )
+    
+    @staticmethod
+    def _normalize_scores(documents: List[Dict], backend: str) -> List[Dict]:
+        """將單一後端的分數 min-max 正規化到 0~1，使不同後端的分數可比較；原始分數保留於 raw_score"""
+        if not documents:
+            return []
+        
+        scores = [doc.get('score', 0.0) for doc in documents]
+        low, high = min(scores), max(scores)
+        span = high - low
+        return [{
+            **doc,
+            'raw_score': doc.get('score', 0.0),
+            'score': (doc.get('score', 0.0) - low) / span if span > 0 else 1.0,
+            'backends': [backend]
+        } for doc in documents]
+    
+    @staticmethod
+    def _merge_results(result_sets: List[List[Dict]], top_k: int) -> List[Dict]:
+        """合併多個後端的結果：內容相同的片段只保留一份（取較高分數，優先保留向量存儲的片段資訊）"""
+        merged: Dict[str, Dict] = {}
+        for documents in result_sets:
+            for doc in documents:
+                key = TextProcessor.normalize_query(doc.get('text', ''))
+                if not key:
+                    continue
+                
+                existing = merged.get(key)
+                if existing is None:
+                    merged[key] = doc
+                    continue
+                
+                keep = doc if existing['backends'] == ['rag_engine'] and doc['backends'] == ['vector_store'] else existing
+                merged[key] = {
+                    **keep,
+                    'score': max(existing['score'], doc['score']),
+                    'backends': sorted(set(existing['backends']) | set(doc['backends']))
+                }
+        
+        return sorted(merged.values(), key=lambda doc: doc['score'], reverse=True)[:top_k]
+    
+    @staticmethod
+    def _search_fanout(
+        tenant_id: str,
+        query: str,
+        top_k: int,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
+        """同時查詢 RAG Engine 與向量存儲，在 RETRIEVAL_DEADLINE_MS 內返回已完成的結果"""
+        futures = {
+            _fanout_executor.submit(
+                RetrievalService._timed_backend, 'rag_engine',
+                RetrievalService._query_rag_engine, tenant_id, query, top_k
+            ): 'rag_engine',
+            _fanout_executor.submit(
+                RetrievalService._timed_backend, 'vector_store',
+                RetrievalService._search_with_vector_store, tenant_id, query, top_k, query_embedding
+            ): 'vector_store'
+        }
+        done, _ = wait(futures, timeout=config.RETRIEVAL_DEADLINE_MS / 1000)
+        
+        outcomes = metrics.counter('retrieval_backend_total', '扇出檢索各後端結果（ok/error/timeout）')
+        result_sets = []
+        for future, backend in futures.items():
+            if future not in done:
+                outcomes.inc(backend=backend, outcome='timeout')
+                logger.warning(f"扇出檢索 {backend} 超過 {config.RETRIEVAL_DEADLINE_MS} ms，略過其結果")
+            elif future.exception() is not None:
+                outcomes.inc(backend=backend, outcome='error')
+                logger.error(f"扇出檢索 {backend} 失敗: {future.exception()}")
+            else:
+                outcomes.inc(backend=backend, outcome='ok')
+                result_sets.append(RetrievalService._normalize_scores(future.result(), backend))
+        
+        documents = RetrievalService._merge_results(result_sets, top_k)
+        logger.info(f"扇出檢索合併後 {len(documents)} 個相關片段")
+        return documents
+    
+    @staticmethod
+    def _format_hits(results) -> List[Dict]:
+        """將向量存儲的搜尋結果格式化為統一格式"""
+        return [{
+            'id': hit.id,
+            'text': hit.entity.get('text', ''),
+            'document_id': hit.entity.get('document_id', ''),
+            'chunk_index': hit.entity.get('chunk_index', 0),
+            'score': hit.score,
+            'source': '',
+            'metadata': hit.entity.get('metadata', {}),
+            'embedding': hit.entity.get('embedding')
+        } for hit in results]
+    
+    @staticmethod
+    def _mmr_select(documents: List[Dict], top_n: int, mmr_lambda: float) -> List[int]:
+        """最大邊際相關性（MMR）選擇，返回選中的索引
+        
+        片段間相似度矩陣以 NumPy 一次算出；每輪選擇 λ·相關度 − (1−λ)·與已選片段的最大相似度 最高者。
+        """
+        import numpy as np
+        
+        vectors = np.asarray([doc['embedding'] for doc in documents], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+        similarity = vectors @ vectors.T
+        
+        relevance = np.asarray([doc['score'] for doc in documents], dtype=np.float32)
+        max_similarity = np.full(len(documents), -np.inf, dtype=np.float32)
+        available = np.ones(len(documents), dtype=bool)
+        
+        selected = []
+        for _ in range(min(top_n, len(documents))):
+            redundancy = np.where(np.isinf(max_similarity), 0.0, max_similarity)
+            mmr = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+            mmr[~available] = -np.inf
+            index = int(np.argmax(mmr))
+            selected.append(index)
+            available[index] = False
+            max_similarity = np.maximum(max_similarity, similarity[index])
+        
+        return selected
+    
     @staticmethod
     def rerank(query: str, documents: List[Dict], top_n: int = None) -> List[Dict]:
-        """重排序文檔"""
+        """重排序文檔：候選附帶向量時以 MMR 兼顧相關度與多樣性，否則依分數排序
+        
+        返回的片段不含向量。
+        """
         if top_n is None:
             top_n = config.RERANK_TOP_N
         
+        def strip(docs: List[Dict]) -> List[Dict]:
+            return [{key: value for key, value in doc.items() if key != 'embedding'} for doc in docs]
+        
         try:
-            # 簡單的重排序邏輯：根據分數排序
-            # 在生產環境中，應該使用專門的重排序模型（如 Cross-Encoder）
             sorted_docs = sorted(documents, key=lambda x: x['score'], reverse=True)
-            return sorted_docs[:top_n]
+            if len(sorted_docs) <= top_n or not all(doc.get('embedding') for doc in sorted_docs):
+                return strip(sorted_docs[:top_n])
+            
+            selected = RetrievalService._mmr_select(sorted_docs, top_n, config.RERANK_MMR_LAMBDA)
+            return strip([sorted_docs[i] for i in selected])
         except Exception as e:
             logger.error(f"重排序失敗: {e}")
-            return documents[:top_n] if len(documents) >= top_n else documents
+            return strip(documents[:top_n])
     
     @staticmethod
-    def retrieve_with_rerank(tenant_id: str, query: str) -> List[Dict]:
+    def retrieve_with_rerank(
+        tenant_id: str,
+        query: str,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
+        """檢索並重排序；同租戶相同（正規化後）問題的並行請求共用同一次檢索，結果為唯讀"""
+        if not config.SINGLEFLIGHT_ENABLED:
+            return RetrievalService._retrieve_with_rerank(tenant_id, query, query_embedding)
+        
+        return retrieval_flight.do(
+            (tenant_id, TextProcessor.normalize_query(query)),
+            RetrievalService._retrieve_with_rerank, tenant_id, query, query_embedding
+        )
+    
+    @staticmethod
+    def _retrieve_with_rerank(
+        tenant_id: str,
+        query: str,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict]:
         """檢索並重排序"""
         # 先檢索較多的候選
         candidates = RetrievalService.search(
             tenant_id=tenant_id,
             query=query,
-            top_k=config.TOP_K_RETRIEVAL
+            top_k=config.TOP_K_RETRIEVAL,
+            query_embedding=query_embedding
         )
         
         if not candidates:
@@ -136,3 +313,31 @@ class RetrievalService:
         )
         
         return final_docs
+    
+    @staticmethod
+    def retrieve_batch(tenant_id: str, queries: List[str]) -> List[List[Dict]]:
+        """批次檢索並重排序：查詢以批次嵌入，向量存儲以單次矩陣運算搜尋所有查詢
+        
+        RAG Engine 沒有批次查詢介面，此時逐題檢索。
+        """
+        if not queries:
+            return []
+        
+        if config.USE_RAG_ENGINE and RAG_ENGINE_AVAILABLE:
+            return [RetrievalService.retrieve_with_rerank(tenant_id, query) for query in queries]
+        
+        embeddings = embedding_service.embed_queries(queries)
+        if len(embeddings) != len(queries):
+            logger.error("批次查詢嵌入失敗")
+            return [[] for _ in queries]
+        
+        hits = vector_store_manager.search_batch(
+            tenant_id=tenant_id,
+            query_embeddings=embeddings,
+            top_k=config.TOP_K_RETRIEVAL
+        )
+        
+        return [
+            RetrievalService.rerank(query, RetrievalService._format_hits(results), config.RERANK_TOP_N)
+            for query, results in zip(queries, hits)
+        ]
@@ -51,7 +51,7 @@ class TenantService:
         """獲取租戶資訊"""
         try:
             tenants_collection = get_tenants_collection()
-            tenant_data = tenants_collection.find_one({'_id': ObjectId(tenant_id)})
+            tenant_data = tenants_collection.find_one({'_id': tenant_id})
             
             if not tenant_data:
                 return None
@@ -85,7 +85,7 @@ class TenantService:
             update_dict['updated_at'] = datetime.utcnow()
             
             result = tenants_collection.update_one(
-                {'_id': ObjectId(tenant_id)},
+                {'_id': tenant_id},
                 {'$set': update_dict}
             )
             
@@ -107,7 +107,7 @@ class TenantService:
             vector_store_manager.delete_collection(tenant_id)
             
             # 刪除租戶記錄
-            result = tenants_collection.delete_one({'_id': ObjectId(tenant_id)})
+            result = tenants_collection.delete_one({'_id': tenant_id})
             
             if result.deleted_count > 0:
                 logger.info(f"成功刪除租戶: {tenant_id}")
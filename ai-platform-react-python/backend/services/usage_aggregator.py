@@ -0,0 +1,171 @@
+import atexit
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from utils.db_manager import get_tenants_collection, get_conversations_collection, get_usage_daily_collection
+from utils.metrics import metrics
+from utils.logger import logger
+from config import get_config
+
+config = get_config()
+
+# 累計的用量欄位
+USAGE_FIELDS = ('prompt_tokens', 'completion_tokens', 'total_tokens', 'requests')
+
+
+class UsageAggregator:
+    """Token 用量彙總器：請求只在記憶體累加，背景執行緒定期以批次 $inc 寫入租戶、對話與每日彙總"""
+    
+    _instance = None
+    _initialized = False
+    
+    def __new__(cls):
+        """單例模式"""
+        if cls._instance is None:
+            cls._instance = super(UsageAggregator, cls).__new__(cls)
+        return cls._instance
+    
+    def __init__(self):
+        """初始化累計表與刷新執行緒"""
+        if not self._initialized:
+            self._lock = threading.Lock()
+            self._flush_lock = threading.Lock()
+            self._tenants = defaultdict(lambda: defaultdict(int))
+            self._conversations = defaultdict(lambda: defaultdict(int))
+            self._daily = defaultdict(lambda: defaultdict(int))
+            self._interval = config.USAGE_FLUSH_INTERVAL_SECONDS
+            self._stop = threading.Event()
+            self._thread = None
+            
+            self._tokens = metrics.counter('llm_tokens_total', 'LLM token 使用量')
+            
+            atexit.register(self.shutdown)
+            self._initialized = True
+    
+    def _ensure_started(self) -> None:
+        """首次記錄時啟動刷新執行緒"""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='usage-flush', daemon=True)
+                    self._thread.start()
+    
+    def record(self, tenant_id: str, conversation_id: Optional[str], token_usage: Dict) -> None:
+        """記錄一次請求的 token 用量（不寫資料庫）"""
+        values = {field: int(token_usage.get(field, 0) or 0) for field in USAGE_FIELDS if field != 'requests'}
+        values['requests'] = 1
+        day = datetime.utcnow().strftime('%Y-%m-%d')
+        
+        with self._lock:
+            targets = [self._tenants[tenant_id], self._daily[(tenant_id, day)]]
+            if conversation_id:
+                targets.append(self._conversations[conversation_id])
+            for target in targets:
+                for field, value in values.items():
+                    target[field] += value
+        
+        self._tokens.inc(values['prompt_tokens'], tenant=tenant_id, kind='prompt')
+        self._tokens.inc(values['completion_tokens'], tenant=tenant_id, kind='completion')
+        self._ensure_started()
+    
+    def _run(self) -> None:
+        """定期刷新"""
+        while not self._stop.wait(self._interval):
+            self.flush()
+    
+    @staticmethod
+    def _inc(values: Dict[str, int], prefix: str = '') -> Dict[str, int]:
+        """組合 $inc 內容，略過為零的欄位"""
+        return {f"{prefix}{field}": value for field, value in values.items() if value}
+    
+    def flush(self) -> int:
+        """將累計用量以批次 $inc 寫入，返回寫入的更新數；寫入失敗時併回累計表待下次重試"""
+        with self._flush_lock:
+            with self._lock:
+                tenants, self._tenants = self._tenants, defaultdict(lambda: defaultdict(int))
+                conversations, self._conversations = self._conversations, defaultdict(lambda: defaultdict(int))
+                daily, self._daily = self._daily, defaultdict(lambda: defaultdict(int))
+            
+            if not (tenants or conversations or daily):
+                return 0
+            
+            now = datetime.utcnow()
+            written = 0
+            try:
+                if tenants:
+                    get_tenants_collection().bulk_write([
+                        UpdateOne({'_id': tenant_id}, {'$inc': self._inc(values, 'token_usage.')})
+                        for tenant_id, values in tenants.items()
+                    ], ordered=False)
+                    written += len(tenants)
+                    tenants = {}
+                
+                if conversations:
+                    get_conversations_collection().bulk_write([
+                        UpdateOne({'_id': conv_id}, {'$inc': self._inc(values, 'token_usage.')})
+                        for conv_id, values in conversations.items()
+                    ], ordered=False)
+                    written += len(conversations)
+                    conversations = {}
+                
+                if daily:
+                    get_usage_daily_collection().bulk_write([
+                        UpdateOne(
+                            {'_id': f"{tenant_id}:{day}"},
+                            {
+                                '$inc': self._inc(values),
+                                '$set': {'updated_at': now},
+                                '$setOnInsert': {'tenant_id': tenant_id, 'date': day}
+                            },
+                            upsert=True
+                        )
+                        for (tenant_id, day), values in daily.items()
+                    ], ordered=False)
+                    written += len(daily)
+                    daily = {}
+                
+                logger.info(f"Token 用量已寫入 {written} 筆")
+            except Exception as e:
+                logger.error(f"Token 用量寫入失敗，下次重試: {e}")
+                self._merge_back(tenants, conversations, daily)
+            
+            return written
+    
+    def _merge_back(self, tenants: Dict, conversations: Dict, daily: Dict) -> None:
+        """將未寫入的用量併回累計表"""
+        with self._lock:
+            for pending, source in ((self._tenants, tenants), (self._conversations, conversations), (self._daily, daily)):
+                for key, values in source.items():
+                    for field, value in values.items():
+                        pending[key][field] += value
+    
+    def get_daily_usage(self, tenant_id: str, days: int = 30) -> List[Dict]:
+        """租戶最近 days 天的每日用量（含尚未寫入的部分），依日期排序"""
+        start = (datetime.utcnow() - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        
+        usage = {}
+        for doc in get_usage_daily_collection().find(
+            {'tenant_id': tenant_id, 'date': {'$gte': start}},
+            {'_id': 0, 'date': 1, **{field: 1 for field in USAGE_FIELDS}}
+        ):
+            usage[doc['date']] = {field: doc.get(field, 0) for field in USAGE_FIELDS}
+        
+        with self._lock:
+            for (pending_tenant, day), values in self._daily.items():
+                if pending_tenant == tenant_id and day >= start:
+                    entry = usage.setdefault(day, {field: 0 for field in USAGE_FIELDS})
+                    for field, value in values.items():
+                        entry[field] += value
+        
+        return [{'date': day, **usage[day]} for day in sorted(usage)]
+    
+    def shutdown(self) -> None:
+        """停止刷新執行緒並寫入剩餘用量"""
+        self._stop.set()
+        self.flush()
+
+
+# 創建全局用量彙總器實例
+usage_aggregator = UsageAggregator()
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+import mongomock
+import pymongo
+import pytest
+
+# 測試不連接 MongoDB 與 Gemini：設定需在導入應用模組前完成
+_tmp_dir = tempfile.mkdtemp(prefix='ai-platform-tests-')
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('FAKE_LLM_TTFT_MS', '0')
+os.environ.setdefault('FAKE_LLM_TOKENS_PER_SECOND', '100000')
+os.environ.setdefault('FAKE_LLM_OUTPUT_TOKENS', '20')
+os.environ.setdefault('FAKE_LLM_JITTER', '0')
+os.environ.setdefault('FAKE_EMBEDDING_LATENCY_MS', '0')
+os.environ.setdefault('LOG_FILE', os.path.join(_tmp_dir, 'logs', 'app.log'))
+os.environ.setdefault('UPLOAD_FOLDER', os.path.join(_tmp_dir, 'uploads'))
+os.environ.setdefault('PARSE_CACHE_DIR', os.path.join(_tmp_dir, 'parsed'))
+pymongo.MongoClient = mongomock.MongoClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session', autouse=True)
+def flush_usage():
+    """測試結束時在輸出關閉前寫入累計用量，避免 atexit 寫日誌到已關閉的串流"""
+    yield
+    from services.usage_aggregator import usage_aggregator
+    usage_aggregator.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    """每個測試前清空 mongomock 資料庫"""
+    from utils.db_manager import db_manager
+    for name in db_manager.db.list_collection_names():
+        db_manager.db.drop_collection(name)
+    yield
+
+
+@pytest.fixture
+def create_document():
+    """經由 DocumentService 的上傳路徑建立文件記錄，返回 Document"""
+    from services.document_service import DocumentService
+    
+    def create(tenant_id='tenant', filename='policy.txt', content='員工請假需提前三天申請，並經主管核准。' * 20):
+        safe_filename, file_ext, file_path = DocumentService._allocate_file_path(tenant_id, filename)
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return DocumentService._create_document_record(tenant_id, safe_filename, file_ext, file_path)
+    
+    return create
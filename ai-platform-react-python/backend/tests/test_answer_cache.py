@@ -0,0 +1,86 @@
+import uuid
+import pytest
+from models.tenant import TenantCreate
+from services.tenant_service import TenantService
+from utils.answer_cache import SemanticAnswerCache
+from utils.db_manager import get_tenants_collection
+
+
+@pytest.fixture
+def cache():
+    instance = object.__new__(SemanticAnswerCache)
+    SemanticAnswerCache.__init__(instance)
+    instance._enabled = True
+    instance._threshold = 0.9
+    instance._max_entries = 3
+    instance._ttl = 3600
+    return instance
+
+
+def create_tenant():
+    return TenantService.create_tenant(TenantCreate(name=f"tenant-{uuid.uuid4().hex[:8]}"))['id']
+
+
+@pytest.fixture
+def tenant_id():
+    return create_tenant()
+
+
+def store(cache, tenant_id, embedding, answer, version=None):
+    if version is None:
+        version = cache.version(tenant_id)
+    return cache.store(tenant_id, embedding, answer, [], {'total_tokens': 10}, version)
+
+
+def test_lookup_hits_similar_question(cache, tenant_id):
+    assert store(cache, tenant_id, [1.0, 0.0], 'answer')
+    
+    hit = cache.lookup(tenant_id, [0.99, 0.05])
+    assert hit['answer'] == 'answer'
+    assert hit['similarity'] >= 0.9
+    assert cache.lookup(tenant_id, [0.0, 1.0]) is None
+
+
+def test_entries_are_isolated_per_tenant(cache, tenant_id):
+    store(cache, tenant_id, [1.0, 0.0], 'answer')
+    
+    assert cache.lookup(create_tenant(), [1.0, 0.0]) is None
+
+
+def test_oldest_entries_are_evicted(cache, tenant_id):
+    for i in range(4):
+        store(cache, tenant_id, [1.0, float(i) * 10], f'answer {i}')
+    
+    assert len(cache._tenants[tenant_id].entries) == 3
+    assert cache.lookup(tenant_id, [1.0, 0.0]) is None
+
+
+def test_invalidate_bumps_version_in_database(cache, tenant_id):
+    version = cache.version(tenant_id)
+    store(cache, tenant_id, [1.0, 0.0], 'answer')
+    
+    cache.invalidate(tenant_id)
+    
+    assert get_tenants_collection().find_one({'_id': tenant_id})['kb_version'] == version + 1
+    assert cache.version(tenant_id) == version + 1
+    assert cache.lookup(tenant_id, [1.0, 0.0]) is None
+
+
+def test_store_rejects_answer_started_before_invalidation(cache, tenant_id):
+    version = cache.version(tenant_id)
+    cache.invalidate(tenant_id)
+    
+    assert not store(cache, tenant_id, [1.0, 0.0], 'stale answer', version=version)
+    assert cache.lookup(tenant_id, [1.0, 0.0]) is None
+
+
+def test_version_change_from_another_worker_clears_entries(cache, tenant_id):
+    other_worker = object.__new__(SemanticAnswerCache)
+    SemanticAnswerCache.__init__(other_worker)
+    store(cache, tenant_id, [1.0, 0.0], 'answer')
+    
+    other_worker.invalidate(tenant_id)
+    
+    # 下一次請求讀取版本時發現已變更
+    cache.version(tenant_id)
+    assert cache.lookup(tenant_id, [1.0, 0.0]) is None
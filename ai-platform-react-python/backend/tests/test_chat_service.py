@@ -0,0 +1,41 @@
+from models.conversation import ChatRequest
+from services.chat_service import ChatService
+from utils.db_manager import get_conversations_collection
+
+
+def wait_for_saves():
+    with ChatService._pending_lock:
+        pending = list(ChatService._pending_saves.values())
+    for future in pending:
+        future.result(timeout=5)
+
+
+def test_follow_up_turn_continues_the_same_conversation():
+    first = ChatService.chat('tenant', ChatRequest(message='請假規定是什麼？'), user_id='user')
+    wait_for_saves()
+    
+    second = ChatService.chat(
+        'tenant', ChatRequest(message='需要主管核准嗎？', conversation_id=first.conversation_id), user_id='user'
+    )
+    wait_for_saves()
+    
+    assert second.conversation_id == first.conversation_id
+    assert get_conversations_collection().count_documents({'tenant_id': 'tenant'}) == 1
+    
+    conv_data = get_conversations_collection().find_one({'_id': first.conversation_id})
+    assert conv_data['message_count'] == 4
+    assert conv_data['last_message_preview'] == second.message[:100]
+    
+    conversation = ChatService.get_conversation(first.conversation_id, 'tenant')
+    assert [message['content'] for message in conversation['messages']][::2] == ['請假規定是什麼？', '需要主管核准嗎？']
+
+
+def test_conversation_of_another_tenant_is_not_continued():
+    first = ChatService.chat('tenant', ChatRequest(message='請假規定是什麼？'))
+    wait_for_saves()
+    
+    other = ChatService.chat('other', ChatRequest(message='請假規定是什麼？', conversation_id=first.conversation_id))
+    wait_for_saves()
+    
+    assert other.conversation_id != first.conversation_id
+    assert ChatService.get_conversation(first.conversation_id, 'other') is None
@@ -0,0 +1,140 @@
+import pytest
+import services.checkpoint_service as checkpoint_module
+from services.checkpoint_service import CheckpointService
+from utils.db_manager import get_checkpoint_chunks_collection, get_documents_collection
+
+
+@pytest.fixture
+def document_id(create_document):
+    return create_document().id
+
+
+def make_chunks(count):
+    return [{'text': f'chunk {i}', 'metadata': {'index': i}} for i in range(count)]
+
+
+def test_save_state_stores_chunks_in_batches(monkeypatch, document_id):
+    monkeypatch.setattr(checkpoint_module, 'CHUNK_BATCH_SIZE', 3)
+    chunks = make_chunks(7)
+    
+    CheckpointService.save_state(document_id, 'tenant', 'ref', chunks)
+    
+    checkpoint = CheckpointService.load(document_id)
+    assert 'chunks' not in checkpoint
+    assert checkpoint['chunk_count'] == 7
+    assert checkpoint['embedded_count'] == 0
+    assert get_checkpoint_chunks_collection().count_documents({'document_id': document_id}) == 3
+    assert CheckpointService.load_chunks(document_id, checkpoint['chunk_count']) == chunks
+
+
+def test_load_chunks_returns_none_when_a_batch_is_missing(monkeypatch, document_id):
+    monkeypatch.setattr(checkpoint_module, 'CHUNK_BATCH_SIZE', 3)
+    CheckpointService.save_state(document_id, 'tenant', 'ref', make_chunks(7))
+    get_checkpoint_chunks_collection().delete_one({'document_id': document_id, 'start': 3})
+    
+    assert CheckpointService.load_chunks(document_id, 7) is None
+
+
+def test_resume_reads_only_saved_vector_batches(document_id):
+    CheckpointService.save_state(document_id, 'tenant', 'ref', make_chunks(4))
+    CheckpointService.save_vectors(document_id, 0, [[0.0], [1.0]])
+    
+    checkpoint = CheckpointService.load(document_id)
+    assert checkpoint['embedded_count'] == 2
+    assert CheckpointService.load_vectors(document_id, 0, 2) == [[0.0], [1.0]]
+    assert CheckpointService.load_vectors(document_id, 2, 4) is None
+
+
+def test_save_vectors_refreshes_document_heartbeat(document_id):
+    CheckpointService.save_state(document_id, 'tenant', 'ref', make_chunks(2))
+    CheckpointService.save_vectors(document_id, 0, [[0.0], [1.0]])
+    
+    assert get_documents_collection().find_one({'_id': document_id}).get('updated_at') is not None
+
+
+def test_save_state_discards_previous_batches(document_id):
+    CheckpointService.save_state(document_id, 'tenant', 'ref', make_chunks(2))
+    CheckpointService.save_vectors(document_id, 0, [[0.0], [1.0]])
+    
+    CheckpointService.save_state(document_id, 'tenant', 'ref', make_chunks(3))
+    
+    assert CheckpointService.load(document_id)['embedded_count'] == 0
+    assert CheckpointService.load_vectors(document_id, 0, 2) is None
+    assert len(CheckpointService.load_chunks(document_id, 3)) == 3
+
+
+def test_clear_removes_checkpoint_and_batches(document_id):
+    CheckpointService.save_state(document_id, 'tenant', 'ref', make_chunks(2))
+    CheckpointService.save_vectors(document_id, 0, [[0.0], [1.0]])
+    
+    CheckpointService.clear(document_id)
+    
+    assert CheckpointService.load(document_id) is None
+    assert CheckpointService.load_chunks(document_id, 2) is None
+    assert CheckpointService.load_vectors(document_id, 0, 2) is None
+
+
+def test_prepare_document_resumes_from_checkpoint(document_id):
+    from services.document_service import DocumentService
+    
+    # 上次處理時保存的分塊與第一批向量
+    chunks = make_chunks(4)
+    CheckpointService.save_state(document_id, 'tenant', 'ref', chunks)
+    CheckpointService.save_vectors(document_id, 0, [[0.0], [1.0]])
+    
+    context = DocumentService.prepare_document(document_id, 'tenant')
+    
+    assert context['resume_from'] == 2
+    assert context['chunks'] == chunks
+
+
+def make_stale(document_id):
+    from datetime import datetime, timedelta
+    
+    get_documents_collection().update_one(
+        {'_id': document_id},
+        {'$set': {'updated_at': datetime.utcnow() - timedelta(hours=1)}}
+    )
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    from services.ingestion_scheduler import ingestion_scheduler
+    
+    enqueued = []
+    monkeypatch.setattr(ingestion_scheduler, 'enqueue', lambda tenant_id, document_id, batch_id=None: enqueued.append(document_id))
+    return enqueued
+
+
+def test_resume_stuck_documents_claims_only_stale_documents(create_document, enqueued):
+    from services.document_service import DocumentService
+    
+    stale, fresh = create_document(), create_document()
+    make_stale(stale.id)
+    
+    assert DocumentService.resume_stuck_documents(stale_seconds=600) == 1
+    assert enqueued == [stale.id]
+    
+    # 認領時已更新心跳，另一個 worker 不會再次認領
+    assert DocumentService.resume_stuck_documents(stale_seconds=600) == 0
+
+
+def test_resume_stuck_documents_fails_after_max_resumes(monkeypatch, create_document, enqueued):
+    from services.document_service import DocumentService
+    
+    monkeypatch.setattr('services.document_service.config.INGEST_MAX_RESUMES', 2)
+    document = create_document()
+    
+    for _ in range(2):
+        make_stale(document.id)
+        assert DocumentService.resume_stuck_documents(stale_seconds=600) == 1
+    
+    make_stale(document.id)
+    assert DocumentService.resume_stuck_documents(stale_seconds=600) == 0
+    assert enqueued == [document.id, document.id]
+    assert get_documents_collection().find_one({'_id': document.id})['status'] == 'failed'
+    
+    # 手動重試重新計算恢復次數
+    assert DocumentService.retry_document(document.id, 'tenant')['status'] == 'processing'
+    make_stale(document.id)
+    assert DocumentService.resume_stuck_documents(stale_seconds=600) == 1
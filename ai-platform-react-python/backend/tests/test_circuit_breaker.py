@@ -0,0 +1,143 @@
+import pytest
+import utils.circuit_breaker as breaker_module
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, HALF_OPEN, OPEN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(breaker_module, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    config = breaker_module.config
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_ENABLED', True)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_WINDOW_SECONDS', 60.0)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_MIN_CALLS', 4)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_FAILURE_RATE', 0.5)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_SLOW_CALL_SECONDS', 10.0)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_SLOW_CALL_RATE', 0.8)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_OPEN_SECONDS', 30.0)
+    monkeypatch.setattr(config, 'CIRCUIT_BREAKER_HALF_OPEN_CALLS', 2)
+    return CircuitBreaker('test')
+
+
+def trip(breaker):
+    for _ in range(4):
+        assert breaker.allow()
+        breaker.record(False, 0.1)
+    assert breaker._state == OPEN
+
+
+def test_stays_closed_below_min_calls(breaker):
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    
+    assert breaker._state == CLOSED
+    assert breaker.allow()
+
+
+def test_opens_on_failure_rate_and_rejects(breaker):
+    breaker.record(True, 0.1)
+    breaker.record(True, 0.1)
+    breaker.record(False, 0.1)
+    assert breaker._state == CLOSED
+    breaker.record(False, 0.1)
+    
+    assert breaker._state == OPEN
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 'unused')
+
+
+def test_opens_on_slow_call_rate(breaker):
+    for _ in range(4):
+        breaker.record(True, 12.0)
+    
+    assert breaker._state == OPEN
+
+
+def test_calls_outside_window_are_dropped(breaker, clock):
+    for _ in range(3):
+        breaker.record(False, 0.1)
+    clock.now += 61
+    breaker.record(False, 0.1)
+    
+    assert breaker._state == CLOSED
+    assert breaker.get_status()['window_calls'] == 1
+
+
+def test_half_open_closes_after_successful_trials(breaker, clock):
+    trip(breaker)
+    clock.now += 30
+    
+    assert breaker.allow()
+    assert breaker._state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    
+    breaker.record(True, 0.1)
+    assert breaker._state == HALF_OPEN
+    breaker.record(True, 0.1)
+    assert breaker._state == CLOSED
+    assert breaker.get_status()['window_calls'] == 0
+
+
+def test_half_open_reopens_on_failed_or_slow_trial(breaker, clock):
+    trip(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker._state == OPEN
+    
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(True, 12.0)
+    assert breaker._state == OPEN
+
+
+def test_half_open_trials_that_never_report_reopen_after_timeout(breaker, clock):
+    trip(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.allow()
+    
+    clock.now += 29
+    assert not breaker.allow()
+    assert breaker._state == HALF_OPEN
+    
+    clock.now += 1
+    assert not breaker.allow()
+    assert breaker._state == OPEN
+    
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker._state == HALF_OPEN
+
+
+def test_call_records_exceptions_as_failures(breaker):
+    def fail():
+        raise RuntimeError('boom')
+    
+    for _ in range(4):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    
+    assert breaker._state == OPEN
+
+
+def test_disabled_breaker_always_allows(breaker, monkeypatch):
+    trip(breaker)
+    monkeypatch.setattr(breaker_module.config, 'CIRCUIT_BREAKER_ENABLED', False)
+    
+    assert breaker.allow()
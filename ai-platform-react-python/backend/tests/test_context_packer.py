@@ -0,0 +1,95 @@
+from utils.context_packer import ContextPacker, MIN_PARTIAL_TOKENS
+from utils.text_processor import TextProcessor
+
+
+def chunk(document_id, chunk_index, text, score):
+    return {'document_id': document_id, 'chunk_index': chunk_index, 'text': text, 'score': score}
+
+
+def test_adjacent_chunks_merge_without_repeating_overlap():
+    docs = [
+        chunk('doc', 1, 'overlapping tail text and the second part', 0.7),
+        chunk('doc', 0, 'first part with overlapping tail text', 0.9)
+    ]
+    
+    packed, stats = ContextPacker.pack(docs, token_budget=1000)
+    
+    assert len(packed) == 1
+    assert packed[0]['text'] == 'first part with overlapping tail text and the second part'
+    assert packed[0]['chunk_indices'] == [0, 1]
+    assert packed[0]['score'] == 0.9
+    assert stats['input_chunks'] == 2
+    assert stats['packed_chunks'] == 1
+
+
+def test_non_adjacent_chunks_stay_separate_and_sort_by_score():
+    docs = [
+        chunk('doc', 0, 'the opening paragraph', 0.4),
+        chunk('doc', 2, 'a later paragraph', 0.8),
+        chunk('other', 1, 'another document', 0.6)
+    ]
+    
+    packed, _ = ContextPacker.pack(docs, token_budget=1000)
+    
+    assert [doc['text'] for doc in packed] == ['a later paragraph', 'another document', 'the opening paragraph']
+
+
+def test_adjacent_chunks_without_overlap_join_with_newline():
+    docs = [chunk('doc', 0, 'first chunk', 0.5), chunk('doc', 1, 'second chunk', 0.5)]
+    
+    packed, _ = ContextPacker.pack(docs, token_budget=1000)
+    
+    assert packed[0]['text'] == 'first chunk\nsecond chunk'
+
+
+def test_duplicate_text_across_documents_is_kept_once():
+    docs = [
+        chunk('a', 0, 'Same  Content', 0.5),
+        chunk('b', 3, 'same content', 0.9)
+    ]
+    
+    packed, _ = ContextPacker.pack(docs, token_budget=1000)
+    
+    assert len(packed) == 1
+    assert packed[0]['document_id'] == 'a'
+
+
+def test_budget_truncates_last_chunk_and_reports_savings():
+    high = 'x' * 400
+    low = 'y' * 800
+    docs = [chunk('a', 0, high, 0.9), chunk('b', 0, low, 0.5)]
+    budget = 100 + MIN_PARTIAL_TOKENS
+    
+    packed, stats = ContextPacker.pack(docs, token_budget=budget)
+    
+    assert packed[0]['text'] == high
+    assert packed[1]['truncated'] is True
+    assert TextProcessor.estimate_tokens(packed[1]['text']) <= MIN_PARTIAL_TOKENS
+    assert stats['tokens_before'] == 300
+    assert stats['tokens_after'] == budget
+    assert stats['tokens_saved'] == 300 - budget
+
+
+def test_small_remaining_budget_skips_partial_chunk():
+    docs = [chunk('a', 0, 'x' * 400, 0.9), chunk('b', 0, 'y' * 800, 0.5)]
+    
+    packed, stats = ContextPacker.pack(docs, token_budget=100 + MIN_PARTIAL_TOKENS - 1)
+    
+    assert len(packed) == 1
+    assert stats['tokens_after'] == 100
+
+
+def test_first_chunk_is_truncated_when_it_exceeds_budget():
+    packed, _ = ContextPacker.pack([chunk('a', 0, '字' * 100, 0.9)], token_budget=10)
+    
+    assert packed[0]['text'] == '字' * 10
+    assert packed[0]['truncated'] is True
+
+
+def test_pack_does_not_modify_input():
+    docs = [chunk('doc', 0, 'first chunk', 0.5), chunk('doc', 1, 'second chunk', 0.5)]
+    original = [dict(doc) for doc in docs]
+    
+    ContextPacker.pack(docs, token_budget=1000)
+    
+    assert docs == original
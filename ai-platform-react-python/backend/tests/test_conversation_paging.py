@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+import pytest
+from services.chat_service import ChatService
+from utils.db_manager import get_conversations_collection
+
+
+def make_conversations(count, user_id='user', tenant_id='tenant', tied=2):
+    """建立 count 個對話，最新的 tied 個 updated_at 相同（以 _id 決定順序）"""
+    base = datetime(2024, 1, 1)
+    ids = []
+    for i in range(count):
+        conversation = ChatService.create_conversation(tenant_id, user_id, title=f'對話 {i}')
+        updated_at = base + timedelta(minutes=min(i, count - tied))
+        get_conversations_collection().update_one(
+            {'_id': conversation['id']},
+            {'$set': {'updated_at': updated_at, 'messages': [{'content': 'x'}]}}
+        )
+        ids.append(conversation['id'])
+    return ids
+
+
+def list_all(limit, **kwargs):
+    pages = []
+    cursor = None
+    while True:
+        page = ChatService.get_conversations('tenant', limit=limit, cursor=cursor, **kwargs)
+        pages.append([conv['id'] for conv in page['conversations']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    updated_at = datetime(2024, 5, 6, 7, 8, 9, 123000)
+    
+    cursor = ChatService.encode_cursor(updated_at, 'abc')
+    
+    assert ChatService.decode_cursor(cursor) == (updated_at, 'abc')
+
+
+def test_invalid_cursor_raises_value_error():
+    with pytest.raises(ValueError):
+        ChatService.decode_cursor('not-a-cursor')
+
+
+def test_pages_cover_every_conversation_once_in_order():
+    ids = make_conversations(5)
+    
+    pages = list_all(limit=2)
+    
+    # updated_at 倒序，相同時依 _id 倒序
+    docs = sorted(get_conversations_collection().find(), key=lambda doc: (doc['updated_at'], doc['_id']), reverse=True)
+    assert [conv_id for page in pages for conv_id in page] == [doc['_id'] for doc in docs]
+    assert sorted(conv_id for page in pages for conv_id in page) == sorted(ids)
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+
+def test_exact_last_page_has_no_next_cursor():
+    make_conversations(4)
+    
+    assert [len(page) for page in list_all(limit=2)] == [2, 2]
+
+
+def test_listing_filters_by_user_and_projects_summary_fields():
+    make_conversations(2, user_id='alice')
+    make_conversations(1, user_id='bob')
+    
+    page = ChatService.get_conversations('tenant', user_id='bob')
+    
+    assert len(page['conversations']) == 1
+    assert page['conversations'][0]['user_id'] == 'bob'
+    assert 'messages' not in page['conversations'][0]
@@ -0,0 +1,39 @@
+from models.document import DocumentStatus
+from services.checkpoint_service import CheckpointService
+from services.document_service import DocumentService
+from utils.db_manager import get_documents_collection
+from utils.vector_store import vector_store_manager
+
+
+def test_uploaded_document_is_indexed_end_to_end(create_document):
+    document = create_document('tenant-e2e', 'policy.txt', '員工請假需提前三天申請，並經主管核准。' * 50)
+    assert get_documents_collection().find_one({'_id': document.id})['status'] == DocumentStatus.PROCESSING
+    
+    assert DocumentService.process_document(document.id, 'tenant-e2e')
+    
+    doc_data = get_documents_collection().find_one({'_id': document.id})
+    assert doc_data['status'] == DocumentStatus.COMPLETED
+    assert doc_data['chunks_count'] > 0
+    assert doc_data['processing_stats']['counters']['chunks'] == doc_data['chunks_count']
+    assert CheckpointService.load(document.id) is None
+    
+    vectors = [vector for vector in vector_store_manager.get_collection('tenant-e2e') if vector['document_id'] == document.id]
+    assert len(vectors) == doc_data['chunks_count']
+    
+    assert DocumentService.delete_document(document.id, 'tenant-e2e')
+    assert get_documents_collection().find_one({'_id': document.id}) is None
+
+
+def test_failed_document_can_be_retried(monkeypatch, create_document):
+    from services.ingestion_scheduler import ingestion_scheduler
+    
+    enqueued = []
+    monkeypatch.setattr(ingestion_scheduler, 'enqueue', lambda tenant_id, document_id, batch_id=None: enqueued.append(document_id))
+    document = create_document('tenant-e2e', 'empty.txt', '')
+    
+    assert not DocumentService.process_document(document.id, 'tenant-e2e')
+    assert get_documents_collection().find_one({'_id': document.id})['status'] == DocumentStatus.FAILED
+    
+    retried = DocumentService.retry_document(document.id, 'tenant-e2e')
+    assert retried['status'] == DocumentStatus.PROCESSING
+    assert enqueued == [document.id]
@@ -0,0 +1,38 @@
+import utils.file_parser as file_parser_module
+from utils.file_parser import FileParser, CSV_ENCODING_SAMPLE_SIZE
+
+
+def write_csv(path, rows, encoding):
+    path.write_bytes(''.join(f"{name},{value}\n" for name, value in rows).encode(encoding))
+    return str(path)
+
+
+def test_utf8_csv_larger_than_sample_is_not_misdetected(tmp_path):
+    rows = [('部門', '說明')] + [(f"員工{i}", '請假需提前三天申請並經主管核准') for i in range(3000)]
+    content = ''.join(f"{name},{value}\n" for name, value in rows).encode('utf-8')
+    
+    # 調整開頭使樣本結尾切在多位元組字元中間
+    while (content[CSV_ENCODING_SAMPLE_SIZE] & 0xC0) != 0x80:
+        content = b' ' + content
+    file_path = tmp_path / 'staff.csv'
+    file_path.write_bytes(content)
+    
+    assert FileParser._detect_csv_encoding(str(file_path)) == 'utf-8-sig'
+    _, _, first = next(FileParser.iter_csv_rows(str(file_path)))
+    assert first[1] == '說明'
+
+
+def test_utf8_csv_cut_at_every_offset(tmp_path, monkeypatch):
+    file_path = write_csv(tmp_path / 'small.csv', [('名稱', '數值')] * 5, 'utf-8')
+    
+    for size in range(1, 12):
+        monkeypatch.setattr(file_parser_module, 'CSV_ENCODING_SAMPLE_SIZE', size)
+        assert FileParser._detect_csv_encoding(file_path) == 'utf-8-sig'
+
+
+def test_gbk_csv_is_detected(tmp_path):
+    file_path = write_csv(tmp_path / 'gbk.csv', [('部门', '说明')] * 10, 'gbk')
+    
+    assert FileParser._detect_csv_encoding(file_path) == 'gbk'
+    _, _, first = next(FileParser.iter_csv_rows(file_path))
+    assert first == ['部门', '说明']
@@ -0,0 +1,97 @@
+import threading
+import pytest
+import google.ai.generativelanguage as glm
+import services.gemini_client as gemini_module
+from services.gemini_client import ContentBlockedError, GeminiClient, LLMUnavailableError, _ModelSlot
+
+
+def answer(text):
+    return glm.GenerateContentResponse(candidates=[
+        glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)], role='model'), finish_reason=1)
+    ])
+
+
+class StubTransport:
+    """取代 GenerativeServiceClient，記錄 SDK 組出的請求"""
+    
+    def __init__(self, response=None, chunks=(), block=None):
+        self.requests = []
+        self._response = response
+        self._chunks = chunks
+        self._block = block
+    
+    def generate_content(self, request):
+        self.requests.append(request)
+        if self._block is not None:
+            self._block.wait(5)
+        return self._response
+    
+    def stream_generate_content(self, request):
+        self.requests.append(request)
+        return iter(self._chunks)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """使用真實 genai.GenerativeModel 的客戶端"""
+    monkeypatch.setattr(gemini_module.config, 'LLM_BACKEND', 'gemini')
+    monkeypatch.setattr(gemini_module.config, 'GEMINI_HEDGE_ENABLED', False)
+    monkeypatch.setattr(gemini_module.config, 'GEMINI_MAX_RETRIES', 0)
+    instance = GeminiClient()
+    instance._slots = [_ModelSlot('gemini-test')]
+    return instance
+
+
+def use_transport(client, transport):
+    client._slots[0].model._client = transport
+    return transport
+
+
+def test_call_builds_a_request_the_sdk_accepts(client):
+    transport = use_transport(client, StubTransport(response=answer('你好')))
+    slot = client._slots[0]
+    
+    response = client._call(slot, '問題', gemini_module.genai.types.GenerationConfig(temperature=0.2))
+    
+    assert response.text == '你好'
+    assert transport.requests[0].model == 'models/gemini-test'
+    assert transport.requests[0].generation_config.temperature == pytest.approx(0.2)
+
+
+def test_generate_returns_response_and_model(client):
+    use_transport(client, StubTransport(response=answer('答案')))
+    
+    response, model = client.generate('問題', None)
+    
+    assert response.text == '答案'
+    assert model == 'gemini-test'
+
+
+def test_blocked_response_raises_content_blocked(client):
+    blocked = glm.GenerateContentResponse(prompt_feedback=glm.GenerateContentResponse.PromptFeedback(block_reason=1))
+    use_transport(client, StubTransport(response=blocked))
+    
+    with pytest.raises(ContentBlockedError):
+        client.generate('問題', None)
+
+
+def test_open_stream_yields_first_and_remaining_chunks(client):
+    use_transport(client, StubTransport(chunks=[answer('第一'), answer('第二')]))
+    
+    chunks, model = client.open_stream('問題', None)
+    
+    assert [chunk.text for chunk in chunks] == ['第一', '第二']
+    assert model == 'gemini-test'
+
+
+def test_deadline_is_enforced_without_request_options(client, monkeypatch):
+    monkeypatch.setattr(gemini_module.config, 'GEMINI_TIMEOUT_SECONDS', 0.2)
+    monkeypatch.setattr(gemini_module.config, 'GEMINI_ATTEMPT_TIMEOUT_SECONDS', 0.2)
+    release = threading.Event()
+    use_transport(client, StubTransport(response=answer('太慢'), block=release))
+    
+    try:
+        with pytest.raises(LLMUnavailableError):
+            client.generate('問題', None)
+    finally:
+        release.set()
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from models.conversation import Message, MessageRole
+from services.chat_service import ChatService
+from services.history_service import HistoryService
+from utils.db_manager import get_conversations_collection
+
+
+@pytest.fixture(autouse=True)
+def inline_summaries(monkeypatch):
+    """摘要更新改為同步執行"""
+    monkeypatch.setattr(HistoryService, '_executor', SimpleNamespace(submit=lambda func, *args: func(*args)))
+
+
+@pytest.fixture
+def conversation_id():
+    return ChatService.create_conversation('tenant', 'user')['id']
+
+
+def save_turns(conversation_id, count):
+    started = datetime.utcnow() - timedelta(minutes=count)
+    for i in range(count):
+        asked = started + timedelta(minutes=i)
+        ChatService._save_turn(
+            conversation_id, 'tenant',
+            Message(role=MessageRole.USER, content=f"問題 {i}", timestamp=asked),
+            Message(role=MessageRole.ASSISTANT, content=f"回答 {i}", timestamp=asked + timedelta(seconds=5)),
+            {'total_tokens': 10}
+        )
+
+
+def test_history_includes_recent_messages_in_order(conversation_id):
+    save_turns(conversation_id, 2)
+    
+    history = HistoryService.build_history(conversation_id)
+    
+    assert [item['content'] for item in history] == ['問題 0', '回答 0', '問題 1', '回答 1']
+
+
+def test_overflow_is_folded_into_rolling_summary(monkeypatch, conversation_id):
+    monkeypatch.setattr('services.history_service.config.HISTORY_MAX_MESSAGES', 2)
+    monkeypatch.setattr(HistoryService, '_summarize', staticmethod(
+        lambda summary, messages: ' '.join(filter(None, [summary] + [m.content for m in messages]))
+    ))
+    
+    save_turns(conversation_id, 3)
+    
+    conv_data = get_conversations_collection().find_one({'_id': conversation_id})
+    assert conv_data['history_summary'] == '問題 0 回答 0 問題 1 回答 1'
+    assert conv_data['summarized_until'] is not None
+    
+    history = HistoryService.build_history(conversation_id)
+    assert history[0] == {'role': MessageRole.SYSTEM, 'content': '先前對話摘要：問題 0 回答 0 問題 1 回答 1'}
+    assert [item['content'] for item in history[1:]] == ['問題 2', '回答 2']
+
+
+def test_summary_stays_within_token_budget(monkeypatch, conversation_id):
+    monkeypatch.setattr('services.history_service.config.HISTORY_TOKEN_BUDGET', 10)
+    
+    save_turns(conversation_id, 3)
+    
+    history = HistoryService.build_history(conversation_id)
+    assert history[0]['role'] == MessageRole.SYSTEM
+    assert get_conversations_collection().find_one({'_id': conversation_id})['history_summary']
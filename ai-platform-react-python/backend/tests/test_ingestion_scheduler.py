@@ -0,0 +1,111 @@
+import threading
+import uuid
+from types import SimpleNamespace
+import pytest
+import services.ingestion_scheduler as scheduler_module
+from models.tenant import TenantCreate
+from services.ingestion_scheduler import IngestionScheduler
+from services.tenant_service import TenantService
+from utils.db_manager import get_tenants_collection
+
+
+class _IdleThread:
+    """不啟動的派送與心跳執行緒，測試直接呼叫 _pick"""
+    
+    def __init__(self, *args, **kwargs):
+        pass
+    
+    def start(self):
+        pass
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(
+        scheduler_module, 'threading',
+        SimpleNamespace(Condition=threading.Condition, Thread=_IdleThread)
+    )
+    instance = object.__new__(IngestionScheduler)
+    IngestionScheduler.__init__(instance)
+    instance._max_in_flight = 100
+    instance._tenant_max_concurrent = 100
+    return instance
+
+
+def make_tenant(plan):
+    return TenantService.create_tenant(TenantCreate(name=f"tenant-{uuid.uuid4().hex[:8]}", plan=plan))['id']
+
+
+def enqueue(scheduler, tenant_id, count):
+    for i in range(count):
+        scheduler.enqueue(tenant_id, f"{tenant_id}-{i}")
+
+
+def pick_tenants(scheduler, count):
+    return [scheduler._pick()['tenant_id'] for _ in range(count)]
+
+
+def test_pick_follows_plan_weights(scheduler):
+    pro, standard = make_tenant('專業版'), make_tenant('標準版')
+    enqueue(scheduler, pro, 4)
+    enqueue(scheduler, standard, 4)
+    
+    # 專業版權重 2、標準版權重 1
+    assert pick_tenants(scheduler, 8) == [pro, pro, standard, pro, pro, standard, standard, standard]
+    assert scheduler._pick() is None
+
+
+def test_pick_keeps_fifo_order_within_tenant(scheduler):
+    tenant = make_tenant('標準版')
+    enqueue(scheduler, tenant, 3)
+    
+    assert [scheduler._pick()['document_id'] for _ in range(3)] == [f"{tenant}-{i}" for i in range(3)]
+
+
+def test_pick_skips_tenants_at_concurrency_cap(scheduler):
+    busy, idle = make_tenant('企業版'), make_tenant('標準版')
+    enqueue(scheduler, busy, 2)
+    enqueue(scheduler, idle, 2)
+    scheduler._tenant_max_concurrent = 1
+    scheduler._running[busy] = 1
+    
+    assert pick_tenants(scheduler, 2) == [idle, idle]
+    assert scheduler._pick() is None
+    
+    scheduler._running[busy] = 0
+    assert scheduler._pick()['tenant_id'] == busy
+
+
+def test_enqueue_rejects_pending_document(scheduler):
+    tenant = make_tenant('標準版')
+    
+    assert scheduler.enqueue(tenant, 'doc') is True
+    assert scheduler.enqueue(tenant, 'doc') is False
+    assert len(scheduler._queues[tenant]) == 1
+
+
+def test_weight_reads_only_cached_plan(scheduler, monkeypatch):
+    tenant = make_tenant('企業版')
+    enqueue(scheduler, tenant, 1)
+    
+    def fail():
+        raise AssertionError('_weight 不應查詢資料庫')
+    
+    monkeypatch.setattr(scheduler_module, 'PLAN_CACHE_TTL', 0)
+    monkeypatch.setattr(scheduler_module, 'get_tenants_collection', fail)
+    
+    assert scheduler._weight(tenant) == 4
+    assert scheduler._weight(make_tenant('企業版')) == 1
+
+
+def test_refresh_plan_reloads_expired_plan(scheduler, monkeypatch):
+    tenant = make_tenant('標準版')
+    scheduler._refresh_plan(tenant)
+    get_tenants_collection().update_one({'_id': tenant}, {'$set': {'plan': '企業版'}})
+    
+    scheduler._refresh_plan(tenant)
+    assert scheduler._weight(tenant) == 1
+    
+    monkeypatch.setattr(scheduler_module, 'PLAN_CACHE_TTL', 0)
+    scheduler._refresh_plan(tenant)
+    assert scheduler._weight(tenant) == 4
@@ -0,0 +1,22 @@
+from utils.metrics import Counter, Histogram
+
+
+def test_label_values_are_escaped():
+    counter = Counter('test_requests_total', '測試')
+    counter.inc(backend='a\\b', tenant='say "hi"\nbye')
+    
+    line = counter.render()[-1]
+    
+    assert line == 'test_requests_total{backend="a\\\\b",tenant="say \\"hi\\"\\nbye"} 1'
+    assert '\n' not in line
+
+
+def test_histogram_renders_escaped_labels_with_buckets():
+    histogram = Histogram('test_seconds', '測試', buckets=(1.0,))
+    histogram.observe(0.5, stage='pa"rse')
+    
+    lines = histogram.render()
+    
+    assert 'test_seconds_bucket{stage="pa\\"rse",le="1.0"} 1' in lines
+    assert 'test_seconds_bucket{stage="pa\\"rse",le="+Inf"} 1' in lines
+    assert 'test_seconds_count{stage="pa\\"rse"} 1' in lines
@@ -0,0 +1,57 @@
+from services.retrieval_service import RetrievalService
+
+
+def doc(name, score, embedding):
+    return {'name': name, 'score': score, 'embedding': embedding}
+
+
+CANDIDATES = [
+    doc('a', 0.95, [1.0, 0.0]),
+    doc('a-copy', 0.94, [0.99, 0.01]),
+    doc('b', 0.80, [0.0, 1.0])
+]
+
+
+def test_pure_relevance_follows_scores():
+    assert RetrievalService._mmr_select(CANDIDATES, 3, 1.0) == [0, 1, 2]
+
+
+def test_balanced_lambda_prefers_diverse_chunk_over_near_duplicate():
+    assert RetrievalService._mmr_select(CANDIDATES, 2, 0.5) == [0, 2]
+
+
+def test_selects_at_most_available_documents_without_repeats():
+    selected = RetrievalService._mmr_select(CANDIDATES, 10, 0.5)
+    
+    assert sorted(selected) == [0, 1, 2]
+
+
+def test_zero_vectors_do_not_break_selection():
+    documents = [doc('a', 0.9, [0.0, 0.0]), doc('b', 0.8, [1.0, 0.0])]
+    
+    assert RetrievalService._mmr_select(documents, 2, 0.5) == [0, 1]
+
+
+def test_input_embeddings_are_not_modified():
+    documents = [doc('a', 0.9, [3.0, 4.0]), doc('b', 0.8, [0.0, 2.0])]
+    
+    RetrievalService._mmr_select(documents, 2, 0.5)
+    
+    assert documents[0]['embedding'] == [3.0, 4.0]
+
+
+def test_rerank_uses_mmr_and_strips_embeddings(monkeypatch):
+    monkeypatch.setattr('services.retrieval_service.config.RERANK_MMR_LAMBDA', 0.5)
+    
+    reranked = RetrievalService.rerank('query', list(reversed(CANDIDATES)), top_n=2)
+    
+    assert [item['name'] for item in reranked] == ['a', 'b']
+    assert all('embedding' not in item for item in reranked)
+
+
+def test_rerank_without_embeddings_sorts_by_score():
+    documents = [{'name': 'low', 'score': 0.1}, {'name': 'high', 'score': 0.9}, {'name': 'mid', 'score': 0.5}]
+    
+    reranked = RetrievalService.rerank('query', documents, top_n=2)
+    
+    assert [item['name'] for item in reranked] == ['high', 'mid']
@@ -0,0 +1,64 @@
+import os
+import pytest
+from utils.parse_cache import ParsedTextCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """獨立於全局單例、上限極小的解析快取"""
+    monkeypatch.setattr(ParsedTextCache, '_instance', None)
+    monkeypatch.setattr(ParsedTextCache, '_initialized', False)
+    instance = ParsedTextCache()
+    instance._enabled = True
+    instance._cache_dir = str(tmp_path)
+    instance._max_bytes = 8 * 1024
+    instance._size_bytes = 0
+    return instance
+
+
+def write_entries(cache, count):
+    """寫入 count 筆約 2KB（壓縮後）的不可壓縮文本，返回快取鍵"""
+    keys = []
+    for _ in range(count):
+        key = ParsedTextCache.make_key(os.urandom(32).hex(), '1')
+        cache.put(key, os.urandom(1500).hex())
+        keys.append(key)
+    return keys
+
+
+def test_evict_keeps_running_total_under_limit(cache):
+    keys = write_entries(cache, 8)
+    
+    on_disk = sum(size for _, size, _ in cache._scan())
+    stats = cache.get_stats()
+    
+    assert stats['evictions'] > 0
+    assert stats['size_bytes'] == on_disk
+    assert on_disk <= cache._max_bytes
+    # 最新寫入的文件不應被淘汰
+    assert cache.get(keys[-1]) is not None
+
+
+def test_evict_scans_without_holding_stats_lock(cache, monkeypatch):
+    scan = cache._scan
+    held = []
+    
+    def checked_scan():
+        held.append(cache._lock.locked())
+        return scan()
+    
+    monkeypatch.setattr(cache, '_scan', checked_scan)
+    write_entries(cache, 8)
+    
+    assert held
+    assert not any(held)
+
+
+def test_scan_skips_in_flight_temp_files(cache):
+    key = write_entries(cache, 1)[0]
+    with open(f"{cache._path(key)}.123.tmp", 'wb') as file:
+        file.write(b'partial')
+    
+    paths = [path for path, _, _ in cache._scan()]
+    
+    assert paths == [cache._path(key)]
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+import pytest
+from utils.singleflight import SingleFlight
+
+
+def test_do_shares_result_between_concurrent_calls():
+    flight = SingleFlight('test-do-shared')
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'answer': 42}
+    
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', work)))
+    leader.start()
+    assert started.wait(5)
+    
+    follower = threading.Thread(target=lambda: results.append(flight.do('key', work)))
+    follower.start()
+    deadline = time.monotonic() + 5
+    while flight._requests.get(group='test-do-shared', role='follower') < 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    
+    assert calls == [1]
+    assert len(results) == 2
+    assert results[0] is results[1]
+    assert flight._calls == {}
+
+
+def test_do_propagates_error_and_forgets_key():
+    flight = SingleFlight('test')
+    
+    def fail():
+        raise RuntimeError('boom')
+    
+    with pytest.raises(RuntimeError):
+        flight.do('key', fail)
+    assert flight._calls == {}
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+
+def test_stream_replays_events_to_late_subscriber():
+    flight = SingleFlight('test')
+    release = threading.Event()
+    
+    def factory():
+        yield 'a'
+        release.wait(5)
+        yield 'b'
+    
+    first = flight.stream('key', factory)
+    assert next(first) == 'a'
+    second = flight.stream('key', lambda: iter(['unused']))
+    release.set()
+    
+    assert list(first) == ['b']
+    assert list(second) == ['a', 'b']
+
+
+def test_stream_raises_source_error_to_subscribers():
+    flight = SingleFlight('test')
+    
+    def factory():
+        yield 'a'
+        raise RuntimeError('boom')
+    
+    events = []
+    with pytest.raises(RuntimeError):
+        for event in flight.stream('key', factory):
+            events.append(event)
+    assert events == ['a']
+
+
+def test_stream_closes_source_when_all_subscribers_leave():
+    flight = SingleFlight('test')
+    closed = threading.Event()
+    
+    def factory():
+        try:
+            while True:
+                yield 'tick'
+        finally:
+            closed.set()
+    
+    subscriber = flight.stream('key', factory)
+    assert next(subscriber) == 'tick'
+    subscriber.close()
+    
+    assert closed.wait(5)
+    assert flight._streams == {}
+
+
+def test_do_async_shares_result_between_concurrent_calls():
+    flight = SingleFlight('test')
+    calls = []
+    
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'answer': 42}
+    
+    async def main():
+        return await asyncio.gather(flight.do_async('key', work), flight.do_async('key', work))
+    
+    first, second = asyncio.run(main())
+    assert calls == [1]
+    assert first is second
+    assert flight._async_calls == {}
+
+
+def test_do_async_cancelled_waiter_does_not_cancel_others():
+    flight = SingleFlight('test')
+    
+    async def work():
+        await asyncio.sleep(0.05)
+        return 'ok'
+    
+    async def main():
+        cancelled = asyncio.ensure_future(flight.do_async('key', work))
+        other = asyncio.ensure_future(flight.do_async('key', work))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await other
+    
+    assert asyncio.run(main()) == 'ok'
+
+
+def test_stream_async_replays_events_and_cancels_when_abandoned():
+    flight = SingleFlight('test')
+    closed = []
+    
+    async def factory():
+        try:
+            for index in range(100):
+                yield index
+                await asyncio.sleep(0.001)
+        finally:
+            closed.append(True)
+    
+    async def take(count):
+        events = []
+        async for event in flight.stream_async('key', factory):
+            events.append(event)
+            if len(events) == count:
+                break
+        return events
+    
+    async def main():
+        results = await asyncio.gather(take(3), take(5))
+        await asyncio.sleep(0.01)
+        return results
+    
+    first, second = asyncio.run(main())
+    assert first == [0, 1, 2]
+    assert second == [0, 1, 2, 3, 4]
+    assert closed == [True]
+    assert flight._async_streams == {}
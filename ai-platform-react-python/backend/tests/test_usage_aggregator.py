@@ -0,0 +1,66 @@
+import uuid
+from types import SimpleNamespace
+import pytest
+import services.usage_aggregator as usage_module
+from models.tenant import TenantCreate
+from services.chat_service import ChatService
+from services.tenant_service import TenantService
+from services.usage_aggregator import UsageAggregator
+from utils.db_manager import get_conversations_collection, get_usage_daily_collection
+
+
+@pytest.fixture
+def aggregator(monkeypatch):
+    monkeypatch.setattr(usage_module, 'atexit', SimpleNamespace(register=lambda func: None))
+    instance = object.__new__(UsageAggregator)
+    UsageAggregator.__init__(instance)
+    instance._interval = 3600
+    yield instance
+    instance._stop.set()
+
+
+@pytest.fixture
+def tenant_id():
+    return TenantService.create_tenant(TenantCreate(name=f"tenant-{uuid.uuid4().hex[:8]}"))['id']
+
+
+def test_flush_updates_tenant_conversation_and_daily_usage(aggregator, tenant_id):
+    conversation_id = ChatService.create_conversation(tenant_id, 'user')['id']
+    
+    aggregator.record(tenant_id, conversation_id, {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15})
+    aggregator.record(tenant_id, conversation_id, {'prompt_tokens': 1, 'completion_tokens': 2, 'total_tokens': 3})
+    
+    assert aggregator.flush() == 3
+    
+    expected = {'prompt_tokens': 11, 'completion_tokens': 7, 'total_tokens': 18, 'requests': 2}
+    assert TenantService.get_tenant(tenant_id)['token_usage'] == expected
+    assert get_conversations_collection().find_one({'_id': conversation_id})['token_usage'] == expected
+    
+    daily = aggregator.get_daily_usage(tenant_id)
+    assert len(daily) == 1
+    assert {field: daily[0][field] for field in expected} == expected
+    assert get_usage_daily_collection().count_documents({'tenant_id': tenant_id}) == 1
+
+
+def test_daily_usage_includes_unflushed_records(aggregator, tenant_id):
+    aggregator.record(tenant_id, None, {'total_tokens': 5})
+    aggregator.flush()
+    aggregator.record(tenant_id, None, {'total_tokens': 7})
+    
+    assert aggregator.get_daily_usage(tenant_id)[0]['total_tokens'] == 12
+    assert aggregator.get_daily_usage(tenant_id)[0]['requests'] == 2
+
+
+def test_failed_flush_keeps_usage_for_retry(aggregator, tenant_id, monkeypatch):
+    aggregator.record(tenant_id, None, {'total_tokens': 5})
+    get_tenants_collection = usage_module.get_tenants_collection
+    
+    def fail():
+        raise RuntimeError('db down')
+    
+    monkeypatch.setattr(usage_module, 'get_tenants_collection', fail)
+    assert aggregator.flush() == 0
+    
+    monkeypatch.setattr(usage_module, 'get_tenants_collection', get_tenants_collection)
+    assert aggregator.flush() == 2
+    assert TenantService.get_tenant(tenant_id)['token_usage']['total_tokens'] == 5
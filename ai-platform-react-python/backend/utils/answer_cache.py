@@ -0,0 +1,227 @@
+import time
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from pymongo import ReturnDocument
+from config import get_config
+from utils.db_manager import get_tenants_collection
+from utils.metrics import metrics
+from utils.logger import logger
+
+config = get_config()
+
+
+class _TenantAnswers:
+    """單一租戶的快取條目（向量矩陣與回答並列存放）"""
+    
+    def __init__(self, dimension: int):
+        self.matrix = np.empty((0, dimension), dtype=np.float32)
+        self.entries: List[Dict] = []
+        self.hits = 0
+        self.misses = 0
+        self.saved_tokens = 0
+
+
+class SemanticAnswerCache:
+    """語意回答快取（以查詢向量的餘弦相似度比對同租戶的近似問題）
+
+    條目存於各進程的記憶體；租戶知識庫版本保存在租戶文件的 kb_version，
+    任一 worker 索引或刪除文件時遞增，其他 worker 查詢時發現版本變更即清空本機條目。
+    """
+    
+    _instance = None
+    _initialized = False
+    
+    def __new__(cls):
+        """單例模式"""
+        if cls._instance is None:
+            cls._instance = super(SemanticAnswerCache, cls).__new__(cls)
+        return cls._instance
+    
+    def __init__(self):
+        """初始化快取設定"""
+        if not self._initialized:
+            self._enabled = config.ANSWER_CACHE_ENABLED
+            self._threshold = config.ANSWER_CACHE_THRESHOLD
+            self._max_entries = config.ANSWER_CACHE_MAX_ENTRIES
+            self._ttl = config.ANSWER_CACHE_TTL_SECONDS
+            self._tenants: Dict[str, _TenantAnswers] = {}
+            self._versions: Dict[str, int] = {}  # 本機條目所屬的知識庫版本
+            self._lock = threading.Lock()
+            
+            self._lookups = metrics.counter('answer_cache_lookups_total', '語意回答快取查詢次數')
+            self._saved_tokens = metrics.counter('answer_cache_saved_tokens_total', '語意回答快取命中節省的 token 數')
+            
+            if self._enabled:
+                logger.info(f"語意回答快取已啟用，相似度門檻 {self._threshold}")
+            
+            self._initialized = True
+    
+    @property
+    def enabled(self) -> bool:
+        """是否啟用快取"""
+        return self._enabled
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        """轉為單位向量，零向量返回 None"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+    
+    def _sync_version(self, tenant_id: str, version: int) -> None:
+        """資料庫中的版本較新時清空本機條目（需持有鎖）"""
+        if version <= self._versions.get(tenant_id, 0):
+            return
+        
+        self._versions[tenant_id] = version
+        tenant = self._tenants.get(tenant_id)
+        if tenant is not None:
+            tenant.matrix = tenant.matrix[:0]
+            tenant.entries = []
+    
+    def version(self, tenant_id: str) -> int:
+        """從租戶文件讀取知識庫版本並同步本機條目，寫入時用來丟棄失效前開始生成的回答"""
+        try:
+            tenant = get_tenants_collection().find_one({'_id': tenant_id}, {'kb_version': 1})
+            version = (tenant or {}).get('kb_version', 0)
+        except Exception as e:
+            logger.warning(f"讀取租戶 {tenant_id} 知識庫版本失敗，沿用本機版本: {e}")
+            with self._lock:
+                return self._versions.get(tenant_id, 0)
+        
+        with self._lock:
+            self._sync_version(tenant_id, version)
+            return self._versions.get(tenant_id, 0)
+    
+    def lookup(self, tenant_id: str, embedding: List[float]) -> Optional[Dict]:
+        """查詢近似問題的快取回答，命中返回 {'answer', 'sources', 'similarity', 'token_usage'}"""
+        if not self._enabled or not embedding:
+            return None
+        
+        query = self._normalize(embedding)
+        if query is None:
+            return None
+        
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                tenant = self._tenants[tenant_id] = _TenantAnswers(query.shape[0])
+            hit = None
+            
+            if tenant.entries and tenant.matrix.shape[1] == query.shape[0]:
+                similarities = tenant.matrix @ query
+                best = int(np.argmax(similarities))
+                entry = tenant.entries[best]
+                
+                if similarities[best] >= self._threshold and time.time() - entry['created_at'] <= self._ttl:
+                    hit = {
+                        'answer': entry['answer'],
+                        'sources': entry['sources'],
+                        'similarity': float(similarities[best]),
+                        'token_usage': entry['token_usage']
+                    }
+            
+            if hit:
+                tenant.hits += 1
+                tenant.saved_tokens += hit['token_usage'].get('total_tokens', 0)
+            else:
+                tenant.misses += 1
+        
+        self._lookups.inc(tenant=tenant_id, result='hit' if hit else 'miss')
+        if hit:
+            self._saved_tokens.inc(hit['token_usage'].get('total_tokens', 0), tenant=tenant_id)
+        return hit
+    
+    def store(
+        self,
+        tenant_id: str,
+        embedding: List[float],
+        answer: str,
+        sources: List[Dict],
+        token_usage: Dict,
+        version: int
+    ) -> bool:
+        """寫入回答；若生成期間知識庫已變更（版本不符）則不寫入"""
+        if not self._enabled or not embedding or not answer:
+            return False
+        
+        vector = self._normalize(embedding)
+        if vector is None:
+            return False
+        
+        with self._lock:
+            if self._versions.get(tenant_id, 0) != version:
+                return False
+            
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                tenant = self._tenants[tenant_id] = _TenantAnswers(vector.shape[0])
+            elif tenant.matrix.shape[1] != vector.shape[0]:
+                # 嵌入模型維度變更，舊條目已無法比對
+                tenant.matrix = np.empty((0, vector.shape[0]), dtype=np.float32)
+                tenant.entries = []
+            
+            tenant.matrix = np.vstack([tenant.matrix, vector])
+            tenant.entries.append({
+                'answer': answer,
+                'sources': sources,
+                'token_usage': token_usage,
+                'created_at': time.time()
+            })
+            
+            # 超出上限時淘汰最舊的條目
+            overflow = len(tenant.entries) - self._max_entries
+            if overflow > 0:
+                tenant.matrix = tenant.matrix[overflow:]
+                tenant.entries = tenant.entries[overflow:]
+        
+        return True
+    
+    def invalidate(self, tenant_id: str) -> None:
+        """租戶知識庫變更時遞增資料庫中的版本並清空本機快取（其他 worker 於下次查詢時清空）"""
+        try:
+            tenant = get_tenants_collection().find_one_and_update(
+                {'_id': tenant_id},
+                {'$inc': {'kb_version': 1}},
+                projection={'kb_version': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            version = (tenant or {}).get('kb_version')
+        except Exception as e:
+            logger.warning(f"更新租戶 {tenant_id} 知識庫版本失敗，只清空本機快取: {e}")
+            version = None
+        
+        with self._lock:
+            if version is None:
+                version = self._versions.get(tenant_id, 0) + 1
+            self._sync_version(tenant_id, version)
+        
+        if self._enabled:
+            logger.info(f"租戶 {tenant_id} 知識庫已變更，清空語意回答快取")
+    
+    def get_stats(self) -> Dict:
+        """各租戶快取條目數、命中率與節省的 token 數"""
+        with self._lock:
+            tenants = {}
+            for tenant_id, tenant in self._tenants.items():
+                lookups = tenant.hits + tenant.misses
+                tenants[tenant_id] = {
+                    'entries': len(tenant.entries),
+                    'hits': tenant.hits,
+                    'misses': tenant.misses,
+                    'hit_rate': round(tenant.hits / lookups, 4) if lookups else 0.0,
+                    'saved_tokens': tenant.saved_tokens
+                }
+        
+        return {
+            'enabled': self._enabled,
+            'threshold': self._threshold,
+            'tenants': tenants
+        }
+
+
+# 創建全局語意回答快取實例
+answer_cache = SemanticAnswerCache()
@@ -0,0 +1,55 @@
+from functools import wraps
+import jwt
+from quart import g, request, jsonify
+from config import get_config
+
+config = get_config()
+
+
+def _error(message: str, status: int):
+    """與 Flask 服務相同格式的錯誤回應"""
+    return jsonify({
+        'success': False,
+        'message': message
+    }), status
+
+
+def jwt_required_async(view):
+    """驗證 Flask-JWT-Extended 簽發的 access token（ASGI 服務用）
+
+    回應訊息與 Flask 服務的 JWT 錯誤處理一致，驗證通過後 claims 存於 g.jwt_claims。
+    """
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        if not auth_header.startswith('Bearer '):
+            return _error('缺少 Token', 401)
+        
+        try:
+            claims = jwt.decode(
+                auth_header[len('Bearer '):],
+                config.JWT_SECRET_KEY,
+                algorithms=['HS256']
+            )
+        except jwt.ExpiredSignatureError:
+            return _error('Token 已過期', 401)
+        except jwt.InvalidTokenError:
+            return _error('Token 無效', 401)
+        
+        if claims.get('type') != 'access':
+            return _error('Token 無效', 401)
+        
+        g.jwt_claims = claims
+        return await view(*args, **kwargs)
+    
+    return wrapper
+
+
+def get_jwt():
+    """獲取當前請求的 JWT claims"""
+    return g.jwt_claims
+
+
+def get_jwt_identity():
+    """獲取當前請求的用戶 ID"""
+    return g.jwt_claims.get('sub')
@@ -0,0 +1,63 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import get_config
+from utils.logger import logger
+
+config = get_config()
+
+
+class AsyncDatabaseManager:
+    """MongoDB 非同步資料庫管理器（供 ASGI 服務使用）"""
+    
+    _instance = None
+    _client = None
+    _db = None
+    
+    def __new__(cls):
+        """單例模式"""
+        if cls._instance is None:
+            cls._instance = super(AsyncDatabaseManager, cls).__new__(cls)
+        return cls._instance
+    
+    def _connect(self):
+        """首次使用時建立連接（Motor 會綁定到當下的事件迴圈）"""
+        if self._client is None:
+            self._client = AsyncIOMotorClient(
+                config.MONGODB_URI,
+                serverSelectionTimeoutMS=5000,
+                maxPoolSize=config.ASYNC_MONGODB_POOL_SIZE
+            )
+            self._db = self._client[config.MONGODB_DB_NAME]
+            logger.info(f"建立 MongoDB 非同步連接: {config.MONGODB_DB_NAME}")
+    
+    @property
+    def db(self):
+        """獲取資料庫實例"""
+        self._connect()
+        return self._db
+    
+    def get_collection(self, collection_name):
+        """獲取集合"""
+        return self.db[collection_name]
+    
+    def close(self):
+        """關閉資料庫連接"""
+        if self._client:
+            self._client.close()
+            self._client = None
+            self._db = None
+            logger.info("MongoDB 非同步連接已關閉")
+
+
+# 創建全局非同步資料庫管理器實例
+async_db_manager = AsyncDatabaseManager()
+
+
+# 常用集合
+def get_async_conversations_collection():
+    """獲取對話集合"""
+    return async_db_manager.get_collection('conversations')
+
+
+def get_async_messages_collection():
+    """獲取消息集合"""
+    return async_db_manager.get_collection('messages')
@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict
+from utils.metrics import metrics
+from utils.logger import logger
+from config import get_config
+
+config = get_config()
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 指標中的狀態數值
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，呼叫被直接拒絕"""
+
+
+class CircuitBreaker:
+    """斷路器：以滾動時間窗統計錯誤率與慢呼叫率
+
+    - closed：正常放行；窗口內呼叫數達 CIRCUIT_BREAKER_MIN_CALLS 且錯誤率或慢呼叫率超過門檻時開啟
+    - open：直接拒絕（CircuitOpenError），經過 CIRCUIT_BREAKER_OPEN_SECONDS 後進入半開
+    - half_open：只放行 CIRCUIT_BREAKER_HALF_OPEN_CALLS 個試探呼叫，全部成功則關閉，任一失敗則重新開啟；
+      試探呼叫超過 CIRCUIT_BREAKER_OPEN_SECONDS 仍未全部回報（例如呼叫端未呼叫 record）時視為失敗，重新開啟
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_opened_at = 0.0
+        self._calls = deque()  # (時間, 是否失敗, 是否過慢)
+        self._trials = 0
+        self._trial_successes = 0
+        
+        self._state_gauge = metrics.gauge('circuit_breaker_state', '斷路器狀態（0 closed、1 half_open、2 open）')
+        self._rejected = metrics.counter('circuit_breaker_rejected_total', '斷路器開啟時被拒絕的呼叫數')
+        self._transitions = metrics.counter('circuit_breaker_transitions_total', '斷路器狀態轉換次數')
+        self._state_gauge.set(0, name=name)
+    
+    def _transition(self, state: str) -> None:
+        """切換狀態（需持有鎖）"""
+        if state == self._state:
+            return
+        
+        logger.warning(f"斷路器 {self.name}: {self._state} -> {state}")
+        self._transitions.inc(name=self.name, state=state)
+        self._state_gauge.set(_STATE_VALUES[state], name=self.name)
+        self._state = state
+        
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._half_opened_at = time.monotonic()
+            self._trials = 0
+            self._trial_successes = 0
+        else:
+            self._calls.clear()
+    
+    def _prune(self, now: float) -> None:
+        """移除窗口外的記錄（需持有鎖）"""
+        while self._calls and now - self._calls[0][0] > config.CIRCUIT_BREAKER_WINDOW_SECONDS:
+            self._calls.popleft()
+    
+    def allow(self) -> bool:
+        """是否放行這次呼叫；放行後必須以 record 回報結果"""
+        if not config.CIRCUIT_BREAKER_ENABLED:
+            return True
+        
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= config.CIRCUIT_BREAKER_OPEN_SECONDS:
+                self._transition(HALF_OPEN)
+            
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN:
+                if self._trials < config.CIRCUIT_BREAKER_HALF_OPEN_CALLS:
+                    self._trials += 1
+                    return True
+                # 試探額度已用完且遲遲沒有結果，避免永遠卡在半開
+                if now - self._half_opened_at >= config.CIRCUIT_BREAKER_OPEN_SECONDS:
+                    logger.warning(f"斷路器 {self.name}: 試探呼叫逾時未回報")
+                    self._transition(OPEN)
+        
+        self._rejected.inc(name=self.name)
+        return False
+    
+    def record(self, success: bool, duration: float) -> None:
+        """回報呼叫結果與耗時"""
+        if not config.CIRCUIT_BREAKER_ENABLED:
+            return
+        
+        slow = duration >= config.CIRCUIT_BREAKER_SLOW_CALL_SECONDS
+        now = time.monotonic()
+        
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if not success or slow:
+                    self._transition(OPEN)
+                    return
+                self._trial_successes += 1
+                if self._trial_successes >= config.CIRCUIT_BREAKER_HALF_OPEN_CALLS:
+                    self._transition(CLOSED)
+                return
+            
+            if self._state == OPEN:
+                return
+            
+            self._calls.append((now, not success, slow))
+            self._prune(now)
+            
+            total = len(self._calls)
+            if total < config.CIRCUIT_BREAKER_MIN_CALLS:
+                return
+            
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+            if (
+                failures / total >= config.CIRCUIT_BREAKER_FAILURE_RATE
+                or slow_calls / total >= config.CIRCUIT_BREAKER_SLOW_CALL_RATE
+            ):
+                self._transition(OPEN)
+    
+    def call(self, func: Callable, *args, **kwargs):
+        """經由斷路器呼叫 func；開啟中時拋出 CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} 斷路器開啟中")
+        
+        started = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record(False, time.monotonic() - started)
+            raise
+        self.record(True, time.monotonic() - started)
+        return result
+    
+    def get_status(self) -> Dict:
+        """目前狀態與窗口統計"""
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            state = self._state
+            if state == OPEN and now - self._opened_at >= config.CIRCUIT_BREAKER_OPEN_SECONDS:
+                state = HALF_OPEN
+            
+            total = len(self._calls)
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, is_slow in self._calls if is_slow)
+            return {
+                'state': state,
+                'window_calls': total,
+                'error_rate': round(failures / total, 3) if total else 0.0,
+                'slow_call_rate': round(slow_calls / total, 3) if total else 0.0,
+                'open_for_seconds': round(now - self._opened_at, 1) if self._state == OPEN else None
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """獲取（必要時建立）指定名稱的斷路器"""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_breaker_states() -> Dict[str, Dict]:
+    """所有斷路器的狀態（健康檢查用）"""
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.get_status() for breaker in breakers}
+
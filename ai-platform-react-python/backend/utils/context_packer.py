@@ -0,0 +1,116 @@
+from typing import Dict, List, Optional, Tuple
+from utils.text_processor import TextProcessor
+from config import get_config
+
+config = get_config()
+
+# 判定為重疊的最短字元數，避免偶然相同的短字串被當成重疊
+MIN_OVERLAP_CHARS = 8
+
+# 剩餘預算低於此 token 數時不再截斷塞入片段
+MIN_PARTIAL_TOKENS = 50
+
+
+class ContextPacker:
+    """檢索結果打包：合併同文件相鄰片段、去除重疊文字，並依分數填入 token 預算"""
+    
+    @staticmethod
+    def _overlap_length(left: str, right: str, max_chars: int) -> int:
+        """left 結尾與 right 開頭重複的最長字元數"""
+        limit = min(len(left), len(right), max_chars)
+        for size in range(limit, MIN_OVERLAP_CHARS - 1, -1):
+            if left.endswith(right[:size]):
+                return size
+        return 0
+    
+    @staticmethod
+    def _merge_adjacent(docs: List[Dict]) -> List[Dict]:
+        """合併同文件中 chunk_index 連續的片段，重疊部分只保留一次"""
+        max_overlap = max(config.CHUNK_OVERLAP * 2, MIN_OVERLAP_CHARS)
+        
+        by_document: Dict[str, List[Dict]] = {}
+        for doc in docs:
+            by_document.setdefault(doc.get('document_id', ''), []).append(doc)
+        
+        merged = []
+        for document_id, group in by_document.items():
+            group.sort(key=lambda doc: doc.get('chunk_index', 0))
+            
+            current = None
+            for doc in group:
+                if (
+                    current is not None and document_id
+                    and doc.get('chunk_index', 0) == current['chunk_indices'][-1] + 1
+                ):
+                    overlap = ContextPacker._overlap_length(current['text'], doc['text'], max_overlap)
+                    separator = '' if overlap else '\n'
+                    current['text'] = current['text'] + separator + doc['text'][overlap:]
+                    current['score'] = max(current['score'], doc.get('score', 0.0))
+                    current['chunk_indices'].append(doc.get('chunk_index', 0))
+                    continue
+                
+                if current is not None:
+                    merged.append(current)
+                current = {**doc, 'score': doc.get('score', 0.0), 'chunk_indices': [doc.get('chunk_index', 0)]}
+            
+            if current is not None:
+                merged.append(current)
+        
+        return merged
+    
+    @staticmethod
+    def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+        """將文本截斷到 max_tokens 以內"""
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if TextProcessor.estimate_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+    
+    @staticmethod
+    def pack(docs: List[Dict], token_budget: Optional[int] = None) -> Tuple[List[Dict], Dict]:
+        """打包檢索結果，返回 (依分數排序的片段, 統計)
+
+        不修改傳入的片段（檢索結果可能由多個請求共用）。
+        """
+        if token_budget is None:
+            token_budget = config.CONTEXT_TOKEN_BUDGET
+        
+        tokens_before = sum(TextProcessor.estimate_tokens(doc.get('text', '')) for doc in docs)
+        
+        # 合併相鄰片段後，再去除內容完全相同的片段
+        seen = set()
+        candidates = []
+        for doc in ContextPacker._merge_adjacent(docs):
+            key = TextProcessor.normalize_query(doc.get('text', ''))
+            if key and key not in seen:
+                seen.add(key)
+                candidates.append(doc)
+        candidates.sort(key=lambda doc: doc['score'], reverse=True)
+        
+        # 依分數貪婪填入預算，放不下時截斷最後一個片段
+        packed = []
+        remaining = token_budget
+        for doc in candidates:
+            tokens = TextProcessor.estimate_tokens(doc['text'])
+            if tokens <= remaining:
+                packed.append(doc)
+                remaining -= tokens
+            elif remaining >= MIN_PARTIAL_TOKENS or not packed:
+                packed.append({**doc, 'text': ContextPacker._truncate_to_tokens(doc['text'], remaining), 'truncated': True})
+                remaining = 0
+            
+            if remaining <= 0:
+                break
+        
+        tokens_after = token_budget - remaining
+        return packed, {
+            'input_chunks': len(docs),
+            'packed_chunks': len(packed),
+            'tokens_before': tokens_before,
+            'tokens_after': tokens_after,
+            'tokens_saved': max(tokens_before - tokens_after, 0)
+        }
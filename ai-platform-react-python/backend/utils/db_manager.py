@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ASCENDING, DESCENDING
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from config import get_config
 from utils.logger import logger
@@ -78,6 +78,26 @@ def get_documents_collection():
     return db_manager.get_collection('documents')
 
 
+def get_ingestion_batches_collection():
+    """獲取批次上傳集合"""
+    return db_manager.get_collection('ingestion_batches')
+
+
+def get_document_checkpoints_collection():
+    """獲取文件處理檢查點集合"""
+    return db_manager.get_collection('document_checkpoints')
+
+
+def get_checkpoint_chunks_collection():
+    """獲取檢查點分塊集合"""
+    return db_manager.get_collection('document_checkpoint_chunks')
+
+
+def get_checkpoint_vectors_collection():
+    """獲取檢查點向量集合"""
+    return db_manager.get_collection('document_checkpoint_vectors')
+
+
 def get_conversations_collection():
     """獲取對話集合"""
     return db_manager.get_collection('conversations')
@@ -88,6 +108,34 @@ def get_messages_collection():
     return db_manager.get_collection('messages')
 
 
+def get_usage_daily_collection():
+    """獲取每日用量彙總集合"""
+    return db_manager.get_collection('usage_daily')
+
+
 def get_model_providers_collection():
     """獲取模型提供者集合"""
     return db_manager.get_collection('model_providers')
+
+
+def get_rag_corpora_collection():
+    """獲取租戶 RAG Corpus 登記集合"""
+    return db_manager.get_collection('rag_corpora')
+
+
+def ensure_indexes():
+    """建立常用查詢所需的索引"""
+    try:
+        get_documents_collection().create_index([('status', ASCENDING), ('updated_at', ASCENDING)])
+        get_documents_collection().create_index([('rag_status', ASCENDING), ('tenant_id', ASCENDING)], sparse=True)
+        get_checkpoint_chunks_collection().create_index([('document_id', ASCENDING), ('start', ASCENDING)])
+        get_checkpoint_vectors_collection().create_index([('document_id', ASCENDING), ('start', ASCENDING)])
+        get_messages_collection().create_index([('conversation_id', ASCENDING), ('timestamp', ASCENDING)])
+        get_conversations_collection().create_index([
+            ('tenant_id', ASCENDING), ('user_id', ASCENDING), ('updated_at', DESCENDING), ('_id', DESCENDING)
+        ])
+        get_usage_daily_collection().create_index([('tenant_id', ASCENDING), ('date', ASCENDING)])
+        get_rag_corpora_collection().create_index([('tenant_id', ASCENDING)], unique=True)
+        logger.info("資料庫索引已確認")
+    except Exception as e:
+        logger.error(f"建立資料庫索引失敗: {e}")
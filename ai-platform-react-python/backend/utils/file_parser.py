@@ -1,13 +1,29 @@
 import os
-from typing import List
+import csv
+import codecs
+from typing import List, Iterator, Optional
 import PyPDF2
 import docx
+import openpyxl
+from config import get_config
 from utils.logger import logger
+from utils.parse_cache import parse_cache
+
+config = get_config()
+
+# 偵測 CSV 編碼時讀取的開頭位元組數
+CSV_ENCODING_SAMPLE_SIZE = 64 * 1024
 
 
 class FileParser:
     """文件解析器"""
     
+    # 以列串流方式處理的表格類型
+    TABULAR_EXTENSIONS = ('.csv', '.xlsx')
+    
+    # 解析器版本：解析邏輯變更時遞增，使舊的解析快取失效
+    PARSER_VERSION = '1'
+    
     @staticmethod
     def parse_pdf(file_path: str) -> str:
         """解析 PDF 文件"""
@@ -52,7 +68,143 @@ class FileParser:
             return ""
     
     @staticmethod
-    def parse_file(file_path: str) -> str:
+    def is_tabular(file_path: str) -> bool:
+        """是否為表格文件（CSV / XLSX）"""
+        return os.path.splitext(file_path)[1].lower() in FileParser.TABULAR_EXTENSIONS
+    
+    @staticmethod
+    def _detect_csv_encoding(file_path: str) -> str:
+        """偵測 CSV 編碼（僅讀取文件開頭；以增量解碼容許樣本結尾截斷的多位元組字元）"""
+        with open(file_path, 'rb') as file:
+            head = file.read(CSV_ENCODING_SAMPLE_SIZE)
+        
+        for encoding in ('utf-8-sig', 'gbk'):
+            try:
+                codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+                return encoding
+            except UnicodeDecodeError:
+                continue
+        return 'latin-1'
+    
+    @staticmethod
+    def iter_csv_rows(file_path: str) -> Iterator[tuple]:
+        """逐列讀取 CSV，產生 (工作表名稱, 列號, 列值)"""
+        encoding = FileParser._detect_csv_encoding(file_path)
+        with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as file:
+            for row_number, row in enumerate(csv.reader(file), start=1):
+                yield '', row_number, row
+    
+    @staticmethod
+    def iter_xlsx_rows(file_path: str) -> Iterator[tuple]:
+        """以唯讀模式逐列讀取 XLSX，產生 (工作表名稱, 列號, 列值)"""
+        workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                for row_number, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                    yield sheet.title, row_number, row
+        finally:
+            workbook.close()
+    
+    @staticmethod
+    def iter_table_chunks(file_path: str, chunk_size: Optional[int] = None) -> Iterator[dict]:
+        """將表格列串流組合為文本塊，每列帶上欄位名稱，並在元數據中記錄列範圍"""
+        if chunk_size is None:
+            chunk_size = config.CHUNK_SIZE
+        
+        if os.path.splitext(file_path)[1].lower() == '.csv':
+            rows = FileParser.iter_csv_rows(file_path)
+        else:
+            rows = FileParser.iter_xlsx_rows(file_path)
+        
+        headers = None
+        current_sheet = None
+        lines = []
+        length = 0
+        row_start = row_end = 0
+        
+        def build_chunk():
+            prefix = f"[{current_sheet}]\n" if current_sheet else ""
+            text = prefix + "\n".join(lines)
+            return {
+                'text': text,
+                'length': len(text),
+                'metadata': {
+                    'sheet': current_sheet,
+                    'row_start': row_start,
+                    'row_end': row_end
+                }
+            }
+        
+        for sheet, row_number, row in rows:
+            values = ['' if cell is None else str(cell).strip() for cell in row]
+            if not any(values):
+                continue
+            
+            # 換工作表時輸出目前的塊並重新讀取表頭
+            if sheet != current_sheet:
+                if lines:
+                    yield build_chunk()
+                current_sheet = sheet
+                headers = None
+                lines, length = [], 0
+            
+            # 每個工作表的第一個非空列視為表頭
+            if headers is None:
+                headers = [value or f"欄位{i + 1}" for i, value in enumerate(values)]
+                continue
+            
+            line = "; ".join(
+                f"{headers[i] if i < len(headers) else f'欄位{i + 1}'}: {value}"
+                for i, value in enumerate(values) if value
+            )
+            
+            if lines and length + len(line) > chunk_size:
+                yield build_chunk()
+                lines, length = [], 0
+            
+            if not lines:
+                row_start = row_number
+            lines.append(line)
+            length += len(line) + 1
+            row_end = row_number
+        
+        if lines:
+            yield build_chunk()
+    
+    @staticmethod
+    def parse_table(file_path: str) -> str:
+        """解析 CSV / XLSX 文件為完整文本（大型文件請改用 iter_table_chunks）"""
+        try:
+            return "\n".join(chunk['text'] for chunk in FileParser.iter_table_chunks(file_path))
+        except Exception as e:
+            logger.error(f"解析表格失敗: {e}")
+            return ""
+    
+    @staticmethod
+    def parse_file(file_path: str, content_hash: Optional[str] = None, use_cache: bool = True) -> str:
+        """根據文件類型自動解析（優先讀取解析快取）"""
+        if not use_cache or not parse_cache.enabled:
+            return FileParser._parse_uncached(file_path)
+        
+        try:
+            if content_hash is None:
+                content_hash = parse_cache.file_sha256(file_path)
+        except OSError as e:
+            logger.warning(f"計算文件雜湊失敗，略過快取: {e}")
+            return FileParser._parse_uncached(file_path)
+        
+        cache_key = parse_cache.make_key(content_hash, FileParser.PARSER_VERSION)
+        text = parse_cache.get(cache_key)
+        if text is not None:
+            logger.info(f"解析快取命中: {os.path.basename(file_path)}")
+            return text
+        
+        text = FileParser._parse_uncached(file_path)
+        parse_cache.put(cache_key, text)
+        return text
+    
+    @staticmethod
+    def _parse_uncached(file_path: str) -> str:
         """根據文件類型自動解析"""
         file_ext = os.path.splitext(file_path)[1].lower()
         
@@ -62,10 +214,25 @@ class FileParser:
             return FileParser.parse_docx(file_path)
         elif file_ext in ['.txt', '.md']:
             return FileParser.parse_txt(file_path)
+        elif file_ext in FileParser.TABULAR_EXTENSIONS:
+            return FileParser.parse_table(file_path)
         else:
             logger.warning(f"不支援的文件類型: {file_ext}")
             return ""
     
+    @staticmethod
+    def count_pages(file_path: str) -> int:
+        """獲取頁數（僅 PDF，其他類型返回 0）"""
+        if os.path.splitext(file_path)[1].lower() != '.pdf':
+            return 0
+        
+        try:
+            with open(file_path, 'rb') as file:
+                return len(PyPDF2.PdfReader(file).pages)
+        except Exception as e:
+            logger.warning(f"讀取 PDF 頁數失敗: {e}")
+            return 0
+    
     @staticmethod
     def get_file_info(file_path: str) -> dict:
         """獲取文件資訊"""
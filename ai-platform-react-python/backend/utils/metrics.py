@@ -0,0 +1,201 @@
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# 預設直方圖邊界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """計算百分位數（線性插值），q 介於 0~100"""
+    if not values:
+        return 0.0
+    
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100.0
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return float(ordered[int(rank)])
+    return float(ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower))
+
+
+def _escape_label_value(value) -> str:
+    """依 Prometheus 文字格式跳脫標籤值中的反斜線、雙引號與換行"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    """格式化 Prometheus 標籤"""
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label_value(value)}"' for key, value in pairs) + '}'
+
+
+class Counter:
+    """計數器指標"""
+    
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, value: float = 1, **labels) -> None:
+        """增加計數"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+    
+    def get(self, **labels) -> float:
+        """讀取計數"""
+        return self._values.get(tuple(sorted(labels.items())), 0)
+    
+    def render(self) -> List[str]:
+        """輸出 Prometheus 文字格式"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """量測值指標"""
+    
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+    
+    def set(self, value: float, **labels) -> None:
+        """設定數值"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+    
+    def render(self) -> List[str]:
+        """輸出 Prometheus 文字格式"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """直方圖指標"""
+    
+    def __init__(self, name: str, description: str, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, dict] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels) -> None:
+        """記錄一次觀測值"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._series[key] = series
+            
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+    
+    def render(self) -> List[str]:
+        """輸出 Prometheus 文字格式"""
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', str(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series['count']}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """進程內指標註冊表"""
+    
+    _instance = None
+    
+    def __new__(cls):
+        """單例模式"""
+        if cls._instance is None:
+            cls._instance = super(MetricsRegistry, cls).__new__(cls)
+            cls._instance._metrics = {}
+            cls._instance._lock = threading.Lock()
+        return cls._instance
+    
+    def _get_or_create(self, name: str, factory):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = factory()
+            return self._metrics[name]
+    
+    def counter(self, name: str, description: str = '') -> Counter:
+        """獲取或創建計數器"""
+        return self._get_or_create(name, lambda: Counter(name, description))
+    
+    def gauge(self, name: str, description: str = '') -> Gauge:
+        """獲取或創建量測值"""
+        return self._get_or_create(name, lambda: Gauge(name, description))
+    
+    def histogram(self, name: str, description: str = '', buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        """獲取或創建直方圖"""
+        return self._get_or_create(name, lambda: Histogram(name, description, buckets))
+    
+    def render_prometheus(self) -> str:
+        """輸出所有指標的 Prometheus 文字格式"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class StageRecorder:
+    """記錄單次處理各階段耗時（毫秒）與計數"""
+    
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+        self._started = time.perf_counter()
+    
+    @contextmanager
+    def stage(self, name: str):
+        """計時一個階段（同名階段累加）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+    
+    def count(self, name: str, value: int = 1) -> None:
+        """累加計數"""
+        self.counters[name] = self.counters.get(name, 0) + value
+    
+    def to_dict(self) -> dict:
+        """轉換為可存入資料庫的字典"""
+        return {
+            'stages_ms': {name: round(value, 2) for name, value in self.stages.items()},
+            'counters': dict(self.counters),
+            'total_ms': round((time.perf_counter() - self._started) * 1000, 2)
+        }
+
+
+# 創建全局指標註冊表實例
+metrics = MetricsRegistry()
@@ -0,0 +1,59 @@
+from datetime import datetime
+from bson import ObjectId
+from utils.db_manager import get_conversations_collection, get_messages_collection, ensure_indexes
+from utils.logger import logger
+
+
+def migrate_conversation_messages(batch_size: int = 100) -> int:
+    """將對話文檔內嵌的 messages 陣列遷移到 messages 集合（可重複執行）"""
+    ensure_indexes()
+    
+    conversations_collection = get_conversations_collection()
+    messages_collection = get_messages_collection()
+    migrated = 0
+    
+    cursor = conversations_collection.find(
+        {'messages.0': {'$exists': True}},
+        {'tenant_id': 1, 'messages': 1}
+    ).batch_size(batch_size)
+    
+    for conv in cursor:
+        conv_id = str(conv['_id'])
+        
+        # 先清除上次中斷時可能已寫入的部分遷移消息，確保可重複執行
+        messages_collection.delete_many({'conversation_id': conv_id, 'migrated': True})
+        
+        docs = []
+        for message in conv['messages']:
+            doc = dict(message)
+            doc['_id'] = str(ObjectId())
+            doc['conversation_id'] = conv_id
+            doc['tenant_id'] = conv.get('tenant_id')
+            doc['timestamp'] = doc.get('timestamp') or datetime.utcnow()
+            doc['migrated'] = True
+            docs.append(doc)
+        
+        messages_collection.insert_many(docs)
+        
+        last_message = conv['messages'][-1]
+        conversations_collection.update_one(
+            {'_id': conv['_id']},
+            {
+                '$set': {
+                    'message_count': len(docs),
+                    'last_message_preview': (last_message.get('content') or '')[:100]
+                },
+                '$unset': {'messages': ''}
+            }
+        )
+        migrated += 1
+        
+        if migrated % batch_size == 0:
+            logger.info(f"已遷移 {migrated} 個對話")
+    
+    logger.info(f"對話消息遷移完成，共 {migrated} 個對話")
+    return migrated
+
+
+if __name__ == '__main__':
+    migrate_conversation_messages()
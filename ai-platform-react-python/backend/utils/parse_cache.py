@@ -0,0 +1,179 @@
+import os
+import zlib
+import hashlib
+import threading
+from typing import Optional
+from config import get_config
+from utils.logger import logger
+
+config = get_config()
+
+
+class ParsedTextCache:
+    """解析文本快取（以文件內容 SHA-256 與解析器版本為鍵，zlib 壓縮存於磁碟）"""
+    
+    _instance = None
+    _initialized = False
+    
+    def __new__(cls):
+        """單例模式"""
+        if cls._instance is None:
+            cls._instance = super(ParsedTextCache, cls).__new__(cls)
+        return cls._instance
+    
+    def __init__(self):
+        """初始化快取目錄與統計"""
+        if not self._initialized:
+            self._enabled = config.PARSE_CACHE_ENABLED
+            self._cache_dir = config.PARSE_CACHE_DIR
+            self._max_bytes = config.PARSE_CACHE_MAX_MB * 1024 * 1024
+            self._lock = threading.Lock()
+            self._evict_lock = threading.Lock()
+            self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+            self._size_bytes = 0
+            
+            if self._enabled:
+                os.makedirs(self._cache_dir, exist_ok=True)
+                self._size_bytes = sum(size for _, size, _ in self._scan())
+                logger.info(f"解析文本快取初始化成功: {self._cache_dir}，目前大小 {self._size_bytes / 1024 / 1024:.1f}MB")
+            
+            self._initialized = True
+    
+    @property
+    def enabled(self) -> bool:
+        """是否啟用快取"""
+        return self._enabled
+    
+    @staticmethod
+    def file_sha256(file_path: str) -> str:
+        """計算文件內容的 SHA-256"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @staticmethod
+    def make_key(content_hash: str, parser_version: str) -> str:
+        """組合快取鍵"""
+        return f"{content_hash}_v{parser_version}"
+    
+    def _path(self, key: str) -> str:
+        """快取鍵對應的文件路徑（以雜湊前兩碼分目錄）"""
+        return os.path.join(self._cache_dir, key[:2], f"{key}.txt.z")
+    
+    def _scan(self) -> list:
+        """列出所有快取文件 (路徑, 大小, 最後使用時間)"""
+        entries = []
+        for root, _, files in os.walk(self._cache_dir):
+            for name in files:
+                # 略過其他執行緒尚未完成的暫存檔
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    entries.append((path, stat.st_size, stat.st_mtime))
+                except OSError:
+                    continue
+        return entries
+    
+    def get(self, key: str) -> Optional[str]:
+        """讀取快取文本，未命中時返回 None"""
+        if not self._enabled:
+            return None
+        
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                text = zlib.decompress(file.read()).decode('utf-8')
+            # 更新使用時間，供 LRU 淘汰使用
+            os.utime(path, None)
+            with self._lock:
+                self._stats['hits'] += 1
+            return text
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"讀取解析快取失敗 {key}: {e}")
+        
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+    
+    def put(self, key: str, text: str) -> None:
+        """寫入快取文本"""
+        if not self._enabled or not text:
+            return
+        
+        path = self._path(key)
+        try:
+            data = zlib.compress(text.encode('utf-8'), 6)
+            if len(data) > self._max_bytes:
+                return
+            
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(data)
+            
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            
+            with self._lock:
+                self._stats['writes'] += 1
+                self._size_bytes += len(data) - previous_size
+                over_limit = self._size_bytes > self._max_bytes
+            
+            if over_limit:
+                self._evict()
+        except Exception as e:
+            logger.warning(f"寫入解析快取失敗 {key}: {e}")
+    
+    def _evict(self) -> None:
+        """依最後使用時間淘汰，直到低於上限的 90%（掃描與刪除皆不持有統計鎖）"""
+        # 同一時間只需一個執行緒淘汰，其餘寫入直接返回
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        
+        try:
+            entries = sorted(self._scan(), key=lambda entry: entry[2])
+            with self._lock:
+                excess = self._size_bytes - int(self._max_bytes * 0.9)
+            
+            freed = 0
+            evicted = 0
+            for path, size, _ in entries:
+                if freed >= excess:
+                    break
+                try:
+                    os.remove(path)
+                    freed += size
+                    evicted += 1
+                except OSError:
+                    continue
+            
+            with self._lock:
+                self._size_bytes -= freed
+                self._stats['evictions'] += evicted
+        finally:
+            self._evict_lock.release()
+    
+    def get_stats(self) -> dict:
+        """獲取快取統計"""
+        with self._lock:
+            stats = dict(self._stats)
+            size_bytes = self._size_bytes
+        
+        lookups = stats['hits'] + stats['misses']
+        stats.update({
+            'enabled': self._enabled,
+            'hit_rate': stats['hits'] / lookups if lookups else 0.0,
+            'size_bytes': size_bytes,
+            'max_bytes': self._max_bytes
+        })
+        return stats
+
+
+# 創建全局解析文本快取實例
+parse_cache = ParsedTextCache()
@@ -0,0 +1,33 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """令牌桶限速器（執行緒安全）：平均每秒 rate 次，最多累積 burst 次"""
+    
+    def __init__(self, rate: float, burst: int = 1):
+        self._rate = rate
+        self._capacity = max(burst, 1)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> float:
+        """取得一個令牌，不足時阻塞等待，返回等待秒數；rate <= 0 表示不限速"""
+        if self._rate <= 0:
+            return 0.0
+        
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self._rate
+            
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,246 @@
+import asyncio
+import threading
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Generator, Hashable, List, Optional
+from utils.metrics import metrics
+from utils.logger import logger
+
+
+class _Call:
+    """進行中的一次呼叫"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class _StreamFlight:
+    """進行中的一次串流：事件依序保存，所有訂閱者從頭重播同一份串流"""
+    
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.events: List[Any] = []
+        self.subscribers = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class _AsyncStreamFlight:
+    """進行中的一次非同步串流（只在事件迴圈執行緒中存取，不需加鎖）"""
+    
+    def __init__(self):
+        self.events: List[Any] = []
+        self.subscribers = 0
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Event()
+    
+    def notify(self) -> None:
+        """喚醒等待新事件的訂閱者"""
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class SingleFlight:
+    """合併相同鍵的並行請求：只有第一個請求（leader）實際執行，其餘請求等待並共用結果
+
+    共用的結果是同一個物件，呼叫端應視為唯讀。
+    do/stream 供執行緒使用；do_async/stream_async 供 ASGI 事件迴圈使用，只合併同一事件迴圈內的請求。
+    """
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _StreamFlight] = {}
+        self._async_calls: Dict[Hashable, asyncio.Task] = {}
+        self._async_streams: Dict[Hashable, _AsyncStreamFlight] = {}
+        self._requests = metrics.counter('singleflight_requests_total', '合併請求次數（role=leader 實際執行、follower 共用結果）')
+    
+    def do(self, key: Hashable, func: Callable, *args, **kwargs):
+        """執行 func，或等待相同鍵的進行中呼叫並返回其結果（含例外）"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        
+        self._requests.inc(group=self._name, role='leader' if leader else 'follower')
+        
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+    
+    def stream(self, key: Hashable, factory: Callable[[], Generator]) -> Generator:
+        """訂閱相同鍵的進行中串流；沒有時以 factory 建立並在背景執行緒產生事件
+
+        所有訂閱者都離開時停止產生並關閉來源串流。
+        """
+        with self._lock:
+            flight = self._streams.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._streams[key] = _StreamFlight()
+            with flight.cond:
+                flight.subscribers += 1
+        
+        self._requests.inc(group=self._name, role='leader' if leader else 'follower')
+        
+        if leader:
+            threading.Thread(
+                target=self._produce,
+                args=(key, flight, factory),
+                name=f'singleflight-{self._name}',
+                daemon=True
+            ).start()
+        
+        return self._subscribe(flight)
+    
+    def _produce(self, key: Hashable, flight: _StreamFlight, factory: Callable[[], Generator]) -> None:
+        """執行來源串流並廣播事件"""
+        source = None
+        try:
+            source = factory()
+            for event in source:
+                with flight.cond:
+                    flight.events.append(event)
+                    flight.cond.notify_all()
+                    abandoned = flight.subscribers == 0
+                
+                if abandoned and self._abandon(key, flight):
+                    logger.info(f"串流訂閱者皆已離開，停止生成: {self._name}")
+                    break
+        except Exception as e:
+            flight.error = e
+        finally:
+            if source is not None:
+                source.close()
+            with self._lock:
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+    
+    def _abandon(self, key: Hashable, flight: _StreamFlight) -> bool:
+        """確認沒有訂閱者後移除串流，避免新訂閱者加入一個即將中止的串流"""
+        with self._lock:
+            with flight.cond:
+                if flight.subscribers > 0:
+                    return False
+                if self._streams.get(key) is flight:
+                    del self._streams[key]
+                return True
+    
+    @staticmethod
+    def _subscribe(flight: _StreamFlight) -> Generator:
+        """從頭依序讀取串流事件"""
+        index = 0
+        try:
+            while True:
+                with flight.cond:
+                    while index >= len(flight.events) and not flight.done:
+                        flight.cond.wait()
+                    pending = flight.events[index:]
+                    index += len(pending)
+                    finished = flight.done and index >= len(flight.events)
+                
+                for event in pending:
+                    yield event
+                
+                if finished:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            with flight.cond:
+                flight.subscribers -= 1
+    
+    async def do_async(self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs):
+        """do 的非同步版本，func 為協程函式；呼叫在獨立的 Task 中執行，單一等待者被取消不影響其他等待者"""
+        task = self._async_calls.get(key)
+        leader = task is None
+        if leader:
+            task = self._async_calls[key] = asyncio.ensure_future(func(*args, **kwargs))
+            
+            def forget(finished):
+                if self._async_calls.get(key) is finished:
+                    del self._async_calls[key]
+                # 等待者都已取消時仍取出例外，避免 "exception was never retrieved" 警告
+                if not finished.cancelled():
+                    finished.exception()
+            
+            task.add_done_callback(forget)
+        
+        self._requests.inc(group=self._name, role='leader' if leader else 'follower')
+        return await asyncio.shield(task)
+    
+    async def stream_async(self, key: Hashable, factory: Callable[[], AsyncGenerator]) -> AsyncGenerator:
+        """stream 的非同步版本：訂閱相同鍵的進行中串流，沒有時以 factory 建立並在背景 Task 產生事件
+
+        所有訂閱者都離開時取消背景 Task 並關閉來源串流。
+        """
+        flight = self._async_streams.get(key)
+        leader = flight is None
+        if leader:
+            flight = self._async_streams[key] = _AsyncStreamFlight()
+            flight.task = asyncio.ensure_future(self._produce_async(key, flight, factory))
+        flight.subscribers += 1
+        
+        self._requests.inc(group=self._name, role='leader' if leader else 'follower')
+        
+        index = 0
+        try:
+            while True:
+                if index >= len(flight.events) and not flight.done:
+                    await flight.changed.wait()
+                    continue
+                
+                pending = flight.events[index:]
+                index += len(pending)
+                for event in pending:
+                    yield event
+                
+                if flight.done and index >= len(flight.events):
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                logger.info(f"串流訂閱者皆已離開，停止生成: {self._name}")
+                if self._async_streams.get(key) is flight:
+                    del self._async_streams[key]
+                flight.task.cancel()
+    
+    async def _produce_async(self, key: Hashable, flight: _AsyncStreamFlight, factory: Callable[[], AsyncGenerator]) -> None:
+        """執行來源串流並廣播事件"""
+        source = None
+        try:
+            source = factory()
+            async for event in source:
+                flight.events.append(event)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            if source is not None:
+                await source.aclose()
+            if self._async_streams.get(key) is flight:
+                del self._async_streams[key]
+            flight.done = True
+            flight.notify()
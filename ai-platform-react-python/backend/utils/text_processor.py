@@ -1,10 +1,13 @@
 import re
+import unicodedata
 from typing import List
 from langdetect import detect
 from config import get_config
 
 config = get_config()
 
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3040-\u30ff\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
 
 class TextProcessor:
     """文本處理工具"""
@@ -84,6 +87,20 @@ class TextProcessor:
         
         return chunks
     
+    @staticmethod
+    def normalize_query(text: str) -> str:
+        """正規化查詢（全半形統一、小寫、合併空白），用於比對相同問題"""
+        text = unicodedata.normalize('NFKC', text or '')
+        return re.sub(r'\s+', ' ', text).strip().lower()
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """快速估算 token 數（CJK 字元約 1 token，其他字元約 4 字元 1 token），不呼叫 tokenizer"""
+        if not text:
+            return 0
+        cjk = len(_CJK_PATTERN.findall(text))
+        return cjk + (len(text) - cjk + 3) // 4
+    
     @staticmethod
     def extract_keywords(text: str, top_n: int = 5) -> List[str]:
         """提取關鍵詞（簡單版本）"""
@@ -4,15 +4,26 @@ from typing import List, Dict
 from config import get_config
 from utils.logger import logger
 import json
+import threading
 
 config = get_config()
 
 
+class SearchHit:
+    """搜尋結果（類似 Milvus 的結果格式）"""
+    
+    def __init__(self, data):
+        self.id = data['id']
+        self.score = data['score']
+        self.entity = data['entity']
+
+
 class VectorStoreManager:
     """Vertex AI Vector Search 管理器"""
     
     _instance = None
     _initialized = False
+    _lock = threading.Lock()  # 匯入管線會從多個執行緒寫入
     
     def __new__(cls):
         """單例模式"""
@@ -23,9 +34,13 @@ class VectorStoreManager:
     def __init__(self):
         """初始化連接"""
         if not self._initialized:
+            # 儲存向量數據到內存（簡化版本）
+            # 生產環境應該使用 Vertex AI Matching Engine
+            self._vector_store = {}  # {tenant_id: [{id, embedding, text, ...}]}
+            
             try:
                 if not config.GOOGLE_API_KEY or not config.GOOGLE_PROJECT_ID:
-                    logger.warning("未配置 Google Cloud，向量搜尋功能將不可用")
+                    logger.warning("未配置 Google Cloud，向量搜尋使用內存存儲")
                     return
                 
                 # 初始化 Vertex AI
@@ -37,14 +52,9 @@ class VectorStoreManager:
                 self._initialized = True
                 logger.info(f"Vertex AI Vector Search 初始化成功")
                 
-                # 儲存向量數據到內存（簡化版本）
-                # 生產環境應該使用 Vertex AI Matching Engine
-                self._vector_store = {}  # {tenant_id: [{id, embedding, text, ...}]}
-                
             except Exception as e:
                 logger.error(f"Vertex AI 初始化失敗: {e}")
                 logger.warning("向量搜尋功能將使用簡化的內存存儲")
-                self._vector_store = {}
     
     def get_collection_name(self, tenant_id):
         """獲取租戶專屬集合名稱"""
@@ -70,21 +80,22 @@ class VectorStoreManager:
     def insert_vectors(self, tenant_id, ids, embeddings, texts, document_ids, chunk_indices, metadata_list):
         """插入向量數據"""
         try:
-            if tenant_id not in self._vector_store:
-                self.create_collection(tenant_id)
-            
-            collection = self._vector_store[tenant_id]
-            
-            for i in range(len(ids)):
-                vector_data = {
-                    'id': ids[i],
-                    'embedding': embeddings[i],
-                    'text': texts[i],
-                    'document_id': document_ids[i],
-                    'chunk_index': chunk_indices[i],
-                    'metadata': metadata_list[i] if i < len(metadata_list) else '{}'
-                }
-                collection.append(vector_data)
+            with self._lock:
+                if tenant_id not in self._vector_store:
+                    self.create_collection(tenant_id)
+                
+                collection = self._vector_store[tenant_id]
+                
+                for i in range(len(ids)):
+                    vector_data = {
+                        'id': ids[i],
+                        'embedding': embeddings[i],
+                        'text': texts[i],
+                        'document_id': document_ids[i],
+                        'chunk_index': chunk_indices[i],
+                        'metadata': metadata_list[i] if i < len(metadata_list) else '{}'
+                    }
+                    collection.append(vector_data)
             
             logger.info(f"成功插入 {len(ids)} 條向量數據到租戶 {tenant_id}")
             return True
@@ -93,7 +104,7 @@ class VectorStoreManager:
             return False
     
     def search(self, tenant_id, query_embedding, top_k=5, filter_expr=None):
-        """搜尋相似向量"""
+        """搜尋相似向量（結果附帶片段向量，供重排序計算片段間相似度）"""
         try:
             if tenant_id not in self._vector_store:
                 logger.warning(f"租戶 {tenant_id} 的向量集合不存在")
@@ -116,7 +127,8 @@ class VectorStoreManager:
                         'text': vec_data['text'],
                         'document_id': vec_data['document_id'],
                         'chunk_index': vec_data['chunk_index'],
-                        'metadata': vec_data.get('metadata', '{}')
+                        'metadata': vec_data.get('metadata', '{}'),
+                        'embedding': vec_data['embedding']
                     }
                 })
             
@@ -125,17 +137,52 @@ class VectorStoreManager:
             top_results = results[:top_k]
             
             # 轉換為類似 Milvus 的結果格式
-            class SearchHit:
-                def __init__(self, data):
-                    self.id = data['id']
-                    self.score = data['score']
-                    self.entity = data['entity']
-            
             return [SearchHit(r) for r in top_results]
         except Exception as e:
             logger.error(f"向量搜尋失敗: {e}")
             return []
     
+    def search_batch(self, tenant_id, query_embeddings, top_k=5):
+        """批次搜尋：所有查詢與集合一次以矩陣乘法計算相似度，返回每個查詢的 top_k 結果"""
+        try:
+            import numpy as np
+            
+            collection = self._vector_store.get(tenant_id) or []
+            if not collection or not query_embeddings:
+                logger.warning(f"租戶 {tenant_id} 的向量集合不存在或為空")
+                return [[] for _ in query_embeddings]
+            
+            def normalize(matrix):
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                return matrix / norms
+            
+            vectors = normalize(np.asarray([vec['embedding'] for vec in collection], dtype=np.float32))
+            queries = normalize(np.asarray(query_embeddings, dtype=np.float32))
+            scores = queries @ vectors.T
+            
+            k = min(top_k, len(collection))
+            top_indices = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            
+            results = []
+            for row, indices in enumerate(top_indices):
+                ordered = indices[np.argsort(-scores[row, indices])]
+                results.append([SearchHit({
+                    'id': collection[i]['id'],
+                    'score': float(scores[row, i]),
+                    'entity': {
+                        'text': collection[i]['text'],
+                        'document_id': collection[i]['document_id'],
+                        'chunk_index': collection[i]['chunk_index'],
+                        'metadata': collection[i].get('metadata', '{}'),
+                        'embedding': collection[i]['embedding']
+                    }
+                }) for i in ordered])
+            return results
+        except Exception as e:
+            logger.error(f"批次向量搜尋失敗: {e}")
+            return [[] for _ in query_embeddings]
+    
     def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """計算餘弦相似度"""
         try:
@@ -161,11 +208,12 @@ class VectorStoreManager:
             if tenant_id not in self._vector_store:
                 return False
             
-            collection = self._vector_store[tenant_id]
-            self._vector_store[tenant_id] = [
-                vec for vec in collection 
-                if vec['document_id'] != document_id
-            ]
+            with self._lock:
+                collection = self._vector_store[tenant_id]
+                self._vector_store[tenant_id] = [
+                    vec for vec in collection 
+                    if vec['document_id'] != document_id
+                ]
             
             logger.info(f"成功刪除文件 {document_id} 的向量數據")
             return True